@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# Throughput of the alignment API (xela_sensors.align) on a synthetic hour-long recording
+# Stamps at 200 Hz with jitter and dropouts are aligned against millions of query stamps (e.g. a
+# robot state stream), the frame reads are timed on a shorter compressed recording
+# Usage: python bench_align.py [--hours 1] [--rate 200] [--queries 5000000]
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from xela_sensors import align
+from xela_sensors.codec import CompressedWriter
+from xela_sensors.layout import CURVED_TOTAL_TAXELS
+from xela_sensors.recording import open_recording
+
+def synthetic_stamps(seconds, rate, seed=0):
+    # Jittered periods with a dropout of 0.2 s every minute
+    rng = np.random.default_rng(seed)
+    periods = rng.normal(1.0 / rate, 0.1 / rate, size=int(seconds * rate)).clip(0.2 / rate, None)
+    periods[::int(60 * rate)] += 0.2
+    return np.cumsum(periods)
+
+def time_it(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the alignment of tactile recordings')
+    parser.add_argument('--hours', type=float, default=1.0)
+    parser.add_argument('--rate', type=float, default=200)
+    parser.add_argument('--queries', type=int, default=5000000)
+    parser.add_argument('--frames', type=int, default=20000, help='Frames of the recording the frame reads are timed on')
+    args = parser.parse_args()
+
+    stamps = synthetic_stamps(3600 * args.hours, args.rate)
+    queries = np.random.default_rng(1).uniform(stamps[0], stamps[-1], size=args.queries)
+    sorted_queries = np.sort(queries)
+    print('{} frames ({:.1f} h at {:.0f} Hz), {} queries'.format(len(stamps), args.hours, args.rate, len(queries)))
+    for name, fn, query_stamps in (
+            ('nearest', align.nearest_indices, queries),
+            ('nearest, sorted queries', align.nearest_indices, sorted_queries),
+            ('previous', align.previous_indices, queries),
+            ('linear', align.interpolation_indices, queries)):
+        _, elapsed = time_it(fn, stamps, query_stamps, 0.02)
+        print('{:>24}: {:6.3f} s ({:6.1f} M queries/s)'.format(name, elapsed, len(queries) / elapsed / 1e6))
+    stats, elapsed = time_it(align.timing_stats, stamps)
+    print('{:>24}: {:6.3f} s, rate {:.1f} Hz, jitter {:.3f} ms, {} gaps, {} missing frames'.format(
+        'timing_stats', elapsed, stats['rate'], 1e3 * stats['period_std'], stats['num_gaps'], stats['missing_frames']))
+
+    # Frame reads go through the recording, here a compressed one decoded block by block
+    rng = np.random.default_rng(2)
+    frames = rng.integers(20000, 40000, size=(1, CURVED_TOTAL_TAXELS, 3)) + rng.integers(-4, 5, size=(args.frames, CURVED_TOTAL_TAXELS, 3))
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'bench_align.xtz')
+        writer = CompressedWriter(path, CURVED_TOTAL_TAXELS)
+        writer.write(frames, stamps[:args.frames])
+        writer.close()
+        recording = open_recording(path)
+        frame_queries = np.sort(rng.uniform(recording.stamps[0], recording.stamps[-1], size=args.frames // 2))
+        for method in align.ALIGN_METHODS:
+            (aligned, valid), elapsed = time_it(recording.align, frame_queries, method=method)
+            print('{:>24}: {:6.3f} s ({:8.0f} frames/s)'.format('align ' + method, elapsed, len(frame_queries) / elapsed))
+        (ticks, _, counts), elapsed = time_it(recording.resample, 100.0)
+        print('{:>24}: {:6.3f} s ({:8.0f} ticks/s, {} empty)'.format('resample 100 Hz', elapsed, len(ticks) / elapsed, int(np.sum(counts == 0))))
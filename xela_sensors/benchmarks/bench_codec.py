@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Compression ratio and throughput of the .xtz recording codec against the float64 pickles of XelaSaver
+# Every recording is first checked to decode to exactly the frames it was written from
+# Usage: python bench_codec.py [--recording sensor_values.pkl] [--frames 20000] [--block_sizes 64 256 1024]
+
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+from xela_sensors.codec import CompressedWriter, integer_dtype, load_compressed_recording
+from xela_sensors.layout import CURVED_TOTAL_TAXELS
+from xela_sensors.recording import open_recording
+
+def synthetic_frames(num_frames, num_taxels=CURVED_TOTAL_TAXELS, seed=0):
+    # Raw 16 bit readings: a per-taxel offset, sensor noise, a slow drift and a few presses
+    rng = np.random.default_rng(seed)
+    offsets = rng.integers(20000, 40000, size=(1, num_taxels, 3))
+    noise = rng.integers(-4, 5, size=(num_frames, num_taxels, 3))
+    drift = np.cumsum(rng.integers(-1, 2, size=(num_frames, 1, 3)), axis=0)
+    frames = offsets + noise + drift
+    for start in range(0, num_frames, 1000):
+        taxel = rng.integers(0, num_taxels - 30)
+        press = frames[start:start+300, taxel:taxel+30, 2]
+        press += np.linspace(0, 4000, 300).astype(np.int64)[:len(press), None]
+    return frames.astype(np.float64) # As XelaSaver keeps them
+
+def bench(frames, block_size, level, root):
+    path = os.path.join(root, 'bench_{}_{}.xtz'.format(block_size, level))
+    stamps = np.arange(len(frames)) / 100.0
+    dtype = integer_dtype(frames)
+    start = time.perf_counter()
+    writer = CompressedWriter(path, frames.shape[1], dtype=dtype, block_size=block_size, level=level)
+    writer.write(frames, stamps)
+    writer.close()
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values, _, _ = load_compressed_recording(path)
+    decoded = values[:]
+    decode_time = time.perf_counter() - start
+    assert np.array_equal(decoded, frames), 'Round trip changed the frames'
+
+    # Random access: one frame anywhere, the reader decodes its block only
+    indices = np.random.default_rng(1).integers(0, len(frames), size=200)
+    values, _, _ = load_compressed_recording(path)
+    start = time.perf_counter()
+    for index in indices:
+        values[int(index)]
+    seek_time = (time.perf_counter() - start) / len(indices)
+    return os.path.getsize(path), encode_time, decode_time, seek_time
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the .xtz recording codec')
+    parser.add_argument('--recording', default=None, help='Recording to compress, synthetic curved hand frames if not given')
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--block_sizes', type=int, nargs='+', default=[64, 256, 1024])
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 6])
+    args = parser.parse_args()
+
+    if args.recording:
+        frames = np.asarray(open_recording(args.recording)[:], dtype=np.float64)
+    else:
+        frames = synthetic_frames(args.frames)
+    with tempfile.TemporaryDirectory() as root:
+        pickle_path = os.path.join(root, 'sensor_values.pkl')
+        start = time.perf_counter()
+        with open(pickle_path, 'wb') as pkl:
+            pickle.dump(list(frames), pkl, pickle.HIGHEST_PROTOCOL)
+        pickle_time = time.perf_counter() - start
+        pickle_size = os.path.getsize(pickle_path)
+        print('{} frames of {} taxels, pickle: {:.0f} bytes/frame, dump {:.0f} frames/s'.format(
+            len(frames), frames.shape[1], pickle_size / len(frames), len(frames) / pickle_time))
+        for level in args.levels:
+            for block_size in args.block_sizes:
+                size, encode_time, decode_time, seek_time = bench(frames, block_size, level, root)
+                print('level {} block {:>5}: {:6.0f} bytes/frame ({:5.1f}x), encode {:8.0f} frames/s, decode {:8.0f} frames/s, seek {:6.2f} ms'.format(
+                    level, block_size, size / len(frames), pickle_size / size,
+                    len(frames) / encode_time, len(frames) / decode_time, 1e3 * seek_time))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Benchmark of the batch sensor value converters against the per-taxel loops they replaced
+# Usage: python bench_convert.py --frames 10000 100000 1000000
+
+import argparse
+import time
+
+import numpy as np
+
+from xela_sensors.utils import (
+    batch_convert_curved_tactile_sensor_values, batch_convert_sensor_values,
+    get_curved_tactile_index, get_tactile_index
+)
+
+CHUNK_SIZE = 10000
+
+# Loops the batch converters replaced, kept here as the baseline
+def legacy_convert_sensor_values(sensor_values):
+    converted_sensor_values = np.zeros((len(sensor_values), 15, 16, 3))
+    for timestep in range(len(sensor_values)):
+        for point_id in range(sensor_values[timestep].shape[0]):
+            sensor_id, tactile_id = get_tactile_index(point_id)
+            converted_sensor_values[timestep, sensor_id, tactile_id, :] = sensor_values[timestep][point_id,:]
+    avg_sensor_values = np.average(converted_sensor_values, axis=(0,1,2))
+    return converted_sensor_values - avg_sensor_values
+
+def legacy_convert_curved_tactile_sensor_values(sensor_values):
+    palm = np.zeros((len(sensor_values), 3, 24, 3))
+    fingertip = np.zeros((len(sensor_values), 4, 30, 3))
+    finger = np.zeros((len(sensor_values), 11, 16, 3))
+    for timestep in range(len(sensor_values)):
+        for point_id in range(sensor_values[timestep].shape[0]):
+            sensor_id, tactile_id = get_curved_tactile_index(point_id)
+            reading = sensor_values[timestep][point_id,:]
+            if sensor_id > 14:
+                palm[timestep, sensor_id-15, tactile_id] = reading
+            elif sensor_id in (0, 3, 7, 11):
+                fingertip[timestep, int(sensor_id/3), tactile_id] = reading
+            else:
+                finger[timestep, sensor_id - 1 - sum(sensor_id > tip for tip in (3, 7, 11)), tactile_id] = reading
+    return palm, fingertip, finger
+
+def synthetic_chunks(num_frames, num_taxels, seed=0):
+    # Raw readings are 16 bit integers, one random chunk is generated and replayed to bound memory
+    chunk = np.random.default_rng(seed).integers(0, 2**16, size=(CHUNK_SIZE, num_taxels, 3), dtype=np.uint16)
+    for start in range(0, num_frames, CHUNK_SIZE):
+        yield chunk[:min(CHUNK_SIZE, num_frames - start)]
+
+def time_it(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def bench(name, num_taxels, num_frames, batch_fn, legacy_fn, out, legacy_limit):
+    batch_time = time_it(lambda: batch_fn(synthetic_chunks(num_frames, num_taxels), out=out))
+
+    # The legacy loops are linear in the number of frames so larger runs are extrapolated
+    legacy_frames = min(num_frames, legacy_limit)
+    legacy_input = list(np.concatenate(list(synthetic_chunks(legacy_frames, num_taxels))))
+    legacy_time = time_it(lambda: legacy_fn(legacy_input)) * num_frames / legacy_frames
+    print('{:<8} {:>9} frames | batch: {:8.3f}s ({:>10.0f} fps) | loops: {:9.1f}s{} | speedup: {:6.0f}x'.format(
+        name, num_frames, batch_time, num_frames / batch_time, legacy_time,
+        '*' if legacy_frames < num_frames else ' ', legacy_time / batch_time
+    ))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the batch sensor value converters')
+    parser.add_argument('--frames', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='Run the loops on at most this many frames and extrapolate (marked with *)')
+    parser.add_argument('--dtype', default='float32', help='dtype of the preallocated output buffers')
+    args = parser.parse_args()
+
+    for num_frames in args.frames:
+        flat_out = np.empty((num_frames, 15, 16, 3), dtype=args.dtype)
+        bench('flat', 240, num_frames, batch_convert_sensor_values,
+              legacy_convert_sensor_values, flat_out, args.legacy_limit)
+        del flat_out
+
+        curved_out = tuple(np.empty((num_frames,) + shape, dtype=args.dtype)
+                           for shape in ((3, 24, 3), (4, 30, 3), (11, 16, 3)))
+        bench('curved', 368, num_frames, batch_convert_curved_tactile_sensor_values,
+              legacy_convert_curved_tactile_sensor_values, curved_out, args.legacy_limit)
+        del curved_out
+
+if __name__ == '__main__':
+    main()
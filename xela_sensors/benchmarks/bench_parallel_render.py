@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# Scaling of the parallel renderer: frames per second at 1, 2, 4 and 8 worker processes
+# Usage: python bench_parallel_render.py --frames 2000 --workers 1 2 4 8 [--images]
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from xela_sensors.layout import CURVED_TOTAL_TAXELS
+from xela_sensors.parallel_render import render_chunks
+
+def synthetic_readings(num_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    readings = rng.normal(0, 100, size=(num_frames, CURVED_TOTAL_TAXELS, 3))
+    readings[..., 2] = np.abs(readings[..., 2])
+    return readings
+
+def bench(readings, workers, size, image_format):
+    # Includes the worker start up, like a real run of the visualizer
+    start = time.perf_counter()
+    num_frames = 0
+    for _, frames in render_chunks(readings, workers=workers, size=size, image_format=image_format):
+        num_frames += frames if image_format is not None else len(frames)
+    return num_frames / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark parallel rendering')
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--size', type=int, nargs=2, default=[720, 1440], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--images', action='store_true', help='Workers write PNG images instead of returning the frames')
+    args = parser.parse_args()
+
+    readings = synthetic_readings(args.frames)
+    print('{} frames of {} taxels, {} cpus, {}'.format(
+        args.frames, CURVED_TOTAL_TAXELS, multiprocessing.cpu_count(),
+        'png images' if args.images else 'frames resized to {}x{}'.format(*args.size)))
+    base_fps = None
+    with tempfile.TemporaryDirectory() as dump_path:
+        image_format = os.path.join(dump_path, 'state_{:05d}.png') if args.images else None
+        for workers in args.workers:
+            fps = bench(readings, workers, args.size, image_format)
+            base_fps = fps if base_fps is None else base_fps
+            print('{:2d} workers: {:7.1f} frames/s ({:.2f}x)'.format(workers, fps, fps / base_fps))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Throughput of XelaSaver in poll and event capture with synthetic xServerMsg messages
+# The messages are handed to XelaSaver.callback directly at the given rates while the
+# saver ticks at 15 Hz, a roscore is needed for rospy.init_node
+# Usage: python bench_saver.py --rates 100 500 1000 --seconds 5
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import rospy
+from geometry_msgs.msg import Point
+from xela_server.msg import xServerMsg, xSensorData
+
+from xela_sensors.save_tactile_coords import XelaSaver
+
+NUM_TAXELS = 368
+SAVER_RATE = 15
+
+def synthetic_msgs(num_msgs, num_taxels=NUM_TAXELS, seed=0):
+    # A few distinct messages are reused, only the header changes between frames
+    rng = np.random.default_rng(seed)
+    msgs = []
+    for _ in range(num_msgs):
+        values = rng.integers(0, 2**16, size=(num_taxels, 3))
+        msg = xServerMsg(sensor=1, model='uSPa46')
+        msg.points = [
+            xSensorData(taxels=taxel_id+1, point=Point(*taxel_values))
+            for taxel_id, taxel_values in enumerate(values)
+        ]
+        msgs.append(msg)
+    return msgs
+
+def feed(saver, msgs, rate, seconds, counts):
+    period = 1.0 / rate
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    sent = 0
+    while True:
+        next_time = start + sent * period
+        if next_time - start >= seconds:
+            break
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        msg = msgs[sent % len(msgs)]
+        msg.header.seq = sent
+        msg.header.stamp = rospy.Time.from_sec(start + sent * period)
+        saver.callback(msg)
+        sent += 1
+    counts['sent'] = sent
+    counts['callback_cpu'] = time.thread_time() - cpu_start
+
+def bench(capture, rate, seconds, msgs):
+    saver = XelaSaver('/bench_saver_unused', rate=SAVER_RATE, total_num_taxels=NUM_TAXELS, capture=capture)
+    counts = {}
+    feeder = threading.Thread(target=feed, args=(saver, msgs, rate, seconds, counts))
+    cpu_start = time.process_time()
+    feeder.start()
+    # Same loop as XelaSaver.run, without the rospy.Rate so it stops with the feeder
+    while feeder.is_alive():
+        saver.step()
+        time.sleep(1.0 / SAVER_RATE)
+    cpu = time.process_time() - cpu_start
+    recorded = saver.num_recorded()
+    print('{:>6} {:>6} Hz: sent {:>6}, recorded {:>6} ({:>5.1f}%), callback {:>7.1f} us/msg, total cpu {:>7.1f} us/msg'.format(
+        capture, rate, counts['sent'], recorded, 100.0 * recorded / max(counts['sent'], 1),
+        1e6 * counts['callback_cpu'] / max(counts['sent'], 1), 1e6 * cpu / max(counts['sent'], 1)
+    ))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark XelaSaver capture modes')
+    parser.add_argument('--rates', type=float, nargs='+', default=[100, 250, 500, 1000])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    rospy.init_node('bench_saver', anonymous=True, disable_signals=True)
+    msgs = synthetic_msgs(8)
+    for rate in args.rates:
+        for capture in ('poll', 'event'):
+            bench(capture, rate, args.seconds, msgs)
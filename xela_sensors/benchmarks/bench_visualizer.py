@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# Benchmark of the curved hand visualization: CurvedHandRenderer against the per-frame figure it replaced
+# Usage: python bench_visualizer.py --frames 1000 --legacy-frames 20
+
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from xela_sensors.layout import CURVED_TOTAL_TAXELS, remap_curved
+from xela_sensors.renderer import (
+    CurvedHandRenderer, curved_tip_coordinates, hand_mosaic, palm_coordinates, sensor_coordinates
+)
+
+# Drawing the legacy visualizer did for every frame, kept here as the baseline:
+# a new figure, one image copy per circle and savefig
+def legacy_plot(ax, coordinates, sensor_values, img_shape, title):
+    blank_image = np.ones(img_shape, np.uint8) * 255
+    img = ax.imshow(blank_image.copy())
+    ax.set_title(title)
+    for i in range(sensor_values.shape[0]):
+        center_coordinates = (
+            coordinates[i][0] + int(sensor_values[i,0]/20),
+            coordinates[i][1] + int(sensor_values[i,1]/20)
+        )
+        radius = max(10 + int(sensor_values[i,2]/10), 2)
+        if i == 0:
+            frame_axis = cv2.circle(blank_image.copy(), center_coordinates, radius, color=(0,255,0), thickness=-1)
+        else:
+            frame_axis = cv2.circle(frame_axis.copy(), center_coordinates, radius, color=(0,255,0), thickness=-1)
+    img.set_array(frame_axis)
+
+def legacy_dump_one_frame(path, palm_readings, fingertip_readings, finger_readings):
+    _, axs = plt.subplot_mosaic(hand_mosaic(), figsize=(10,20))
+    cnt_fingertip = 0
+    cnt_finger = 0
+    for k in axs:
+        if 'tip' in k:
+            legacy_plot(axs[k], curved_tip_coordinates(), fingertip_readings[cnt_fingertip], (240, 240, 3), k)
+            cnt_fingertip += 1
+        elif 'palm' in k:
+            legacy_plot(axs[k], palm_coordinates(), np.concatenate(palm_readings, axis=0), (480, 960, 3), k)
+        elif not 'empty' in k:
+            legacy_plot(axs[k], sensor_coordinates(), finger_readings[cnt_finger], (240, 240, 3), k)
+            cnt_finger += 1
+        axs[k].get_yaxis().set_ticks([])
+        axs[k].get_xaxis().set_ticks([])
+    plt.savefig(path)
+    plt.close()
+
+def synthetic_readings(num_frames, seed=0):
+    # Bias removed readings: x, y shifts and z pressures of a few hundred counts
+    rng = np.random.default_rng(seed)
+    readings = rng.normal(0, 100, size=(num_frames, CURVED_TOTAL_TAXELS, 3))
+    readings[..., 2] = np.abs(readings[..., 2])
+    return readings
+
+def bench_renderer(readings, dump_path):
+    renderer = CurvedHandRenderer()
+    start = time.perf_counter()
+    for reading in readings:
+        renderer.render_reading(reading)
+    render_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame_id, reading in enumerate(readings):
+        frame = renderer.render_reading(reading)
+        cv2.imwrite(os.path.join(dump_path, 'state_{}.png'.format(str(frame_id).zfill(3))),
+                    cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR))
+    return render_time, time.perf_counter() - start
+
+def bench_legacy(readings, dump_path):
+    start = time.perf_counter()
+    for frame_id, reading in enumerate(readings):
+        legacy_dump_one_frame(os.path.join(dump_path, 'state_{}.png'.format(str(frame_id).zfill(3))),
+                              *remap_curved(reading))
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the curved hand visualization')
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--legacy-frames', type=int, default=20, help='Frames rendered by the legacy code, the rest is extrapolated')
+    args = parser.parse_args()
+
+    readings = synthetic_readings(args.frames)
+    with tempfile.TemporaryDirectory() as dump_path:
+        render_time, dump_time = bench_renderer(readings, dump_path)
+        legacy_frames = min(args.frames, args.legacy_frames)
+        legacy_time = bench_legacy(readings[:legacy_frames], dump_path) * args.frames / legacy_frames
+
+    print('{} frames of {} taxels'.format(args.frames, CURVED_TOTAL_TAXELS))
+    print('legacy   render + png: {:8.2f} s ({:7.2f} ms/frame){}'.format(
+        legacy_time, 1e3 * legacy_time / args.frames, ' extrapolated' if legacy_frames < args.frames else ''))
+    print('renderer render:       {:8.2f} s ({:7.2f} ms/frame)'.format(render_time, 1e3 * render_time / args.frames))
+    print('renderer render + png: {:8.2f} s ({:7.2f} ms/frame), {:.1f}x faster'.format(
+        dump_time, 1e3 * dump_time / args.frames, legacy_time / dump_time))
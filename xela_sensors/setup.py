@@ -7,6 +7,7 @@ from catkin_pkg.python_setup import generate_distutils_setup
 setup_args = generate_distutils_setup(
     packages=['xela_sensors'],
     package_dir={'': 'src'},
+    package_data={'xela_sensors': ['layouts/*.json']},
 )
 
 setup(**setup_args)
\ No newline at end of file
@@ -0,0 +1,169 @@
+# Alignment of tactile recordings with other timestamped streams (robot state, cameras...)
+# All lookups are vectorized binary searches (np.searchsorted) of the query stamps in the monotonic
+# stamps of a recording, so millions of queries against hour-long recordings take well under a second,
+# and frames are only read for the indices that are needed, in sorted runs.
+# Stamps are in seconds, as recorded by XelaSaver (the header stamp of xela_service).
+
+import numpy as np
+
+ALIGN_METHODS = ('nearest', 'previous', 'linear')
+
+def monotonic_stamps(stamps):
+    # Non-decreasing copy of stamps: a stamp earlier than the one before it gets the one before it
+    return np.maximum.accumulate(np.asarray(stamps, dtype=np.float64))
+
+def _check_stamps(stamps):
+    stamps = np.asarray(stamps, dtype=np.float64)
+    if len(stamps) == 0:
+        raise ValueError('No stamps to align to')
+    if len(stamps) > 1 and (stamps[1:] < stamps[:-1]).any():
+        raise ValueError('The stamps are not monotonic, fix them with align.monotonic_stamps first')
+    return stamps
+
+def _searchsorted(stamps, queries, side):
+    # np.searchsorted is several times faster on sorted queries (the searches stay in cache), so
+    # unsorted queries are searched in sorted order and the results put back in their order
+    if len(queries) < 2 or not (queries[1:] < queries[:-1]).any():
+        return np.searchsorted(stamps, queries, side=side)
+    order = np.argsort(queries)
+    indices = np.empty(len(queries), dtype=np.intp)
+    indices[order] = np.searchsorted(stamps, queries[order], side=side)
+    return indices
+
+def nearest_indices(stamps, queries, tolerance=None):
+    # Index of the frame closest in time to every query, and whether it is within tolerance seconds
+    # Returns (indices, valid), ties go to the earlier frame
+    stamps = _check_stamps(stamps)
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1)
+    right = _searchsorted(stamps, queries, 'left').clip(0, len(stamps) - 1)
+    left = np.maximum(right - 1, 0)
+    indices = np.where(np.abs(queries - stamps[left]) <= np.abs(stamps[right] - queries), left, right)
+    valid = np.ones(queries.shape, dtype=bool) if tolerance is None else np.abs(stamps[indices] - queries) <= tolerance
+    return indices, valid
+
+def previous_indices(stamps, queries, tolerance=None):
+    # Index of the newest frame at or before every query (zero-order hold, like capture.Resampler)
+    # Returns (indices, valid), queries before the first frame or more than tolerance after their frame are invalid
+    stamps = _check_stamps(stamps)
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1)
+    indices = _searchsorted(stamps, queries, 'right') - 1
+    valid = indices >= 0
+    indices = np.maximum(indices, 0)
+    if tolerance is not None:
+        valid &= queries - stamps[indices] <= tolerance
+    return indices, valid
+
+def interpolation_indices(stamps, queries, tolerance=None):
+    # Frames around every query and the weight of the later one for linear interpolation
+    # Returns (left, right, weights, valid): queries outside the recording, or between two frames more
+    # than tolerance seconds apart, are invalid
+    stamps = _check_stamps(stamps)
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1)
+    left = (_searchsorted(stamps, queries, 'right') - 1).clip(0, len(stamps) - 1)
+    right = np.minimum(left + 1, len(stamps) - 1)
+    span = stamps[right] - stamps[left]
+    weights = np.divide(queries - stamps[left], span, out=np.zeros(queries.shape), where=span > 0).clip(0, 1)
+    valid = (queries >= stamps[0]) & (queries <= stamps[-1])
+    if tolerance is not None:
+        valid &= span <= tolerance
+    return left, right, weights, valid
+
+def gather_frames(values, indices, max_skip=64):
+    # values[indices] as float64 for array-likes that only slice (Recording, compressed values...)
+    # Sorted unique indices are read in runs, indices closer than max_skip frames share one read
+    indices = np.asarray(indices, dtype=np.intp)
+    if isinstance(values, np.ndarray):
+        return np.asarray(values[indices], dtype=np.float64)
+    unique, inverse = np.unique(indices, return_inverse=True)
+    frames = np.empty((len(unique),) + tuple(values.shape[1:]), dtype=np.float64)
+    breaks = np.flatnonzero(np.diff(unique) > max_skip) + 1
+    for run_start, run_end in zip(np.r_[0, breaks], np.r_[breaks, len(unique)]):
+        first, last = unique[run_start], unique[run_end - 1]
+        frames[run_start:run_end] = np.asarray(values[first:last+1])[unique[run_start:run_end] - first]
+    return frames[inverse.reshape(indices.shape)]
+
+def align_frames(values, stamps, queries, method='nearest', tolerance=None, batch_size=4096):
+    # Tactile frames at every query stamp: (len(queries), num_taxels, 3) float64, NaN where not valid
+    # method: nearest frame, previous frame (zero-order hold) or linear interpolation between the two
+    # Returns (frames, valid), the queries are processed batch_size at a time to bound the reads
+    assert method in ALIGN_METHODS, 'Unknown method {}, use one of {}'.format(method, ALIGN_METHODS)
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1)
+    frames = np.empty((len(queries),) + tuple(values.shape[1:]), dtype=np.float64)
+    valid = np.zeros(len(queries), dtype=bool)
+    # Sorted queries read every frame at most once
+    order = np.argsort(queries, kind='stable')
+    for start in range(0, len(queries), batch_size):
+        batch = order[start:start+batch_size]
+        if method == 'linear':
+            left, right, weights, batch_valid = interpolation_indices(stamps, queries[batch], tolerance)
+            pair = gather_frames(values, np.concatenate([left, right]))
+            weights = weights[:, None, None]
+            frames[batch] = (1 - weights) * pair[:len(batch)] + weights * pair[len(batch):]
+        else:
+            lookup = nearest_indices if method == 'nearest' else previous_indices
+            indices, batch_valid = lookup(stamps, queries[batch], tolerance)
+            frames[batch] = gather_frames(values, indices)
+        valid[batch] = batch_valid
+    frames[~valid] = np.nan
+    return frames, valid
+
+def iter_resample(values, stamps, rate, window=None, start=None, end=None, batch_size=1024):
+    # Windowed resampling to a fixed rate: every output tick is the mean of the frames stamped in
+    # [tick - window / 2, tick + window / 2), window defaults to one output period
+    # Ticks run from start to end (default: first and last stamp). Yields (ticks, frames, counts)
+    # batches, frames are float64 and NaN for ticks without any frame (counts == 0)
+    stamps = _check_stamps(stamps)
+    period = 1.0 / rate
+    window = period if window is None else window
+    start = stamps[0] if start is None else start
+    end = stamps[-1] if end is None else end
+    num_ticks = int(np.floor((end - start) / period + 1e-9)) + 1
+    for batch_start in range(0, num_ticks, batch_size):
+        ticks = start + period * np.arange(batch_start, min(batch_start + batch_size, num_ticks))
+        low = np.searchsorted(stamps, ticks - window / 2, side='left')
+        high = np.searchsorted(stamps, ticks + window / 2, side='left')
+        # Window sums are differences of one cumulative sum over the frames of the batch
+        first = low[0]
+        segment = np.asarray(values[first:high[-1]], dtype=np.float64)
+        cumulative = np.zeros((len(segment) + 1,) + segment.shape[1:])
+        np.cumsum(segment, axis=0, out=cumulative[1:])
+        counts = high - low
+        sums = cumulative[high - first] - cumulative[low - first]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frames = sums / counts[:, None, None]
+        yield ticks, frames, counts
+
+def resample(values, stamps, rate, window=None, start=None, end=None):
+    # iter_resample in one go: (ticks, frames, counts) of the whole range
+    batches = list(iter_resample(values, stamps, rate, window, start, end))
+    if len(batches) == 0:
+        return np.zeros(0), np.zeros((0,) + tuple(values.shape[1:])), np.zeros(0, dtype=np.intp)
+    return tuple(np.concatenate(parts) for parts in zip(*batches))
+
+def timing_stats(stamps, gap_factor=3.0):
+    # Rate, period jitter and gaps of a stream of stamps
+    # Gaps are the periods longer than gap_factor times the median period, missing_frames estimates
+    # how many frames they lost at the median rate
+    stamps = np.asarray(stamps, dtype=np.float64)
+    stats = dict(num_frames=len(stamps), duration=float(stamps[-1] - stamps[0]) if len(stamps) > 0 else 0.0)
+    if len(stamps) < 2:
+        return stats
+    periods = np.diff(stamps)
+    median = float(np.median(periods))
+    gap_ids = np.flatnonzero(periods > gap_factor * median) if median > 0 else np.zeros(0, dtype=np.intp)
+    stats.update(
+        rate = 1.0 / median if median > 0 else float('inf'),
+        period_mean = float(periods.mean()),
+        period_std = float(periods.std()), # Jitter
+        period_p50 = median,
+        period_p99 = float(np.percentile(periods, 99)),
+        period_max = float(periods.max()),
+        jitter_p99 = float(np.percentile(np.abs(periods - median), 99)),
+        non_monotonic = int(np.count_nonzero(periods < 0)),
+        duplicates = int(np.count_nonzero(periods == 0)),
+        num_gaps = len(gap_ids),
+        gap_time = float(periods[gap_ids].sum()),
+        missing_frames = int(np.round(periods[gap_ids] / median).sum() - len(gap_ids)) if len(gap_ids) > 0 else 0,
+        gaps = [(int(index), float(stamps[index] - stamps[0]), float(periods[index])) for index in gap_ids], # (frame, start, duration)
+    )
+    return stats
@@ -0,0 +1,57 @@
+# Helpers for capturing tactile messages as numpy frames
+# Conversion of xServerMsg / xHandMsg messages and online decimation / resampling of frames
+
+import numpy as np
+
+def msg_to_array(sensor_msg):
+    # xServerMsg -> (num_points, 3) float64 array, in one pass over the points
+    # Kept for the services that publish xServerMsg (xela_service --publish sensor): rospy already built one
+    # object per point, so this costs ~70 us per 368 taxel message against < 1 us for hand_msg_to_array
+    num_points = len(sensor_msg.points)
+    return np.fromiter(
+        (value for point in sensor_msg.points for value in (point.point.x, point.point.y, point.point.z)),
+        dtype=np.float64, count=3*num_points
+    ).reshape(num_points, 3)
+
+def hand_msg_to_array(hand_msg):
+    # xHandMsg -> (num_taxels, 3) array of all sensors
+    # With numpy_msg(xHandMsg) data is already a float32 array and this does not copy
+    return np.asarray(hand_msg.data, dtype=np.float32).reshape(-1, 3)
+
+class Decimator:
+    # Keeps every factor-th frame
+    def __init__(self, factor):
+        assert factor >= 1, 'Decimation factor should be at least 1'
+        self.factor = factor
+        self._count = 0
+
+    def __call__(self, values, stamp):
+        # Returns the list of (values, stamp) to record for this frame
+        self._count += 1
+        if (self._count - 1) % self.factor == 0:
+            return [(values, stamp)]
+        return []
+
+class Resampler:
+    # Zero-order hold resampling to a fixed output rate based on the frame stamps
+    # Each output tick gets the newest frame at or before it - the last frame is copied, as callers
+    # (XelaSaver in poll capture) may overwrite their buffer before the next tick repeats it
+    def __init__(self, rate):
+        assert rate > 0, 'Resampling rate should be positive'
+        self.period = 1.0 / rate
+        self._next_stamp = None
+        self._last = None
+
+    def __call__(self, values, stamp):
+        if self._next_stamp is None:
+            self._next_stamp = stamp
+        frames = []
+        # Ticks between the previous frame and this one get the previous frame
+        while self._last is not None and self._next_stamp < stamp:
+            frames.append((self._last, self._next_stamp))
+            self._next_stamp += self.period
+        if self._next_stamp == stamp:
+            frames.append((values, stamp))
+            self._next_stamp += self.period
+        self._last = np.array(values, copy=True)
+        return frames
@@ -0,0 +1,240 @@
+# Lossless compressed format for tactile recordings (.xtz)
+# Raw readings are 16 bit integers that change slowly between frames, so frames are stored as integers
+# of their native width, delta encoded in time and compressed with zlib, in independent blocks:
+#   file header   magic, version, dtype of the values, num_taxels, frames per block, compressor
+#   block         header (magic, num_frames, sizes and crc32 of its payloads), the stamps and seqs
+#                 of its frames, then the values: the first frame of the block as is (keyframe), every
+#                 other frame as its difference to the previous one
+# Differences wrap around in the integer width, are zigzag encoded (small negative -> small positive)
+# and split in byte planes before compression, so the mostly zero high bytes compress to almost nothing.
+# Every block decodes on its own, a reader seeks to any frame by decoding only its block. The blocks
+# are appended one after the other, a crash loses at most the block being written. CompressedRecorder queues
+# blocks for its writer thread like ChunkedRecorder: one block with the default num_buffers=1, up to num_buffers otherwise.
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from xela_sensors.recorder import ChunkedRecorder
+
+COMPRESSED_EXTENSION = '.xtz'
+CODEC_MAGIC = b'XTZ1'
+CODEC_VERSION = 1
+BLOCK_MAGIC = b'XBLK'
+CODEC_DTYPES = ('<u2', '<i4') # Raw readings, and integer readings that may be negative or above 16 bits
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_LEVEL = 1 # zlib level, higher levels are much slower for a few percent
+
+FILE_HEADER = struct.Struct('<4sB3sII8s') # magic, version, dtype, num_taxels, block_size, compressor
+BLOCK_HEADER = struct.Struct('<4sIIII') # magic, num_frames, stamps size, values size, values crc32
+
+def _unsigned(dtype):
+    return np.dtype('<u{}'.format(np.dtype(dtype).itemsize))
+
+def _signed(dtype):
+    return np.dtype('<i{}'.format(np.dtype(dtype).itemsize))
+
+def to_integers(frames, dtype):
+    # frames: (n, num_taxels, 3) values, raises ValueError unless dtype holds them exactly
+    frames = np.asarray(frames)
+    if frames.dtype == dtype:
+        return frames
+    values = frames.astype(dtype)
+    if not np.array_equal(values, frames):
+        raise ValueError('The frames are not all integers in the range of {}, they would not be stored losslessly'.format(dtype))
+    return values
+
+def integer_dtype(frames):
+    # Narrowest codec dtype that holds the frames exactly, ValueError if there is none
+    frames = np.asarray(frames)
+    if frames.size == 0 or (frames.min() >= 0 and frames.max() < 2**16):
+        dtype = np.dtype(CODEC_DTYPES[0])
+    else:
+        dtype = np.dtype(CODEC_DTYPES[1])
+    to_integers(frames, dtype)
+    return dtype
+
+def encode_values(values, level=DEFAULT_LEVEL):
+    # values: (n, num_taxels, 3) array of one of CODEC_DTYPES, returns the compressed bytes
+    flat = values.reshape(len(values), -1).view(_unsigned(values.dtype))
+    deltas = np.empty_like(flat)
+    deltas[:1] = flat[:1]
+    np.subtract(flat[1:], flat[:-1], out=deltas[1:])
+    signed = deltas.view(_signed(values.dtype))
+    zigzag = (signed << 1) ^ (signed >> (8 * values.dtype.itemsize - 1))
+    planes = zigzag.view(np.uint8).reshape(-1, values.dtype.itemsize).T
+    return zlib.compress(np.ascontiguousarray(planes), level)
+
+def decode_values(payload, num_frames, num_taxels, dtype):
+    # Inverse of encode_values, returns a (num_frames, num_taxels, 3) array of dtype
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(dtype.itemsize, -1)
+    zigzag = np.ascontiguousarray(planes.T).view(_unsigned(dtype)).reshape(num_frames, num_taxels * 3)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    values = np.cumsum(deltas, axis=0, dtype=deltas.dtype) # Wraps around like the differences did
+    return values.view(dtype).reshape(num_frames, num_taxels, 3)
+
+def encode_block(values, stamps, seqs, level=DEFAULT_LEVEL):
+    stamps_payload = zlib.compress(
+        np.asarray(stamps, dtype='<f8').tobytes() + np.asarray(seqs, dtype='<i8').tobytes(), level)
+    values_payload = encode_values(values, level)
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(values), len(stamps_payload), len(values_payload), zlib.crc32(values_payload))
+    return header + stamps_payload + values_payload
+
+class CompressedWriter:
+    # Writes frames to an .xtz file, block by block
+    def __init__(self, path, num_taxels, dtype=CODEC_DTYPES[0], block_size=DEFAULT_BLOCK_SIZE, level=DEFAULT_LEVEL):
+        if np.dtype(dtype).str not in CODEC_DTYPES:
+            raise ValueError('Unsupported dtype {}, use one of {}'.format(dtype, CODEC_DTYPES))
+        self.path = path
+        self.num_taxels = num_taxels
+        self.dtype = np.dtype(dtype)
+        self.block_size = block_size
+        self.level = level
+        self.num_frames = 0
+        self._file = open(path, 'wb')
+        self._file.write(FILE_HEADER.pack(
+            CODEC_MAGIC, CODEC_VERSION, self.dtype.str.encode(), num_taxels, block_size, b'zlib'))
+
+    def write_block(self, values, stamps, seqs):
+        # values: (n, num_taxels, 3) frames of one block, n <= block_size
+        values = to_integers(values, self.dtype)
+        assert values.shape[1:] == (self.num_taxels, 3), 'values.shape: {}'.format(values.shape)
+        assert 0 < len(values) <= self.block_size, 'A block holds 1 to {} frames'.format(self.block_size)
+        self._file.write(encode_block(values, stamps, seqs, self.level))
+        self.num_frames += len(values)
+
+    def write(self, values, stamps, seqs=None):
+        # Any number of frames, split in blocks
+        seqs = np.arange(self.num_frames, self.num_frames + len(values)) if seqs is None else seqs
+        for start in range(0, len(values), self.block_size):
+            end = start + self.block_size
+            self.write_block(values[start:end], stamps[start:end], seqs[start:end])
+
+    def flush(self, fsync=False):
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+class _Block:
+    def __init__(self, offset, num_frames, stamps_size, values_size, crc):
+        self.offset = offset # Of the stamps payload, the values payload follows it
+        self.num_frames = num_frames
+        self.stamps_size = stamps_size
+        self.values_size = values_size
+        self.crc = crc
+
+class CompressedValues:
+    # Array-like (N, num_taxels, 3) view of an .xtz file for Recording: indexing only decodes the
+    # blocks it needs and the last decoded block is kept for sequential reads
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        magic, version, dtype, self.num_taxels, self.block_size, compressor = FILE_HEADER.unpack(
+            self._file.read(FILE_HEADER.size))
+        if magic != CODEC_MAGIC or version != CODEC_VERSION:
+            raise ValueError('{} is not an {} recording of version {}'.format(path, COMPRESSED_EXTENSION, CODEC_VERSION))
+        if compressor.rstrip(b'\0') != b'zlib':
+            raise ValueError('Unknown compressor {} in {}'.format(compressor, path))
+        self.dtype = np.dtype(dtype.decode())
+
+        # The block headers and the stamps are read at once, the values when they are indexed
+        self._blocks = []
+        stamps, seqs = [], []
+        file_size = os.fstat(self._file.fileno()).st_size
+        while True:
+            header = self._file.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                break
+            magic, num_frames, stamps_size, values_size, crc = BLOCK_HEADER.unpack(header)
+            if magic != BLOCK_MAGIC:
+                raise ValueError('Corrupt block at byte {} of {}'.format(self._file.tell() - BLOCK_HEADER.size, path))
+            block = _Block(self._file.tell(), num_frames, stamps_size, values_size, crc)
+            stamps_payload = self._file.read(stamps_size)
+            if self._file.seek(values_size, 1) > file_size or len(stamps_payload) < stamps_size:
+                break # Block cut short by a crash while it was written
+            times = np.frombuffer(zlib.decompress(stamps_payload), dtype=np.uint8)
+            stamps.append(times[:8 * num_frames].view('<f8'))
+            seqs.append(times[8 * num_frames:].view('<i8'))
+            self._blocks.append(block)
+        self.starts = np.cumsum([0] + [block.num_frames for block in self._blocks])
+        self.stamps = np.concatenate(stamps) if stamps else np.zeros(0)
+        self.seqs = np.concatenate(seqs) if seqs else np.zeros(0, dtype=np.int64)
+        self.shape = (int(self.starts[-1]), self.num_taxels, 3)
+        self._cached = (None, None)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def num_blocks(self):
+        return len(self._blocks)
+
+    def read_block(self, block_id):
+        # (num_frames, num_taxels, 3) frames of a block, checked against the crc32 of its header
+        if self._cached[0] == block_id:
+            return self._cached[1]
+        block = self._blocks[block_id]
+        self._file.seek(block.offset + block.stamps_size)
+        payload = self._file.read(block.values_size)
+        if zlib.crc32(payload) != block.crc:
+            raise ValueError('Block {} of {} fails its crc check'.format(block_id, self.path))
+        values = decode_values(payload, block.num_frames, self.num_taxels, self.dtype)
+        self._cached = (block_id, values)
+        return values
+
+    def _frames(self, start, stop):
+        if stop <= start:
+            return np.zeros((0,) + self.shape[1:], dtype=self.dtype)
+        first = int(np.searchsorted(self.starts, start, side='right')) - 1
+        last = int(np.searchsorted(self.starts, stop, side='left'))
+        parts = [self.read_block(block_id) for block_id in range(first, last)]
+        values = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        offset = self.starts[first]
+        return values[start - offset:stop - offset]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self._frames(start, max(start, stop))[::step]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Frame {} is out of range for {} frames'.format(index, len(self)))
+        return self._frames(index, index + 1)[0]
+
+    def close(self):
+        self._file.close()
+
+def load_compressed_recording(path):
+    # Returns (values, stamps, seqs) like recorder.load_chunked_recording, values are decoded lazily
+    values = CompressedValues(path)
+    return values, values.stamps, values.seqs
+
+class CompressedRecorder(ChunkedRecorder):
+    # ChunkedRecorder writing one .xtz block per chunk: same append / flush / close and writer thread,
+    # the frames are compressed on the writer thread
+    def __init__(self, path, num_taxels, chunk_size=DEFAULT_BLOCK_SIZE, dtype=CODEC_DTYPES[0], level=DEFAULT_LEVEL,
+                 num_buffers=1, fsync=True):
+        self.codec_dtype = dtype
+        self.level = level
+        # Chunks keep the frames as given, they are checked to be lossless when they are encoded
+        super().__init__(path, num_taxels, chunk_size=chunk_size, dtype=np.float64, num_buffers=num_buffers, fsync=fsync)
+
+    def _open(self):
+        if os.path.exists(self.root) and os.path.getsize(self.root) > 0:
+            raise FileExistsError('{} already holds a recording, record to a new file'.format(self.root))
+        self._writer_file = CompressedWriter(self.root, self.num_taxels, self.codec_dtype, self.chunk_size, self.level)
+
+    def _write_chunk(self, chunk):
+        self._writer_file.write_block(chunk.values[:chunk.length], chunk.stamps[:chunk.length], chunk.seqs[:chunk.length])
+        self._writer_file.flush(self.fsync)
+        self.meta['num_frames'] += chunk.length
+
+    def _close(self):
+        self._writer_file.close()
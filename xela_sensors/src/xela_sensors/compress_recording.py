@@ -0,0 +1,75 @@
+# Converts tactile recordings (sensor_values.pkl of XelaSaver, .npy or --record directories) to the
+# compressed .xtz format of xela_sensors.codec, and checks that the result decodes to the same frames
+# Usage: python -m xela_sensors.compress_recording sensor_values.pkl [more.pkl ...] [--rate 15]
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from xela_sensors.codec import (
+    CODEC_DTYPES, COMPRESSED_EXTENSION, DEFAULT_BLOCK_SIZE, DEFAULT_LEVEL, CompressedWriter, integer_dtype
+)
+from xela_sensors.recording import open_recording
+
+def recording_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, file_name)) for file_name in os.listdir(path))
+
+def compress_recording(path, output=None, rate=15, dtype=None, block_size=DEFAULT_BLOCK_SIZE, level=DEFAULT_LEVEL, verify=True):
+    # path: any recording open_recording reads, output: defaults to path with the .xtz extension
+    # rate: frame rate the stamps are derived from for formats without timestamps (15 Hz for XelaSaver pickles)
+    # dtype: one of CODEC_DTYPES, the narrowest that holds the frames if None
+    # Returns (output, number of frames)
+    recording = open_recording(path, rate=rate)
+    if output is None:
+        output = os.path.splitext(path.rstrip(os.sep))[0] + COMPRESSED_EXTENSION
+    if dtype is None:
+        # A first pass over the recording finds the range of the values, it raises if they aren't integers
+        dtypes = {integer_dtype(chunk).str for chunk in recording.iter_chunks()}
+        dtype = CODEC_DTYPES[-1] if CODEC_DTYPES[-1] in dtypes else CODEC_DTYPES[0]
+
+    stamps = recording.stamps if recording.stamps is not None else np.zeros(len(recording))
+    seqs = recording.seqs if recording.seqs is not None else np.arange(len(recording))
+    writer = CompressedWriter(output, recording.num_taxels, dtype=dtype, block_size=block_size, level=level)
+    try:
+        for start in range(0, len(recording), block_size):
+            end = min(start + block_size, len(recording))
+            writer.write_block(np.asarray(recording[start:end]), stamps[start:end], seqs[start:end])
+    finally:
+        writer.close()
+
+    if verify:
+        compressed = open_recording(output)
+        assert len(compressed) == len(recording), 'Wrote {} frames of {}'.format(len(compressed), len(recording))
+        for start in range(0, len(recording), block_size):
+            if not np.array_equal(compressed[start:start+block_size], recording[start:start+block_size]):
+                raise ValueError('{} does not decode to the frames of {} from frame {}'.format(output, path, start))
+    return output, len(recording)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert tactile recordings to the compressed .xtz format')
+    parser.add_argument('paths', nargs='+', help='sensor_values.pkl, .npy or recording directories')
+    parser.add_argument('--output', default=None, help='Output file, only with a single input (default: input with .xtz)')
+    parser.add_argument('--rate', type=float, default=15, help='Frame rate of the formats without timestamps')
+    parser.add_argument('--dtype', default=None, choices=CODEC_DTYPES, help='Integer type of the values (default: narrowest that fits)')
+    parser.add_argument('--block_size', type=int, default=DEFAULT_BLOCK_SIZE, help='Frames per independently decodable block')
+    parser.add_argument('--level', type=int, default=DEFAULT_LEVEL, help='zlib compression level')
+    parser.add_argument('--no_verify', action='store_true', help='Skip decoding the output and comparing it to the input')
+    args = parser.parse_args()
+    if args.output is not None and len(args.paths) > 1:
+        parser.error('--output needs a single input')
+
+    for path in args.paths:
+        start = time.perf_counter()
+        output, num_frames = compress_recording(
+            path, args.output, rate=args.rate, dtype=args.dtype, block_size=args.block_size,
+            level=args.level, verify=not args.no_verify
+        )
+        print('{} -> {}: {} frames, {:.1f} MB -> {:.1f} MB ({:.1f}x){} in {:.1f} s'.format(
+            path, output, num_frames, recording_size(path) / 1e6, recording_size(output) / 1e6,
+            recording_size(path) / max(recording_size(output), 1), ', verified' if not args.no_verify else '',
+            time.perf_counter() - start
+        ))
@@ -0,0 +1,220 @@
+# Hand layout registry and precomputed taxel tables
+# Every hand model is described by one json file in xela_sensors/layouts, or in a directory listed in
+# XELA_LAYOUT_PATH, so a new hand is added without editing code. A layout lists groups of sensors with
+# the same number of taxels (e.g. palm, fingertip and finger sensors of the curved hand) and for every
+# sensor the grid of raw point ids as they come from xela_server, -1 for cells without a taxel.
+# Layouts are compiled once into integer index arrays so that whole recordings can be remapped with
+# fancy indexing, and into the pixel coordinates of the taxels for the renderer.
+
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+LAYOUT_PATH_ENV = 'XELA_LAYOUT_PATH'
+
+FLAT_LAYOUT = 'flat_15'
+CURVED_LAYOUT = 'curved_18'
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+class LayoutGroup:
+    # Sensors of a layout with the same number of taxels, remapped into one (num_sensors, num_taxels, 3) array
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.num_taxels = spec['num_taxels']
+        self.pitch = spec.get('pitch') # Pixels between two neighbouring taxels in the renderer
+        sensors = spec['sensors']
+        self.sensor_ids = tuple(sensor['id'] for sensor in sensors)
+        self.panels = tuple(sensor.get('panel') for sensor in sensors)
+        self.origins = tuple(tuple(sensor.get('origin', (0, 0))) for sensor in sensors)
+        self.grids = tuple(np.array(sensor['grid'], dtype=np.intp) for sensor in sensors)
+        for sensor_id, grid in zip(self.sensor_ids, self.grids):
+            num_cells = int(np.count_nonzero(grid >= 0))
+            if grid.ndim != 2 or num_cells != self.num_taxels:
+                raise ValueError('Sensor {} of group {} has {} taxels in its grid, expected {}'.format(
+                    sensor_id, self.name, num_cells, self.num_taxels))
+
+    @property
+    def num_sensors(self):
+        return len(self.sensor_ids)
+
+    @property
+    def shape(self):
+        return (self.num_sensors, self.num_taxels)
+
+class HandLayout:
+    def __init__(self, spec, path=None):
+        # spec: parsed layout json, path: the file it was read from
+        self.name = spec['name']
+        self.description = spec.get('description', '')
+        self.path = path
+        self.num_taxels = spec['num_taxels']
+        self.groups = tuple(LayoutGroup(group_spec) for group_spec in spec['groups'])
+        self.group_ids = {group.name: group_id for group_id, group in enumerate(self.groups)}
+        self.group_shapes = tuple(group.shape for group in self.groups)
+        self.panels = {name: tuple(shape) for name, shape in spec.get('panels', {}).items()}
+        self.mosaic = spec.get('mosaic')
+
+        # index_table: (group, sensor index in group, tactile_id) of every raw point id
+        # sensor_table: (hand-wide sensor_id, tactile_id) of every raw point id
+        index_table = np.full((self.num_taxels, 3), -1, dtype=np.intp)
+        sensor_table = np.full((self.num_taxels, 2), -1, dtype=np.intp)
+        for group_id, group in enumerate(self.groups):
+            for sensor_index, (sensor_id, grid) in enumerate(zip(group.sensor_ids, group.grids)):
+                point_ids = grid[grid >= 0] # Tactile ids go row first over the cells with a taxel
+                if point_ids.max() >= self.num_taxels or (index_table[point_ids, 0] >= 0).any():
+                    raise ValueError('Sensor {} of layout {} has point ids out of range or used twice'.format(sensor_id, self.name))
+                index_table[point_ids] = np.stack([
+                    np.full(len(point_ids), group_id), np.full(len(point_ids), sensor_index), np.arange(len(point_ids))
+                ], axis=1)
+                sensor_table[point_ids] = np.stack([np.full(len(point_ids), sensor_id), np.arange(len(point_ids))], axis=1)
+        if (index_table[:, 0] < 0).any():
+            raise ValueError('Layout {} has no sensor for the point ids {}'.format(
+                self.name, np.flatnonzero(index_table[:, 0] < 0).tolist()))
+        self.index_table = _readonly(index_table)
+        self.sensor_table = _readonly(sensor_table)
+
+        # One gather index per group: the raw point id of every (sensor, tactile) slot
+        self.gather_indices = tuple(
+            _readonly(np.concatenate([grid[grid >= 0] for grid in group.grids])) for group in self.groups
+        )
+
+    def group(self, name):
+        return self.groups[self.group_ids[name]]
+
+    def taxel_coordinates(self, group):
+        # (num_sensors * num_taxels, 2) pixel coordinates of the taxel centers of a group in the image of
+        # their panel, in the order of the remapped values, and the panel of every taxel
+        group = self.group(group) if isinstance(group, str) else group
+        coordinates = []
+        panels = []
+        for panel, origin, grid in zip(group.panels, group.origins, group.grids):
+            rows, columns = np.nonzero(grid >= 0)
+            coordinates.append(np.array(origin) + group.pitch * np.stack([columns, rows], axis=1))
+            panels += [panel] * len(rows)
+        return np.concatenate(coordinates), panels
+
+    def remap(self, readings, out=None):
+        # readings: (num_taxels, 3) or (N, num_taxels, 3) raw readings ordered by point id
+        # Returns one (.., num_sensors, num_taxels, 3) array per group, ordered by sensor and tactile id
+        # If out is given it should be a tuple with one buffer per group to write into
+        readings, is_single = _as_batch(readings, self.num_taxels)
+        if out is None:
+            out = (None,) * len(self.groups)
+        return tuple(
+            _gather(readings, gather_index, num_sensors, num_taxels, group_out, is_single)
+            for (num_sensors, num_taxels), gather_index, group_out in zip(self.group_shapes, self.gather_indices, out)
+        )
+
+def layout_dirs():
+    # Directories of XELA_LAYOUT_PATH come first so they can override the bundled layouts
+    paths = [path for path in os.environ.get(LAYOUT_PATH_ENV, '').split(os.pathsep) if path]
+    return paths + [LAYOUT_DIR]
+
+def _layout_files():
+    files = {}
+    for directory in reversed(layout_dirs()):
+        if os.path.isdir(directory):
+            for file_name in sorted(os.listdir(directory)):
+                if file_name.endswith('.json'):
+                    files[file_name[:-len('.json')]] = os.path.join(directory, file_name)
+    return files
+
+def available_layouts():
+    return sorted(_layout_files())
+
+def load_layout(path):
+    with open(path) as f:
+        return HandLayout(json.load(f), path=path)
+
+@lru_cache(maxsize=None)
+def get_layout(name):
+    # name: a registered layout (file name without .json) or the path to a layout file
+    # Layouts are compiled on the first call, later calls return the same HandLayout
+    if isinstance(name, HandLayout):
+        return name
+    if name.endswith('.json') and os.path.exists(name):
+        return load_layout(name)
+    files = _layout_files()
+    if name not in files:
+        raise ValueError('Unknown hand layout {}, use one of {} or add {}.json to {}'.format(
+            name, sorted(files), name, os.pathsep.join(layout_dirs())))
+    return load_layout(files[name])
+
+def _as_batch(readings, num_taxels):
+    readings = np.asarray(readings)
+    is_single = readings.ndim == 2
+    if is_single:
+        readings = readings[None]
+    assert readings.shape[1:] == (num_taxels, 3), 'readings.shape: {}'.format(readings.shape)
+    return readings, is_single
+
+def _gather(readings, gather_index, num_sensors, num_taxels, out, is_single):
+    # Gathers (N, num_sensors, num_taxels, 3) values from (N, total_taxels, 3) readings
+    # Takes straight into out when it allows it, otherwise casts on assignment
+    shape = (readings.shape[0], num_sensors, num_taxels, 3)
+    if out is not None:
+        if is_single:
+            out = out[None]
+        assert out.shape == shape, 'out.shape: {}, expected: {}'.format(out.shape, shape)
+    take_into_out = out is not None and out.dtype == readings.dtype and out.flags.c_contiguous
+    values = np.take(
+        readings, gather_index, axis=1,
+        out=out.reshape(shape[0], -1, 3) if take_into_out else None
+    )
+    if out is None:
+        values = values.reshape(shape)
+    else:
+        if not take_into_out:
+            out[...] = values.reshape(shape)
+        values = out
+    return values[0] if is_single else values
+
+# Tables of the flat and curved hands, kept for the code written against them
+_FLAT = get_layout(FLAT_LAYOUT)
+_CURVED = get_layout(CURVED_LAYOUT)
+
+FLAT_NUM_SENSORS, FLAT_NUM_TAXELS = _FLAT.group_shapes[0]
+FLAT_TOTAL_TAXELS = _FLAT.num_taxels # 240
+
+CURVED_TOTAL_TAXELS = _CURVED.num_taxels # 368
+
+# Groups of the curved hand, in the order they are returned by remap_curved
+PALM_GROUP = _CURVED.group_ids['palm']
+FINGERTIP_GROUP = _CURVED.group_ids['fingertip']
+FINGER_GROUP = _CURVED.group_ids['finger']
+
+CURVED_GROUP_SHAPES = _CURVED.group_shapes
+FINGERTIP_SENSOR_IDS = _CURVED.groups[FINGERTIP_GROUP].sensor_ids
+
+def flat_index_table():
+    # (240, 2) array holding (sensor_id, tactile_id) for each raw point id
+    return _FLAT.sensor_table
+
+def curved_index_table():
+    # (368, 3) array holding (group, sensor index in group, tactile_id) for each raw point id
+    return _CURVED.index_table
+
+def flat_gather_index():
+    return _FLAT.gather_indices[0]
+
+def curved_gather_indices():
+    # One gather index per group, in the order of CURVED_GROUP_SHAPES
+    return _CURVED.gather_indices
+
+def remap_flat(readings, out=None):
+    # readings: (240, 3) or (N, 240, 3) raw readings ordered by point id
+    # Returns (15, 16, 3) or (N, 15, 16, 3) readings ordered by sensor and tactile id
+    # If out is given the readings are written into it instead of a new array
+    return _FLAT.remap(readings, out=None if out is None else (out,))[0]
+
+def remap_curved(readings, out=None):
+    # readings: (368, 3) or (N, 368, 3) raw readings ordered by point id
+    # Returns palm (.., 3, 24, 3), fingertip (.., 4, 30, 3) and finger (.., 11, 16, 3) readings
+    # If out is given it should be a (palm, fingertip, finger) tuple of buffers to write into
+    return _CURVED.remap(readings, out=out)
@@ -0,0 +1,222 @@
+# Live viewer of the curved hand tactile readings
+# Frames come from xServTopic (or xServHandTopic), the shared memory ring of xela_service --shm
+# or a synthetic generator. Only the newest frame is kept: the viewer renders at display rate with
+# one persistent CurvedHandRenderer and frames that arrive in between are skipped, not queued.
+# The window shows the render time, the age of the shown frame and the number of skipped frames, taken
+# from the gaps in the frame numbers so that it includes the messages dropped by the subscriber queue.
+# Usage: python live_viewer.py --source topic|shm|synthetic [--offscreen --duration 10]
+
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from xela_sensors.layout import CURVED_TOTAL_TAXELS
+from xela_sensors.renderer import CurvedHandRenderer
+
+class TopicSource:
+    # Subscribes to xServTopic (xServerMsg) or xServHandTopic (xHandMsg) and keeps the newest message
+    def __init__(self, topic='/xServTopic', hand_msg=False):
+        import rospy
+        from rospy.numpy_msg import numpy_msg
+        from xela_server.msg import xHandMsg, xServerMsg
+        from xela_sensors.capture import hand_msg_to_array, msg_to_array
+
+        self.now = rospy.get_time
+        self._msg_to_array = hand_msg_to_array if hand_msg else msg_to_array
+        # The frame counter of xela_service for xHandMsg, the seq rospy gives every message otherwise
+        self._msg_seq = (lambda msg: msg.frame) if hand_msg else (lambda msg: msg.header.seq)
+        self._lock = threading.Lock()
+        self._msg = None
+        # The conversion is done when a frame is shown, so skipped messages cost nothing
+        rospy.Subscriber(topic, numpy_msg(xHandMsg) if hand_msg else xServerMsg, self.callback, queue_size=1)
+
+    def callback(self, msg):
+        with self._lock:
+            self._msg = msg
+
+    def latest(self):
+        # (seq, stamp, (num_taxels, 3) values) of the newest message, None before the first one
+        with self._lock:
+            msg = self._msg
+        if msg is None:
+            return None
+        return self._msg_seq(msg), msg.header.stamp.to_sec(), self._msg_to_array(msg)
+
+class SharedBufferSource:
+    # Reads the newest frame of the shared memory ring written by xela_service --shm
+    def __init__(self, name=None):
+        from xela_sensors.shared_buffer import XelaSharedReader
+        self.reader = XelaSharedReader() if name is None else XelaSharedReader(name)
+        self.now = time.time
+
+    def latest(self):
+        while True:
+            frame = self.reader.latest()
+            if frame is None:
+                return None
+            seq, stamp, view = frame
+            values = np.array(view, dtype=np.float64)
+            if self.reader.is_valid(seq): # Not overwritten while it was copied
+                return seq, stamp, values
+
+class SyntheticSource:
+    # Random readings published at rate by a background thread, to test the viewer without sensors
+    def __init__(self, rate=1000, num_taxels=CURVED_TOTAL_TAXELS, seed=0):
+        self.now = time.time
+        self._rng = np.random.default_rng(seed)
+        self._base = self._rng.normal(30000, 1000, size=(num_taxels, 3))
+        self._frame = None
+        self._period = 1.0 / rate
+        threading.Thread(target=self._generate, daemon=True).start()
+
+    def _generate(self):
+        seq = 0
+        next_time = time.perf_counter()
+        while True:
+            seq += 1
+            values = self._base + self._rng.normal(0, 100, size=self._base.shape)
+            self._frame = (seq, time.time(), values)
+            next_time += self._period
+            time.sleep(max(0, next_time - time.perf_counter()))
+
+    def latest(self):
+        return self._frame
+
+class LiveViewer:
+    def __init__(self, source, fps=60, bias_frames=30, dpi=50, offscreen=False, window_name='Xela tactile sensors'):
+        # bias_frames: number of first frames averaged into the bias before anything is shown,
+        # 0 for frames that are already bias corrected (xServCalibTopic)
+        # dpi: resolution of the renderer figure, 50 gives a 500x1000 window
+        # offscreen: render without a window, for headless testing
+        self.source = source
+        self.period = 1.0 / fps
+        self.bias_frames = bias_frames
+        self.offscreen = offscreen
+        self.window_name = window_name
+        self.renderer = CurvedHandRenderer(dpi=dpi)
+
+        self._bias_sum = None
+        self._num_bias = 0
+        self.bias = None if bias_frames > 0 else 0.0
+        self._last_seq = 0
+        self._start_time = None
+        self.rendered = 0
+        self.skipped = 0 # Frames newer than the previous shown one that were never shown
+        self.missed_ticks = 0 # Display ticks that took longer than the period
+        self.render_time = 0.0
+        self.frame_age = 0.0
+        self._render_times = []
+
+    def _update_bias(self, values):
+        if self._bias_sum is None:
+            self._bias_sum = np.zeros(values.shape)
+        self._bias_sum += values
+        self._num_bias += 1
+        if self._num_bias == self.bias_frames:
+            self.bias = self._bias_sum / self._num_bias
+
+    def step(self):
+        # Renders the newest frame if there is one, returns whether something was shown
+        frame = self.source.latest()
+        if frame is None or frame[0] == self._last_seq:
+            return False
+        seq, stamp, values = frame
+        if self.bias is None:
+            self._last_seq = seq
+            self._update_bias(values)
+            return False
+
+        start = time.perf_counter()
+        if self.rendered > 0 and seq > self._last_seq: # Numbers start over when the publisher restarts
+            self.skipped += seq - self._last_seq - 1
+        self._last_seq = seq
+        image = cv2.cvtColor(self.renderer.render_reading(values - self.bias), cv2.COLOR_RGBA2BGR)
+        self.frame_age = self.source.now() - stamp
+        self.render_time = time.perf_counter() - start
+        self._render_times.append(self.render_time)
+        self.rendered += 1
+
+        self._draw_overlay(image)
+        if not self.offscreen:
+            cv2.imshow(self.window_name, image)
+        return True
+
+    def _draw_overlay(self, image):
+        lines = [
+            'render {:5.1f} ms  age {:6.1f} ms'.format(1e3 * self.render_time, 1e3 * self.frame_age),
+            'shown {}  skipped {}  late ticks {}'.format(self.rendered, self.skipped, self.missed_ticks)
+        ]
+        for line_id, line in enumerate(lines):
+            cv2.putText(image, line, (10, 20 + 18 * line_id), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 1, cv2.LINE_AA)
+
+    def run(self, duration=None):
+        # Renders at the display rate until the window is closed (q / esc) or for duration seconds
+        self._start_time = next_tick = time.perf_counter()
+        while duration is None or time.perf_counter() - self._start_time < duration:
+            self.step()
+            if not self.offscreen:
+                key = cv2.waitKey(1) & 0xFF
+                if key in (ord('q'), 27):
+                    break
+            next_tick += self.period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.missed_ticks += 1
+                next_tick = time.perf_counter() # Don't try to catch up with the missed ticks
+        if not self.offscreen:
+            cv2.destroyWindow(self.window_name)
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._start_time if self._start_time is not None else 0.0
+        render_times = np.array(self._render_times) if len(self._render_times) > 0 else np.zeros(1)
+        return dict(
+            shown = self.rendered,
+            shown_fps = self.rendered / elapsed if elapsed > 0 else 0.0,
+            skipped = self.skipped,
+            missed_ticks = self.missed_ticks,
+            render_ms_median = 1e3 * float(np.median(render_times)),
+            render_ms_p99 = 1e3 * float(np.percentile(render_times, 99))
+        )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Live view of the tactile sensor readings')
+    parser.add_argument('--source', default='topic', choices=['topic', 'shm', 'synthetic'])
+    parser.add_argument('--topic', default=None, help='Topic to subscribe to, /xServTopic or /xServHandTopic with --hand')
+    parser.add_argument('--hand', action='store_true', help='Subscribe to xHandMsg messages (xela_service --publish hand)')
+    parser.add_argument('--calibrated', action='store_true', help='Show the bias corrected frames of /xServCalibTopic')
+    parser.add_argument('--shm_name', default=None, help='Name of the shared memory ring (xela_service --shm)')
+    parser.add_argument('--rate', type=float, default=1000, help='Rate of the synthetic source')
+    parser.add_argument('--fps', type=float, default=60)
+    parser.add_argument('--bias_frames', type=int, default=30)
+    parser.add_argument('--dpi', type=int, default=50)
+    parser.add_argument('--offscreen', action='store_true', help='Render without a window')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+    args, _ = parser.parse_known_args() # Ignores the remapping arguments of roslaunch
+
+    if args.source == 'topic':
+        import rospy
+        rospy.init_node('xela_live_viewer', anonymous=True, disable_signals=True)
+        if args.calibrated:
+            args.hand = True
+            args.bias_frames = 0 # xela_service already removed the baseline
+        topic = args.topic if args.topic is not None else (
+            '/xServCalibTopic' if args.calibrated else '/xServHandTopic' if args.hand else '/xServTopic')
+        source = TopicSource(topic, hand_msg=args.hand)
+    elif args.source == 'shm':
+        source = SharedBufferSource(args.shm_name)
+    else:
+        source = SyntheticSource(rate=args.rate)
+
+    viewer = LiveViewer(source, fps=args.fps, bias_frames=args.bias_frames, dpi=args.dpi, offscreen=args.offscreen)
+    try:
+        stats = viewer.run(duration=args.duration)
+    except KeyboardInterrupt:
+        stats = viewer.stats()
+    print(' '.join('{}: {:.2f}'.format(key, value) if isinstance(value, float) else '{}: {}'.format(key, value)
+                   for key, value in stats.items()))
@@ -0,0 +1,65 @@
+# Parallel rendering of tactile recordings
+# The frame range is split in chunks that a process pool renders, each worker process keeps one
+# CurvedHandRenderer for all of its chunks. Chunks are returned in frame order and at most
+# 2 * workers chunks are in flight, so a slow consumer (e.g. a video encoder) bounds the memory use
+
+import collections
+import multiprocessing
+
+import cv2
+import numpy as np
+
+from xela_sensors.renderer import CurvedHandRenderer
+
+_RENDERER = None
+
+def _init_worker():
+    global _RENDERER
+    _RENDERER = CurvedHandRenderer()
+
+def _render_chunk(start, readings, size, image_format, renderer=None):
+    # Returns the (n, height, width, 4) rendered frames, or the number of frames if they are written as images
+    renderer = _RENDERER if renderer is None else renderer
+    frames = []
+    for offset, reading in enumerate(readings):
+        frame = renderer.render_reading(reading)
+        if size is not None:
+            frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+        if image_format is not None:
+            cv2.imwrite(image_format.format(start + offset), cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR))
+        else:
+            frames.append(frame.copy() if size is None else frame) # The renderer reuses its frame
+    if image_format is not None:
+        return len(readings)
+    return np.stack(frames)
+
+def render_chunks(readings, workers=1, bias=None, size=None, image_format=None, chunk_size=16, renderer=None):
+    # readings: sequence of (368, 3) readings, bias is subtracted from them if given
+    # size: optional (width, height) the frames are resized to in the workers
+    # image_format: e.g. 'state_{:04d}.png', the workers write the frames as images instead of returning them
+    # Yields (start frame id, frames or number of frames written) per chunk, in frame order
+    def chunk_readings(start):
+        chunk = np.asarray(readings[start:start+chunk_size], dtype=np.float64)
+        return chunk if bias is None else chunk - bias
+
+    chunks = (
+        (start, chunk_readings(start), size, image_format)
+        for start in range(0, len(readings), chunk_size)
+    )
+    if workers <= 1:
+        renderer = CurvedHandRenderer() if renderer is None else renderer
+        for chunk in chunks:
+            yield chunk[0], _render_chunk(*chunk, renderer=renderer)
+        return
+
+    # Workers are spawned rather than forked so they don't inherit the threads of a running video sink
+    with multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append((chunk[0], pool.apply_async(_render_chunk, chunk)))
+            if len(pending) >= 2 * workers:
+                start, result = pending.popleft()
+                yield start, result.get()
+        while len(pending) > 0:
+            start, result = pending.popleft()
+            yield start, result.get()
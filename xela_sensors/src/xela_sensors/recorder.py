@@ -0,0 +1,150 @@
+# Streaming recorder for tactile frames
+# Frames are collected in fixed size chunks that a background thread appends to raw files:
+#   <root>/values.bin  (N, num_taxels, 3) values
+#   <root>/stamps.bin  (N,) float64 timestamps
+#   <root>/seqs.bin    (N,) int64 sequence numbers
+#   <root>/meta.json   format, shape, dtype and the number of frames written so far
+# meta.json is replaced atomically after every chunk, so a crash only loses the frames that were not written yet.
+# With the default num_buffers=1 that is at most one chunk: append blocks while the full chunk is written.
+# More buffers let append go on while the disk catches up, but a crash can then lose up to num_buffers chunks.
+# A recorder never writes over an earlier recording, it refuses a directory that already holds one.
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+RECORDING_FORMAT = 'xela-raw-v1'
+META_FILE = 'meta.json'
+VALUES_FILE = 'values.bin'
+STAMPS_FILE = 'stamps.bin'
+SEQS_FILE = 'seqs.bin'
+
+def write_meta(root, meta):
+    tmp_path = os.path.join(root, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, os.path.join(root, META_FILE))
+
+def read_meta(root):
+    with open(os.path.join(root, META_FILE), 'r') as f:
+        meta = json.load(f)
+    assert meta['format'] == RECORDING_FORMAT, 'Unknown recording format: {}'.format(meta['format'])
+    return meta
+
+def load_chunked_recording(root):
+    # Returns read-only memmaps (values, stamps, seqs) of the frames listed in meta.json
+    meta = read_meta(root)
+    num_frames = meta['num_frames']
+    if num_frames == 0:
+        return (np.zeros((0, meta['num_taxels'], 3), dtype=meta['dtype']),
+                np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64))
+    values = np.memmap(os.path.join(root, VALUES_FILE), dtype=meta['dtype'], mode='r',
+                       shape=(num_frames, meta['num_taxels'], 3))
+    stamps = np.memmap(os.path.join(root, STAMPS_FILE), dtype=np.float64, mode='r', shape=(num_frames,))
+    seqs = np.memmap(os.path.join(root, SEQS_FILE), dtype=np.int64, mode='r', shape=(num_frames,))
+    return values, stamps, seqs
+
+class _Chunk:
+    def __init__(self, chunk_size, num_taxels, dtype):
+        self.values = np.zeros((chunk_size, num_taxels, 3), dtype=dtype)
+        self.stamps = np.zeros(chunk_size, dtype=np.float64)
+        self.seqs = np.zeros(chunk_size, dtype=np.int64)
+        self.length = 0
+
+class ChunkedRecorder:
+    def __init__(self, root, num_taxels, chunk_size=1024, dtype=np.float32, num_buffers=1, fsync=True):
+        # Memory use is fixed to num_buffers chunks, append blocks if the disk falls that far behind
+        # All of them can hold frames that are not on disk yet, see the top of this file
+        # Raises FileExistsError if root already holds a recording
+        self.root = root
+        self.num_taxels = num_taxels
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        self.meta = dict(
+            format = RECORDING_FORMAT,
+            num_taxels = num_taxels,
+            dtype = np.dtype(dtype).str,
+            chunk_size = chunk_size,
+            num_frames = 0
+        )
+        self._open()
+
+        self._free_chunks = queue.Queue()
+        for _ in range(num_buffers):
+            self._free_chunks.put(_Chunk(chunk_size, num_taxels, dtype))
+        self._full_chunks = queue.Queue()
+        self._chunk = self._free_chunks.get()
+        self._num_appended = 0
+        self._error = None
+        self._writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self._writer.start()
+
+    def __len__(self):
+        return self._num_appended
+
+    def append(self, values, stamp, seq=None):
+        # values: (num_taxels, 3) frame, it is copied into the current chunk
+        if self._error is not None:
+            raise RuntimeError('Recording to {} failed'.format(self.root)) from self._error
+        chunk = self._chunk
+        chunk.values[chunk.length] = values
+        chunk.stamps[chunk.length] = stamp
+        chunk.seqs[chunk.length] = self._num_appended if seq is None else seq
+        chunk.length += 1
+        self._num_appended += 1
+        if chunk.length == self.chunk_size:
+            self.flush()
+
+    def _open(self):
+        file_names = (META_FILE, VALUES_FILE, STAMPS_FILE, SEQS_FILE)
+        if any(os.path.exists(os.path.join(self.root, file_name)) for file_name in file_names):
+            raise FileExistsError('{} already holds a recording, record to a new directory'.format(self.root))
+        os.makedirs(self.root, exist_ok=True)
+        self._files = [open(os.path.join(self.root, file_name), 'wb') for file_name in (VALUES_FILE, STAMPS_FILE, SEQS_FILE)]
+        write_meta(self.root, self.meta)
+
+    def _write_chunk(self, chunk):
+        # Runs on the writer thread, the chunk is reused once this returns
+        for f, array in zip(self._files, (chunk.values, chunk.stamps, chunk.seqs)):
+            array[:chunk.length].tofile(f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.meta['num_frames'] += chunk.length
+        write_meta(self.root, self.meta)
+
+    def _close(self):
+        for f in self._files:
+            f.close()
+
+    def flush(self):
+        # Hand the current chunk to the writer thread and start a new one
+        if self._chunk.length == 0:
+            return
+        self._full_chunks.put(self._chunk)
+        self._chunk = self._free_chunks.get()
+
+    def _write_chunks(self):
+        while True:
+            chunk = self._full_chunks.get()
+            if chunk is None:
+                break
+            try:
+                if self._error is None:
+                    self._write_chunk(chunk)
+            except Exception as error:
+                self._error = error
+            chunk.length = 0
+            self._free_chunks.put(chunk)
+
+    def close(self):
+        # Write the last partial chunk and wait for the writer thread
+        self.flush()
+        self._full_chunks.put(None)
+        self._writer.join()
+        self._close()
+        if self._error is not None:
+            raise RuntimeError('Recording to {} failed'.format(self.root)) from self._error
@@ -0,0 +1,165 @@
+# Lazy reader for tactile recordings
+# Supported formats:
+#   - legacy pickles of XelaSaver: a list of (num_taxels, 3) frames, loaded at once since pickles can't be read lazily,
+#     with the stamps of <name>_stamps.npy next to them if XelaSaver saved them
+#   - .npy arrays of (N, num_taxels, 3) frames, memory-mapped
+#   - directories of xela_sensors.recorder.ChunkedRecorder, memory-mapped with their stamps and seqs
+#   - compressed .xtz files of xela_sensors.codec, decoded block by block as frames are read
+# Frames are only read when they are indexed, so selecting a range of a recording or
+# iterating over it in chunks works for recordings larger than memory
+
+import os
+import pickle
+
+import numpy as np
+
+from xela_sensors import align
+from xela_sensors.codec import COMPRESSED_EXTENSION, load_compressed_recording
+from xela_sensors.recorder import META_FILE, load_chunked_recording
+
+DEFAULT_CHUNK_SIZE = 4096
+
+class _FrameList:
+    # Array-like view of a list of frames, slices are stacked into arrays when they are read
+    def __init__(self, frames):
+        self.frames = frames
+        num_taxels = np.shape(frames[0])[0] if len(frames) > 0 else 0
+        self.shape = (len(frames), num_taxels, 3)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            frames = self.frames[index]
+            if len(frames) == 0:
+                return np.zeros((0,) + self.shape[1:])
+            return np.stack(frames)
+        return np.asarray(self.frames[index])
+
+class Recording:
+    def __init__(self, values, stamps=None, seqs=None, start=0, stop=None):
+        # values: (N, num_taxels, 3) array-like that is sliced lazily (memmap or _FrameList)
+        # stamps / seqs: optional (N,) arrays, start / stop: frame range of this view
+        self._values = values
+        self._stamps = stamps
+        self._seqs = seqs
+        self.start = start
+        self.stop = len(values) if stop is None else stop
+
+    @property
+    def num_taxels(self):
+        return self._values.shape[1]
+
+    @property
+    def shape(self):
+        return (len(self), self.num_taxels, 3)
+
+    @property
+    def stamps(self):
+        return None if self._stamps is None else self._stamps[self.start:self.stop]
+
+    @property
+    def seqs(self):
+        return None if self._seqs is None else self._seqs[self.start:self.stop]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        # Integers return one (num_taxels, 3) frame and slices a (n, num_taxels, 3) array
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self._values[self.start+start:self.start+stop:step]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Frame {} is out of range for {} frames'.format(index, len(self)))
+        return self._values[self.start+index]
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def select(self, start=None, stop=None):
+        # Recording of the frames [start, stop) of this one, nothing is read
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return Recording(self._values, self._stamps, self._seqs, start=self.start+start, stop=self.start+max(start, stop))
+
+    def time_range(self, start_time=None, end_time=None):
+        # Recording of the frames stamped in [start_time, end_time), in seconds from the first frame
+        stamps = self.stamps
+        if stamps is None:
+            raise ValueError('The recording has no timestamps, open it with a rate to select a time range')
+        first_stamp = stamps[0] if len(stamps) > 0 else 0.0
+        start = 0 if start_time is None else int(np.searchsorted(stamps, first_stamp + start_time, side='left'))
+        stop = len(self) if end_time is None else int(np.searchsorted(stamps, first_stamp + end_time, side='left'))
+        return self.select(start, stop)
+
+    def _checked_stamps(self):
+        if self.stamps is None:
+            raise ValueError('The recording has no timestamps, open it with a rate to align it')
+        return self.stamps
+
+    def align(self, queries, method='nearest', tolerance=None):
+        # Frames at the query stamps (seconds, same clock as the recording), see align.align_frames
+        # Returns (len(queries), num_taxels, 3) float64 frames, NaN where not valid, and the valid mask
+        return align.align_frames(self, self._checked_stamps(), queries, method=method, tolerance=tolerance)
+
+    def indices(self, queries, tolerance=None):
+        # Index of the nearest frame of every query and the valid mask, without reading any frame
+        return align.nearest_indices(self._checked_stamps(), queries, tolerance)
+
+    def iter_resample(self, rate, window=None, start=None, end=None):
+        # Yields (ticks, frames, counts) batches of the recording resampled to rate, see align.iter_resample
+        return align.iter_resample(self, self._checked_stamps(), rate, window=window, start=start, end=end)
+
+    def resample(self, rate, window=None, start=None, end=None):
+        return align.resample(self, self._checked_stamps(), rate, window=window, start=start, end=end)
+
+    def timing_stats(self, gap_factor=3.0):
+        # Rate, jitter and gaps of the recording stamps, see align.timing_stats
+        return align.timing_stats(self._checked_stamps(), gap_factor=gap_factor)
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Yields (n, num_taxels, 3) arrays of at most chunk_size frames
+        for start in range(0, len(self), chunk_size):
+            yield np.asarray(self[start:start+chunk_size])
+
+    def bias(self, window=100, start=0):
+        # Per-taxel average of the frames [start, start+window), fewer if the recording is shorter
+        frames = self.select(start, start + window)
+        if len(frames) == 0:
+            raise ValueError('No frames to compute the bias from')
+        bias_sum = np.zeros((self.num_taxels, 3))
+        for chunk in frames.iter_chunks():
+            bias_sum += chunk.sum(axis=0, dtype=np.float64)
+        return bias_sum / len(frames)
+
+def stamps_path(path):
+    # Stamps saved next to a pickle or .npy recording
+    return os.path.splitext(path)[0] + '_stamps.npy'
+
+def open_recording(path, rate=None):
+    # path: legacy .pkl, .npy, .xtz or a ChunkedRecorder directory
+    # rate: frame rate to derive the stamps of formats without timestamps, e.g. 15 for XelaSaver pickles
+    stamps = seqs = None
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            raise ValueError('{} is not a recording directory'.format(path))
+        values, stamps, seqs = load_chunked_recording(path)
+    elif path.endswith(COMPRESSED_EXTENSION):
+        values, stamps, seqs = load_compressed_recording(path)
+    elif path.endswith('.npy'):
+        values = np.load(path, mmap_mode='r')
+    else:
+        with open(path, 'rb') as f:
+            frames = pickle.load(f)
+        values = frames if isinstance(frames, np.ndarray) else _FrameList(frames)
+    if stamps is None and os.path.exists(stamps_path(path)):
+        stamps = np.load(stamps_path(path))
+        assert len(stamps) == len(values), '{} has {} stamps for {} frames'.format(stamps_path(path), len(stamps), len(values))
+
+    if stamps is None and rate is not None:
+        stamps = np.arange(len(values)) / rate
+    return Recording(values, stamps=stamps, seqs=seqs)
@@ -0,0 +1,114 @@
+# Render engine for the curved hand visualization
+# The figure, its axes and image artists are created once. Every frame all taxel circles are
+# drawn into one reusable canvas buffer and only the image data of the artists is updated.
+# Panels, their arrangement and the taxel positions come from the hand layout (layouts/curved_18.json)
+
+import cv2
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from xela_sensors.layout import CURVED_LAYOUT, get_layout
+
+CIRCLE_COLOR = (0, 255, 0, 255)
+
+_CURVED = get_layout(CURVED_LAYOUT)
+
+# Panels in the order the fingertip (4) and finger (11) readings are assigned to them
+FINGERTIP_PANELS = list(_CURVED.group('fingertip').panels)
+FINGER_PANELS = list(_CURVED.group('finger').panels)
+PALM_PANEL = 'palm'
+
+def hand_mosaic():
+    return _CURVED.mosaic
+
+# Pixel coordinates of the taxel centers in the image of each sensor type
+def sensor_coordinates():
+    # 4x4 grid, it goes from top left to bottom right row first
+    coordinates, _ = _CURVED.taxel_coordinates('finger')
+    return coordinates[:_CURVED.group('finger').num_taxels]
+
+def curved_tip_coordinates():
+    coordinates, _ = _CURVED.taxel_coordinates('fingertip')
+    return coordinates[:_CURVED.group('fingertip').num_taxels]
+
+def palm_coordinates():
+    coordinates, _ = _CURVED.taxel_coordinates('palm')
+    return coordinates
+
+def circle_params(base_coordinates, sensor_values):
+    # Centers move by x/20, y/20 pixels and the radius grows by z/10 pixels, truncated like int()
+    centers = base_coordinates + np.trunc(sensor_values[:, :2] / 20).astype(np.int64)
+    radii = np.maximum(10 + np.trunc(sensor_values[:, 2] / 10).astype(np.int64), 2)
+    return centers, radii
+
+class CurvedHandRenderer:
+    def __init__(self, figsize=(10,20), dpi=100, layout=CURVED_LAYOUT):
+        # layout: hand layout with panels and a mosaic, see xela_sensors.layout
+        self.layout = get_layout(layout)
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axs = self.figure.subplot_mosaic(self.layout.mosaic)
+
+        # One buffer for the images of all panels, panel images are views into it
+        # Panel images are RGBA like the figure buffer so they can be resized straight into it
+        panel_shapes = [shape + (4,) for shape in self.layout.panels.values()]
+        self._canvas_buffer = np.full(sum(int(np.prod(shape)) for shape in panel_shapes), 255, dtype=np.uint8)
+        self.panel_images = {}
+        start = 0
+        for name, shape in zip(self.layout.panels, panel_shapes):
+            size = int(np.prod(shape))
+            self.panel_images[name] = self._canvas_buffer[start:start+size].reshape(shape)
+            start += size
+
+        # Base coordinates of every taxel, in the order of flatten_readings, and its panel image
+        coordinates, panels = zip(*(self.layout.taxel_coordinates(group) for group in self.layout.groups))
+        self._base_coordinates = np.concatenate(coordinates)
+        self._taxel_images = [self.panel_images[name] for group_panels in panels for name in group_panels]
+
+        self.artists = {}
+        for name, ax in self.axs.items():
+            if name in self.panel_images:
+                self.artists[name] = ax.imshow(self.panel_images[name], animated=True)
+                ax.set_title(name)
+            ax.get_yaxis().set_ticks([])
+            ax.get_xaxis().set_ticks([])
+
+        # Titles and axes are drawn once, the animated images are left out of this draw.
+        # Every frame the panel images are resized straight into the pixel box of their artist
+        self.canvas.draw()
+        renderer = self.canvas.get_renderer()
+        self._frame = np.asarray(self.canvas.buffer_rgba())
+        height = self._frame.shape[0]
+        self._pastes = []
+        for name, artist in self.artists.items():
+            # The box is inset by one pixel so the pasted images never cover the axes spines
+            x0, y0, x1, y1 = np.round(artist.get_window_extent(renderer).extents).astype(int) + [1, 1, -1, -1]
+            target = self._frame[height-y1:height-y0, x0:x1]
+            self._pastes.append((self.panel_images[name], target, np.empty(target.shape, dtype=np.uint8)))
+
+    def flatten_readings(self, *group_readings):
+        # One (num_sensors, num_taxels, 3) reading per group, in the order of the layout
+        # e.g. (3, 24, 3) palm, (4, 30, 3) fingertip and (11, 16, 3) finger readings -> (368, 3)
+        return np.concatenate([np.reshape(readings, (-1, 3)) for readings in group_readings])
+
+    def draw_circles(self, sensor_values):
+        # sensor_values: (368, 3) in the order of flatten_readings, draws into the panel images
+        centers, radii = circle_params(self._base_coordinates, sensor_values)
+        self._canvas_buffer.fill(255)
+        for image, (x, y), radius in zip(self._taxel_images, centers.tolist(), radii.tolist()):
+            cv2.circle(image, (x, y), radius, color=CIRCLE_COLOR, thickness=-1)
+
+    def render(self, *group_readings):
+        # group_readings: palm, fingertip and finger readings for the curved hand (remap_curved)
+        # Returns the (height, width, 4) RGBA image of the figure, the array is reused by the next call
+        self.draw_circles(self.flatten_readings(*group_readings))
+        for image, target, resized in self._pastes:
+            cv2.resize(image, (target.shape[1], target.shape[0]), dst=resized, interpolation=cv2.INTER_LINEAR)
+            target[:] = resized
+        return self._frame
+
+    def render_reading(self, xela_readings):
+        # xela_readings: (368, 3) bias removed reading in the xela_server order
+        return self.render(*self.layout.remap(xela_readings))
@@ -1,35 +1,78 @@
 #!/usr/bin/env python
 # Script to get the sensor data from the tactile sensors (and save optionally)
 
+import argparse
 import numpy as np
 import rospy
 import pickle
-import sys
 import signal
-# import matplotlib
+import threading
 
-import matplotlib.pyplot as plt
-import matplotlib
+from rospy.numpy_msg import numpy_msg
+from xela_server.msg import xServerMsg, xHandMsg
 
-from xela_server.srv import XelaSensorXYZ
-from xela_server.msg import xServerMsg
+from xela_sensors.capture import Decimator, Resampler, hand_msg_to_array, msg_to_array
+from xela_sensors.layout import CURVED_LAYOUT, available_layouts, get_layout
+from xela_sensors.codec import COMPRESSED_EXTENSION, CompressedRecorder
+from xela_sensors.recorder import ChunkedRecorder
+from xela_sensors.recording import stamps_path
 
 
 class XelaSaver:
-    def __init__(self, topic_name, rate, total_num_taxels=None, num_sensors=15, num_taxels=16):
+    def __init__(self, topic_name, rate, total_num_taxels=None, num_sensors=15, num_taxels=16, record_root=None, chunk_size=1024,
+                 capture='poll', decimation=1, output_rate=None, hand_msg=False, record_buffers=1):
+        # capture: 'poll' records the last received message at every tick of rate,
+        #          'event' records every received message exactly once, from the subscriber callback
+        # decimation / output_rate: optionally keep every n-th frame / resample to a fixed rate (event capture)
+        # hand_msg: subscribe to xHandMsg messages (xela_service --publish hand) instead of xServerMsg
+        # record_buffers: chunks the recorder buffers ahead of the disk, a crash can lose that many
+        assert capture in ('poll', 'event'), 'Unknown capture mode: {}'.format(capture)
+        self.capture = capture
         self.rate = rospy.Rate(rate) 
 
-        # Initialize the topic callback
-        rospy.Subscriber(topic_name, xServerMsg, self.callback)
-
         self.sensor_msg = None
         if total_num_taxels is None:
             self.total_num_taxels = num_sensors * num_taxels
         else:
             self.total_num_taxels = total_num_taxels
         
-        self.curr_sensor_values = np.zeros((total_num_taxels, 3))
+        self.curr_sensor_values = np.zeros((self.total_num_taxels, 3))
         self.all_sensor_values = []
+        self.all_stamps = []
+        self.num_received = 0
+        # Frames with fewer points than the layout (e.g. another hand model) are skipped and counted
+        self.num_short = 0
+        # Stamps are kept monotonic for the alignment with other streams (xela_sensors.align):
+        # a stamp earlier than the last recorded one is recorded as the last one and counted
+        self.last_stamp = -np.inf
+        self.num_stamp_fixes = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+
+        # Streaming mode: frames are written to disk chunk by chunk instead of kept in memory
+        self.recorder = None
+        if record_root is not None and record_root.endswith(COMPRESSED_EXTENSION):
+            self.recorder = CompressedRecorder(record_root, self.total_num_taxels, chunk_size=chunk_size, num_buffers=record_buffers)
+        elif record_root is not None:
+            self.recorder = ChunkedRecorder(record_root, self.total_num_taxels, chunk_size=chunk_size, num_buffers=record_buffers)
+
+        self.sampler = None
+        if output_rate is not None:
+            self.sampler = Resampler(output_rate)
+        elif decimation > 1:
+            self.sampler = Decimator(decimation)
+
+        # Initialize the topic callback
+        if hand_msg:
+            self.msg_to_array = hand_msg_to_array
+            rospy.Subscriber(topic_name, numpy_msg(xHandMsg), self.callback)
+        else:
+            self.msg_to_array = msg_to_array
+            rospy.Subscriber(topic_name, xServerMsg, self.callback)
+            if capture == 'event':
+                rospy.loginfo('Event capture converts every xServerMsg point by point, use --hand with '
+                              'xela_service --publish hand to record the flat xHandMsg arrays instead')
 
         signal.signal(signal.SIGINT, self.end_signal_handler) 
 
@@ -37,46 +80,99 @@ class XelaSaver:
         return self.sensor_msg is not None
 
     def callback(self, data):
-        print('in the callback!')
         self.sensor_msg = data  
+        self.num_received += 1
+        if self.capture == 'event':
+            values = self.frame_values(data)
+            if values is not None:
+                self.record(values, stamp=data.header.stamp.to_sec(), seq=data.header.seq)
+
+    # (total_num_taxels, 3) values of a message, None (and counted) if it has fewer points than the layout
+    def frame_values(self, msg):
+        values = self.msg_to_array(msg)
+        if len(values) < self.total_num_taxels:
+            self.num_short += 1
+            rospy.logwarn_throttle(5, 'Skipping messages of {} points, the layout has {} taxels'.format(
+                len(values), self.total_num_taxels))
+            return None
+        return values[:self.total_num_taxels]
+
+    # Method to save one frame through the optional decimation / resampling stage
+    def record(self, values, stamp, seq=None):
+        frames = [(values, stamp)] if self.sampler is None else self.sampler(values, stamp)
+        with self._lock:
+            if self._closed:
+                return
+            for frame_values, frame_stamp in frames:
+                if frame_stamp < self.last_stamp:
+                    frame_stamp = self.last_stamp
+                    self.num_stamp_fixes += 1
+                self.last_stamp = frame_stamp
+                if self.recorder is not None:
+                    self.recorder.append(frame_values, stamp=frame_stamp, seq=seq if self.sampler is None else None)
+                else:
+                    self.all_sensor_values.append(np.array(frame_values, dtype=np.float64))
+                    self.all_stamps.append(frame_stamp)
+
+    def num_recorded(self):
+        return len(self.recorder) if self.recorder is not None else len(self.all_sensor_values)
+
+    # One tick of the rate loop, in event capture the callback already recorded everything
+    def step(self):
+        if self.capture == 'poll' and self.is_initialized():
+            msg = self.sensor_msg
+            values = self.frame_values(msg)
+            if values is not None:
+                self.curr_sensor_values[:] = values
+                self.record(self.curr_sensor_values, stamp=msg.header.stamp.to_sec(), seq=msg.header.seq)
 
     # Function to run and get the data 
     def run(self):
-        while not rospy.is_shutdown():
-            if self.is_initialized():
-                print('got the data')
-                self.get_data()
-                self.all_sensor_values.append(self.curr_sensor_values.copy())
-                print('len(self.all_sensor_values): {}'.format(len(self.all_sensor_values)))
+        while not rospy.is_shutdown() and not self._stop.is_set():
+            self.step()
+            rospy.loginfo_throttle(5, 'Received {} messages, recorded {} frames, skipped {} short frames, fixed {} stamps'.format(
+                self.num_received, self.num_recorded(), self.num_short, self.num_stamp_fixes))
             self.rate.sleep()
+        self.dump()
+        rospy.signal_shutdown('Ctrl C pressed')
     
     # Method to convert sensor msg to sensor values on numpy
     def get_data(self):
-        for taxel_id in range(self.total_num_taxels):
-            curr_sensor_msg = self.sensor_msg.points[taxel_id]
-            curr_sensor_value = [
-                curr_sensor_msg.point.x,
-                curr_sensor_msg.point.y,
-                curr_sensor_msg.point.z
-            ]
-            self.curr_sensor_values[taxel_id] = curr_sensor_value
-            print('taxel_id: {} - curr_sensor_value: {}'.format(
-                taxel_id, curr_sensor_value
-            ))
-        
+        self.curr_sensor_values[:] = self.msg_to_array(self.sensor_msg)[:self.total_num_taxels]
         return self.curr_sensor_values
 
     def dump(self):
+        with self._lock:
+            self._closed = True
+        if self.recorder is not None:
+            self.recorder.close()
+            return
         with open('sensor_values.pkl', 'wb') as pkl: # NOTE: Since this is just a trial we're just going to dump the data right next to the script
             pickle.dump(self.all_sensor_values, pkl, pickle.HIGHEST_PROTOCOL)
+        np.save(stamps_path('sensor_values.pkl'), np.array(self.all_stamps, dtype=np.float64))
 
     def end_signal_handler(self, signum, frame):
-        self.dump()
-        rospy.signal_shutdown('Ctrl C pressed')
-        exit(1)
+        # Only stops the loop, run() dumps once it ends: the handler runs on the main thread,
+        # which may be in record() holding the lock dump() takes
+        self._stop.set()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Save the tactile sensor readings')
+    parser.add_argument('--record', default=None, help='Stream the readings to this directory, or to a compressed file if it ends with .xtz, instead of sensor_values.pkl')
+    parser.add_argument('--chunk_size', type=int, default=1024, help='Frames per chunk written in streaming mode')
+    parser.add_argument('--buffers', type=int, default=1, help='Chunks buffered ahead of the disk in streaming mode, more keep up with a slow disk but a crash can lose that many')
+    parser.add_argument('--capture', default='poll', choices=['poll', 'event'], help='Record the last message at 15 Hz or every message once')
+    parser.add_argument('--decimation', type=int, default=1, help='Keep every n-th message (event capture)')
+    parser.add_argument('--output_rate', type=float, default=None, help='Resample the messages to this rate (event capture)')
+    parser.add_argument('--hand', action='store_true', help='Subscribe to the xHandMsg topic (xela_service --publish hand)')
+    parser.add_argument('--layout', default=CURVED_LAYOUT, help='Hand layout, one of {}'.format(available_layouts()))
+    args = parser.parse_args(rospy.myargv()[1:])
+
     rospy.init_node('xela_saver', disable_signals=True)
-    topic_name = '/xServTopic'
-    reader = XelaSaver(topic_name, total_num_taxels=368, rate=15)
-    reader.run()
\ No newline at end of file
+    topic_name = '/xServHandTopic' if args.hand else '/xServTopic'
+    reader = XelaSaver(
+        topic_name, total_num_taxels=get_layout(args.layout).num_taxels, rate=15, record_root=args.record, chunk_size=args.chunk_size,
+        capture=args.capture, decimation=args.decimation, output_rate=args.output_rate, hand_msg=args.hand,
+        record_buffers=args.buffers
+    )
+    reader.run()
@@ -0,0 +1,56 @@
+# Reader for the shared memory ring of tactile frames written by xela_service (--shm)
+# Frames are returned as numpy views on the shared memory, without copies
+
+import time
+
+from xela_server.shared_ring import DEFAULT_NAME, NEWEST_ID, attach
+
+class XelaSharedReader:
+    def __init__(self, name=DEFAULT_NAME):
+        self._shm, (self._header, self._seqs, self._stamps, self._frames) = attach(name)
+        self.capacity = self._frames.shape[0]
+        self.num_taxels = self._frames.shape[1]
+
+    def newest_seq(self):
+        # Sequence number of the newest complete frame, 0 if nothing was written yet
+        return int(self._header[NEWEST_ID])
+
+    def is_valid(self, seq):
+        # Whether the frame seq is still in its slot - check this after using a view
+        # to make sure the writer did not overwrite it meanwhile
+        return seq > 0 and self._seqs[seq % self.capacity] == seq
+
+    def get(self, seq):
+        # (stamp, (num_taxels, 3) view) of frame seq, None if it is not in the ring
+        slot = seq % self.capacity
+        stamp = float(self._stamps[slot])
+        if not self.is_valid(seq):
+            return None
+        return stamp, self._frames[slot]
+
+    def latest(self):
+        # (seq, stamp, view) of the newest frame, None if nothing was written yet
+        while True:
+            seq = self.newest_seq()
+            if seq == 0:
+                return None
+            frame = self.get(seq)
+            if frame is not None:
+                return (seq,) + frame
+
+    def wait(self, after_seq=0, timeout=None, poll_interval=1e-4):
+        # Blocks until a frame newer than after_seq is written and returns it like latest()
+        # poll_interval=0 spins, timeout=0 only polls once - returns None on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.newest_seq() > after_seq:
+                frame = self.latest()
+                if frame is not None:
+                    return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        self._header = self._seqs = self._stamps = self._frames = None
+        self._shm.close()
@@ -0,0 +1,147 @@
+# Streaming video sinks for rendered frames
+# Frames are sent straight to an encoder, either an ffmpeg subprocess reading raw video from
+# stdin or cv2.VideoWriter, so no intermediate image files are written
+
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+VIDEO_BACKENDS = ['ffmpeg', 'opencv']
+
+class VideoSink:
+    # Base class: frames are copied into a bounded queue and encoded by a background thread,
+    # so rendering the next frame and encoding the previous ones run in parallel.
+    # fps: output frame rate, size: optional (width, height) of the video, defaults to the frame size
+    def __init__(self, path, fps=10, size=None, queue_size=8):
+        self.path = path
+        self.fps = fps
+        self.size = size
+        self.num_frames = 0
+        self._frame_shape = None
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, frame):
+        # frame: (height, width, 3) RGB or (height, width, 4) RGBA uint8 image, it can be reused after this call
+        if self._error is not None:
+            raise RuntimeError('Encoding {} failed'.format(self.path)) from self._error
+        if self._frame_shape is None:
+            assert frame.ndim == 3 and frame.shape[2] in (3, 4), 'Frames should be RGB or RGBA images'
+            self._frame_shape = frame.shape
+            self._open(frame.shape)
+            self._writer = threading.Thread(target=self._encode_frames, daemon=True)
+            self._writer.start()
+        assert frame.shape == self._frame_shape, 'Frame shape changed from {} to {}'.format(self._frame_shape, frame.shape)
+        self._queue.put(np.array(frame, dtype=np.uint8))
+        self.num_frames += 1
+
+    def _encode_frames(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._encode(frame)
+            except Exception as error:
+                self._error = error
+
+    def close(self):
+        # Encode the queued frames and finalize the file
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+            self._finish()
+        if self._error is not None:
+            raise RuntimeError('Encoding {} failed'.format(self.path)) from self._error
+
+    def _open(self, frame_shape):
+        raise NotImplementedError
+
+    def _encode(self, frame):
+        raise NotImplementedError
+
+    def _finish(self):
+        raise NotImplementedError
+
+class FFmpegVideoSink(VideoSink):
+    # Pipes raw frames to `ffmpeg -f rawvideo -i -` which encodes them in its own process
+    def __init__(self, path, fps=10, size=None, queue_size=8, codec='libx264', ffmpeg='ffmpeg'):
+        super().__init__(path, fps=fps, size=size, queue_size=queue_size)
+        self.codec = codec
+        self.ffmpeg = ffmpeg
+        self._process = None
+
+    def _open(self, frame_shape):
+        height, width, channels = frame_shape
+        command = [
+            self.ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgba' if channels == 4 else 'rgb24',
+            '-s', '{}x{}'.format(width, height), '-r', str(self.fps), '-i', '-',
+            '-an', '-c:v', self.codec, '-pix_fmt', 'yuv420p'
+        ]
+        if self.size is not None:
+            command += ['-vf', 'scale={}x{},setsar=1:1'.format(*self.size)]
+        command.append(self.path)
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def _encode(self, frame):
+        self._process.stdin.write(frame.data)
+
+    def _finish(self):
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self._process.wait() != 0 and self._error is None:
+            self._error = RuntimeError('ffmpeg exited with {}'.format(self._process.returncode))
+
+class OpenCVVideoSink(VideoSink):
+    # Encodes in this process with cv2.VideoWriter, for machines without ffmpeg
+    def __init__(self, path, fps=10, size=None, queue_size=8, fourcc='mp4v'):
+        super().__init__(path, fps=fps, size=size, queue_size=queue_size)
+        self.fourcc = fourcc
+        self._video_writer = None
+
+    def _open(self, frame_shape):
+        import cv2 # Only this backend needs it, the ffmpeg one starts without importing cv2
+        self._cv2 = cv2
+        height, width, _ = frame_shape
+        self._conversion = cv2.COLOR_RGBA2BGR if frame_shape[2] == 4 else cv2.COLOR_RGB2BGR
+        self._output_size = (width, height) if self.size is None else tuple(self.size)
+        self._video_writer = cv2.VideoWriter(
+            self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self._output_size)
+        if not self._video_writer.isOpened():
+            raise RuntimeError('Could not open {} with cv2.VideoWriter'.format(self.path))
+
+    def _encode(self, frame):
+        cv2 = self._cv2
+        frame = cv2.cvtColor(frame, self._conversion)
+        if frame.shape[1::-1] != self._output_size:
+            frame = cv2.resize(frame, self._output_size, interpolation=cv2.INTER_AREA)
+        self._video_writer.write(frame)
+
+    def _finish(self):
+        self._video_writer.release()
+
+def open_video_sink(path, fps=10, size=None, backend=None, **kwargs):
+    # backend: 'ffmpeg', 'opencv' or None to use ffmpeg when it is installed
+    if backend is None:
+        backend = 'ffmpeg' if shutil.which('ffmpeg') is not None else 'opencv'
+    if backend == 'ffmpeg':
+        return FFmpegVideoSink(path, fps=fps, size=size, **kwargs)
+    if backend == 'opencv':
+        return OpenCVVideoSink(path, fps=fps, size=size, **kwargs)
+    raise ValueError('Unknown video backend {}, use one of {}'.format(backend, VIDEO_BACKENDS))
@@ -0,0 +1,5 @@
+# Lets pytest import xela_sensors from the source tree without a catkin workspace
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
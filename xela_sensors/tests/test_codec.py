@@ -0,0 +1,133 @@
+# Round trips of the .xtz recording codec, seeks inside blocks and recordings cut short or corrupted
+
+import os
+
+import numpy as np
+import pytest
+
+from xela_sensors import codec
+from xela_sensors.recording import open_recording
+
+NUM_TAXELS = 20
+BLOCK_SIZE = 16
+NUM_FRAMES = 100 # 6 full blocks and one of 4 frames
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def slow_frames(rng, num_frames=NUM_FRAMES, num_taxels=NUM_TAXELS):
+    # Raw 16 bit readings: a per-taxel offset with a little noise
+    offsets = rng.integers(20000, 40000, size=(1, num_taxels, 3))
+    return (offsets + rng.integers(-4, 5, size=(num_frames, num_taxels, 3))).astype(np.float64)
+
+def write_recording(path, frames, block_size=BLOCK_SIZE):
+    stamps = 10.0 + np.arange(len(frames)) / 100.0
+    writer = codec.CompressedWriter(path, frames.shape[1], block_size=block_size)
+    writer.write(frames, stamps)
+    writer.close()
+    return stamps
+
+def test_values_round_trip_uint16(rng):
+    values = rng.integers(0, 2**16, size=(50, NUM_TAXELS, 3)).astype('<u2')
+    values[1] = 0 # Differences of the full range in both directions
+    values[2] = 2**16 - 1
+    payload = codec.encode_values(values)
+    decoded = codec.decode_values(payload, len(values), NUM_TAXELS, '<u2')
+    assert decoded.dtype == np.dtype('<u2')
+    np.testing.assert_array_equal(decoded, values)
+
+def test_values_round_trip_int32_wrapping_deltas(rng):
+    info = np.iinfo(np.int32)
+    values = rng.integers(info.min, info.max, size=(50, NUM_TAXELS, 3), endpoint=True).astype('<i4')
+    values[0::2, 0] = info.max # Every difference of this taxel overflows 32 bits
+    values[1::2, 0] = info.min
+    payload = codec.encode_values(values)
+    decoded = codec.decode_values(payload, len(values), NUM_TAXELS, '<i4')
+    assert decoded.dtype == np.dtype('<i4')
+    np.testing.assert_array_equal(decoded, values)
+
+def test_integer_dtype(rng):
+    assert codec.integer_dtype(slow_frames(rng)) == np.dtype('<u2')
+    assert codec.integer_dtype(np.array([[[-1.0, 0.0, 2.0**20]]])) == np.dtype('<i4')
+    with pytest.raises(ValueError):
+        codec.integer_dtype(np.array([[[0.5, 0.0, 0.0]]]))
+
+def test_writer_round_trip(tmp_path, rng):
+    path = str(tmp_path / 'frames.xtz')
+    frames = slow_frames(rng)
+    stamps = write_recording(path, frames)
+
+    recording = open_recording(path)
+    assert recording._values.num_blocks == 7
+    assert recording.shape == frames.shape
+    np.testing.assert_array_equal(recording[:], frames)
+    np.testing.assert_array_equal(recording.stamps, stamps)
+    np.testing.assert_array_equal(recording.seqs, np.arange(NUM_FRAMES))
+    np.testing.assert_array_equal(np.concatenate(list(recording.iter_chunks(chunk_size=10))), frames)
+
+def test_seeks_inside_blocks(tmp_path, rng):
+    path = str(tmp_path / 'frames.xtz')
+    frames = slow_frames(rng)
+    write_recording(path, frames)
+    values = codec.CompressedValues(path)
+
+    # Frames in the middle and at the ends of blocks, in an order that leaves the cached block every time
+    for index in (37, 5, BLOCK_SIZE - 1, BLOCK_SIZE, 99, 0, 3 * BLOCK_SIZE + 7, -1, -NUM_FRAMES):
+        np.testing.assert_array_equal(values[index], frames[index])
+    # Slices inside one block, across blocks and with steps
+    for index in (slice(18, 25), slice(10, 40), slice(33, 97, 5), slice(90, None), slice(50, 40)):
+        np.testing.assert_array_equal(values[index], frames[index])
+    with pytest.raises(IndexError):
+        values[NUM_FRAMES]
+    values.close()
+
+def test_truncated_last_block_is_dropped(tmp_path, rng):
+    path = str(tmp_path / 'frames.xtz')
+    frames = slow_frames(rng)
+    write_recording(path, frames)
+    with open(path, 'rb') as f:
+        data = f.read()
+    values = codec.CompressedValues(path)
+    last_block = values._blocks[-1].offset - codec.BLOCK_HEADER.size
+    values.close()
+    kept_frames = NUM_FRAMES - NUM_FRAMES % BLOCK_SIZE
+
+    # Cut in the block header, in the stamps and in the values of the last block
+    for size in (last_block + 3, last_block + codec.BLOCK_HEADER.size + 2, len(data) - 1):
+        truncated = str(tmp_path / 'truncated_{}.xtz'.format(size))
+        with open(truncated, 'wb') as f:
+            f.write(data[:size])
+        recording = open_recording(truncated)
+        assert len(recording) == kept_frames
+        assert len(recording.stamps) == len(recording.seqs) == kept_frames
+        np.testing.assert_array_equal(recording[:], frames[:kept_frames])
+
+def test_crc_mismatch_raises(tmp_path, rng):
+    path = str(tmp_path / 'frames.xtz')
+    frames = slow_frames(rng)
+    write_recording(path, frames)
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END) # Last byte of the values of the last block
+        last_byte = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last_byte[0] ^ 0xff]))
+
+    values = codec.CompressedValues(path)
+    assert len(values) == NUM_FRAMES
+    np.testing.assert_array_equal(values[:BLOCK_SIZE], frames[:BLOCK_SIZE]) # The other blocks still decode
+    with pytest.raises(ValueError, match='crc'):
+        values[NUM_FRAMES - 1]
+    values.close()
+
+def test_compressed_recorder_round_trip(tmp_path, rng):
+    path = str(tmp_path / 'recorder.xtz')
+    frames = slow_frames(rng)
+    recorder = codec.CompressedRecorder(path, NUM_TAXELS, chunk_size=BLOCK_SIZE, fsync=False)
+    for seq, frame in enumerate(frames):
+        recorder.append(frame, stamp=seq / 100.0, seq=seq)
+    recorder.close()
+
+    recording = open_recording(path)
+    np.testing.assert_array_equal(recording[:], frames)
+    np.testing.assert_array_equal(recording.seqs, np.arange(NUM_FRAMES))
@@ -0,0 +1,187 @@
+# Equivalence of the layout registry with the hard-coded index functions it replaced
+# The baseline functions are frozen below as they were in xela_sensors.utils, with the one documented fix:
+# the first row of finger1tip read [-1, 101, 83, -1, 1], which mapped point 101 to tactile id -1, and is
+# [-1, -1, 101, 83, -1, -1] like the other fingertips
+
+import numpy as np
+import pytest
+
+from xela_sensors import layout, utils
+
+def baseline_get_tactile_index(point_id):
+    # Find which finger is this index
+    is_thumb = point_id < 48
+    if is_thumb:
+        num_of_rows = 12
+        finger_id = 0
+        scaled_point_id = point_id
+    else:
+        num_of_rows = 16
+        finger_id = int((point_id - 48) / 64) + 1
+        scaled_point_id = (point_id - 48) % 64
+
+    column_id = int(scaled_point_id / num_of_rows) # Column in the whole finger
+    row_id = scaled_point_id % num_of_rows # Row in the whole finger
+
+    sensor_id_in_finger = int(row_id / 4)
+    row_id_on_sensor = int(row_id % 4)
+    tactile_id = row_id_on_sensor * 4 + column_id
+    sensor_id = sensor_id_in_finger
+    if finger_id > 0:
+        sensor_id += 3 + (finger_id-1) * 4
+
+    return sensor_id, tactile_id
+
+palm1=[[119, 140, 148, 152, 160, 181],[ 120, 141, 149, 153, 161, 182], [121, 142,150,154,162,183],[ 122, 143, 151, 155, 163, 184]]
+palm2= [[238, 250, 258, 270 , 295, 321],[ 239, 251, 259, 271, 296, 322],[ 240 ,252, 260, 272, 297,323],[241,253,261, 273, 298 , 324]]
+palm3= [[242, 254, 262, 274, 299, 325],[243, 255, 263, 275, 300, 326],[244, 256, 264, 276, 301, 327],[245, 257, 265, 277, 302, 328]]
+finger1tip= [[-1, -1, 101, 83, -1, -1],[-1, 123, 102, 84, 66, -1],[144, 124 , 103, 85, 67, 62],[145, 125, 104, 86, 68, 63],[146,126, 105, 87, 69,64], [147, 127, 106, 88, 70 , 65]]
+finger2tip= [[-1, -1, 203, 185, -1, -1],[ -1 , 221 , 204,186, 164,-1],[246, 222, 205, 187, 165, 156],[247, 223, 206 , 188, 166, 157],[248, 224, 207, 189, 167,158],[249, 225,208, 190 ,168, 159]]
+finger3tip= [[-1, -1, 329, 303, -1, -1],[ -1, 347, 330 , 304, 278, -1],[364, 348, 331, 305, 279 , 266],[ 365 , 349 , 332, 306, 280, 267],[366 , 350 , 333, 307, 281, 268],[367, 351, 334, 308 , 282, 269]]
+thumbtip= [[-1, -1, 31, 17, -1 , -1],[-1, 45, 32, 18 , 4 , -1],[58 , 46, 33, 19 , 5 , 0],[59 , 47 , 34, 20 , 6 , 1],[60 , 48, 35, 21, 7, 2],[61, 49 , 36, 22 , 8 ,3]]
+thumbsensor1= [ [50 , 37, 23, 9],[51, 38, 24, 10],[52, 39, 25, 11],[ 53, 40 , 26, 12]]
+thumbsensor2= [[54 , 41, 27, 13],[55, 42, 28, 14], [56, 43, 29, 15], [57, 44, 30, 16]]
+finger1sensor1= [[128, 107, 89, 71],[129, 108,  90, 72],[130, 109, 91, 73],[ 131, 110, 92, 74]]
+finger1sensor2= [[132, 111, 93, 75],[133 , 112, 94, 76],[134, 113 , 95, 77],[135, 114, 96, 78]]
+finger1sensor3= [[136, 115, 97, 79],[137, 116, 98, 80],[138, 117, 99, 81],[139 , 118 , 100 ,82]]
+finger2sensor1= [[226, 209, 191, 169],[227 ,210, 192, 170],[228, 211, 193, 171],[ 229, 212, 194, 172]]
+finger2sensor2= [[230, 213, 195, 173],[231, 214, 196, 174],[232, 215 ,197, 175],[ 233 , 216, 198, 176]]
+finger2sensor3= [[234, 217 ,199, 177],[235, 218, 200 , 178],[236, 219, 201, 179],[237, 220, 202, 180]]
+finger3sensor1= [[352, 335, 309, 283],[353 , 336, 310, 284],[354, 337, 311, 285],[355, 338, 312, 286]]
+finger3sensor2= [[356, 339, 313, 287],[357, 340, 314, 288],[358, 341, 315, 289],[359, 342, 316, 290]]
+finger3sensor3= [[360, 343, 317, 291],[361, 344, 318 , 292],[362, 345, 319, 293],[363, 346, 320, 294]]
+
+# (sensor_id, table, is_tip) in the order the baseline tested them
+BASELINE_CURVED_SENSORS = [
+    (15, palm1, False), (16, palm2, False), (17, palm3, False),
+    (0, thumbtip, True), (1, thumbsensor1, False), (2, thumbsensor2, False),
+    (3, finger1tip, True), (4, finger1sensor1, False), (5, finger1sensor2, False), (6, finger1sensor3, False),
+    (7, finger2tip, True), (8, finger2sensor1, False), (9, finger2sensor2, False), (10, finger2sensor3, False),
+    (11, finger3tip, True), (12, finger3sensor1, False), (13, finger3sensor2, False), (14, finger3sensor3, False),
+]
+
+def search(l,value):
+    for i,v in enumerate(l):
+        if value in v:
+            return {'row':i,'col':v.index(value)}
+    return {'row':-1,'col':-1}
+
+def baseline_get_curved_tactile_index(point_id):
+    # The if / elif chain of the baseline, one branch per entry of BASELINE_CURVED_SENSORS
+    for sensor_id, table, is_tip in BASELINE_CURVED_SENSORS:
+        if any(point_id in sub for sub in table):
+            row_column = search(table, point_id)
+            row = row_column['row']
+            column = row_column['col']
+            if not is_tip:
+                tactile_id = row*len(table[0])+column
+            elif row==0:
+                tactile_id=row*6 +column - 2
+            elif row==1:
+                tactile_id=row*6+column-5
+            else:
+                tactile_id=row*6+column-6
+            return sensor_id, tactile_id
+    raise AssertionError('Point {} is on no sensor'.format(point_id))
+
+# Sensor ids of the curved hand in each group of remap_curved, in order
+CURVED_GROUPS = (
+    (15, 16, 17), # Palm
+    (0, 3, 7, 11), # Fingertips
+    (1, 2, 4, 5, 6, 8, 9, 10, 12, 13, 14), # Fingers
+)
+
+def baseline_curved_slot(point_id):
+    # (group, sensor index in group, tactile_id) of a point id
+    sensor_id, tactile_id = baseline_get_curved_tactile_index(point_id)
+    for group_id, sensor_ids in enumerate(CURVED_GROUPS):
+        if sensor_id in sensor_ids:
+            return group_id, sensor_ids.index(sensor_id), tactile_id
+
+def baseline_convert_sensor_values(sensor_values):
+    converted_sensor_values = np.zeros((len(sensor_values), 15, 16, 3))
+    for timestep in range(len(sensor_values)):
+        for point_id in range(sensor_values[timestep].shape[0]):
+            sensor_id, tactile_id = baseline_get_tactile_index(point_id)
+            converted_sensor_values[timestep, sensor_id, tactile_id, :] = sensor_values[timestep][point_id,:]
+    avg_sensor_values = np.average(converted_sensor_values, axis=(0,1,2))
+    return converted_sensor_values - avg_sensor_values, avg_sensor_values
+
+def baseline_convert_curved_tactile_sensor_values(sensor_values):
+    # The baseline converter never ran (it filled palm only and subtracted an undefined array),
+    # this is what it was meant to compute
+    converted = [np.zeros((len(sensor_values),) + shape + (3,)) for shape in layout.CURVED_GROUP_SHAPES]
+    for timestep in range(len(sensor_values)):
+        for point_id in range(sensor_values[timestep].shape[0]):
+            group_id, sensor_index, tactile_id = baseline_curved_slot(point_id)
+            converted[group_id][timestep, sensor_index, tactile_id] = sensor_values[timestep][point_id]
+    avg_sensor_values = np.average(np.asarray(sensor_values, dtype=np.float64), axis=(0,1))
+    return [values - avg_sensor_values for values in converted], avg_sensor_values
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def test_flat_index_table():
+    table = layout.flat_index_table()
+    assert table.shape == (layout.FLAT_TOTAL_TAXELS, 2)
+    for point_id in range(layout.FLAT_TOTAL_TAXELS):
+        assert tuple(table[point_id]) == baseline_get_tactile_index(point_id)
+        assert utils.get_tactile_index(point_id) == baseline_get_tactile_index(point_id)
+
+def test_curved_index_table():
+    table = layout.curved_index_table()
+    assert table.shape == (layout.CURVED_TOTAL_TAXELS, 3)
+    for point_id in range(layout.CURVED_TOTAL_TAXELS):
+        assert tuple(table[point_id]) == baseline_curved_slot(point_id)
+        assert utils.get_curved_tactile_index(point_id) == baseline_get_curved_tactile_index(point_id)
+
+def test_curved_slots_are_distinct():
+    slots = set(baseline_curved_slot(point_id) for point_id in range(layout.CURVED_TOTAL_TAXELS))
+    assert len(slots) == layout.CURVED_TOTAL_TAXELS
+
+def test_remap_flat(rng):
+    readings = rng.integers(0, 2**16, size=(5, layout.FLAT_TOTAL_TAXELS, 3))
+    remapped = layout.remap_flat(readings)
+    assert remapped.shape == (5, 15, 16, 3)
+    for point_id in range(layout.FLAT_TOTAL_TAXELS):
+        sensor_id, tactile_id = baseline_get_tactile_index(point_id)
+        np.testing.assert_array_equal(remapped[:, sensor_id, tactile_id], readings[:, point_id])
+    np.testing.assert_array_equal(layout.remap_flat(readings[0]), remapped[0])
+
+def test_remap_curved(rng):
+    readings = rng.integers(0, 2**16, size=(5, layout.CURVED_TOTAL_TAXELS, 3))
+    remapped = layout.remap_curved(readings)
+    assert tuple(values.shape[1:3] for values in remapped) == layout.CURVED_GROUP_SHAPES
+    for point_id in range(layout.CURVED_TOTAL_TAXELS):
+        group_id, sensor_index, tactile_id = baseline_curved_slot(point_id)
+        np.testing.assert_array_equal(remapped[group_id][:, sensor_index, tactile_id], readings[:, point_id])
+
+def test_remap_curved_into_out(rng):
+    readings = rng.integers(0, 2**16, size=(layout.CURVED_TOTAL_TAXELS, 3)).astype(np.float64)
+    out = tuple(np.empty(shape + (3,)) for shape in layout.CURVED_GROUP_SHAPES)
+    remapped = layout.remap_curved(readings, out=out)
+    for values, expected in zip(remapped, layout.remap_curved(readings)):
+        np.testing.assert_array_equal(values, expected)
+    assert all(np.shares_memory(values, buffer) for values, buffer in zip(remapped, out))
+
+def test_batch_convert_sensor_values(rng):
+    frames = list(rng.integers(0, 2**16, size=(4, layout.FLAT_TOTAL_TAXELS, 3)).astype(np.float64))
+    expected, expected_avg = baseline_convert_sensor_values(frames)
+    converted, avg_sensor_values = utils.batch_convert_sensor_values(frames)
+    np.testing.assert_allclose(converted, expected)
+    np.testing.assert_allclose(avg_sensor_values, expected_avg)
+
+def test_batch_convert_curved_tactile_sensor_values(rng):
+    frames = list(rng.integers(0, 2**16, size=(4, layout.CURVED_TOTAL_TAXELS, 3)).astype(np.float64))
+    expected, expected_avg = baseline_convert_curved_tactile_sensor_values(frames)
+    converted, avg_sensor_values = utils.batch_convert_curved_tactile_sensor_values(frames)
+    for values, expected_values in zip(converted, expected):
+        np.testing.assert_allclose(values, expected_values)
+    np.testing.assert_allclose(avg_sensor_values, expected_avg)
+
+def test_batch_convert_chunks_match_whole(rng):
+    frames = rng.integers(0, 2**16, size=(10, layout.FLAT_TOTAL_TAXELS, 3)).astype(np.float64)
+    whole, _ = utils.batch_convert_sensor_values(frames)
+    chunked, _ = utils.batch_convert_sensor_values(iter([frames[:3], frames[3:]]))
+    np.testing.assert_allclose(chunked, whole)
@@ -0,0 +1,56 @@
+# Streaming recorders: frames on disk, crash loss bound and earlier recordings left alone
+
+import os
+
+import numpy as np
+import pytest
+
+from xela_sensors.codec import CompressedRecorder
+from xela_sensors.recorder import ChunkedRecorder, load_chunked_recording, read_meta
+
+NUM_TAXELS = 4
+CHUNK_SIZE = 3
+
+def frame(value):
+    return np.full((NUM_TAXELS, 3), value)
+
+def test_round_trip(tmp_path):
+    root = str(tmp_path / 'recording')
+    recorder = ChunkedRecorder(root, NUM_TAXELS, chunk_size=CHUNK_SIZE, fsync=False)
+    for seq in range(10):
+        recorder.append(frame(seq), stamp=seq / 10.0, seq=100 + seq)
+    recorder.close()
+    values, stamps, seqs = load_chunked_recording(root)
+    np.testing.assert_array_equal(values[:, 0, 0], np.arange(10))
+    np.testing.assert_array_equal(stamps, np.arange(10) / 10.0)
+    np.testing.assert_array_equal(seqs, 100 + np.arange(10))
+
+def test_at_most_one_chunk_is_not_on_disk(tmp_path):
+    # With the default single buffer a full chunk is on disk before append takes the next frame
+    root = str(tmp_path / 'recording')
+    recorder = ChunkedRecorder(root, NUM_TAXELS, chunk_size=CHUNK_SIZE, fsync=False)
+    for seq in range(3 * CHUNK_SIZE + 1):
+        recorder.append(frame(seq), stamp=float(seq))
+        assert len(recorder) - read_meta(root)['num_frames'] <= CHUNK_SIZE
+    recorder.close()
+
+@pytest.mark.parametrize('existing', ['meta.json', 'values.bin'])
+def test_existing_recording_is_not_overwritten(tmp_path, existing):
+    root = str(tmp_path / 'recording')
+    os.makedirs(root)
+    with open(os.path.join(root, existing), 'w') as f:
+        f.write('earlier session')
+    with pytest.raises(FileExistsError):
+        ChunkedRecorder(root, NUM_TAXELS, chunk_size=CHUNK_SIZE)
+    with open(os.path.join(root, existing)) as f:
+        assert f.read() == 'earlier session'
+
+def test_existing_compressed_recording_is_not_overwritten(tmp_path):
+    path = str(tmp_path / 'recording.xtz')
+    recorder = CompressedRecorder(path, NUM_TAXELS, chunk_size=CHUNK_SIZE, fsync=False)
+    recorder.append(frame(1), stamp=0.0)
+    recorder.close()
+    size = os.path.getsize(path)
+    with pytest.raises(FileExistsError):
+        CompressedRecorder(path, NUM_TAXELS, chunk_size=CHUNK_SIZE)
+    assert os.path.getsize(path) == size
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Micro-benchmark of the per-sensor contact features of xela_service (xela_server.features)
+
+Times ContactFeatures.update on synthetic bias corrected frames of the curved hand (one xela
+sensor of 368 taxels split into 18 sensors by its layout), without ROS. A few sensors are pressed
+in every frame so the contact hysteresis switches. Usage:
+    python bench_features.py [--layout ../../xela_sensors/src/xela_sensors/layouts/curved_18.json] [--frames 20000]
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+
+from xela_server.features import ContactFeatures
+
+CURVED_LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "..", "xela_sensors", "src", "xela_sensors", "layouts", "curved_18.json")
+
+def synthetic_frames(num_frames, num_taxels, seed=0):
+    '''Noise around zero with a moving press of a few hundred counts'''
+    rng = np.random.default_rng(seed)
+    frames = rng.normal(0, 20, size=(num_frames, num_taxels, 3)).astype(np.float32)
+    for index in range(num_frames):
+        start = (index * 7) % num_taxels
+        frames[index, start:start + 24, 2] += 400 * (1 + np.sin(index / 50))
+    return frames
+
+def main():
+    argp = argparse.ArgumentParser(description="Benchmark the contact features of xela_service")
+    argp.add_argument("--layout", default=CURVED_LAYOUT, help="Hand layout json, empty for one sensor per xela sensor")
+    argp.add_argument("--frames", type=int, default=20000)
+    argp.add_argument("--taxels", type=int, default=368)
+    argp.add_argument("--sensors", type=int, default=1, help="xela sensors the taxels are split into")
+    args = argp.parse_args()
+
+    per_sensor = args.taxels // args.sensors
+    layout = tuple((sens + 1, per_sensor) for sens in range(args.sensors))
+    frames = synthetic_frames(min(args.frames, 1000), per_sensor * args.sensors)
+    features = ContactFeatures(args.layout or None)
+    features.update(layout, frames[0])
+
+    contacts = 0
+    start = time.perf_counter()
+    for index in range(args.frames):
+        contacts += int(features.update(layout, frames[index % len(frames)]).contact.sum())
+    elapsed = time.perf_counter() - start
+    print("{} frames, {} taxels, {} feature sensors, {:.2f} sensors in contact per frame".format(
+        args.frames, frames.shape[1], len(features.sensors), contacts / args.frames))
+    print("update: {:7.2f} us/frame ({:9.1f} frames/s)".format(1e6 * elapsed / args.frames, args.frames / elapsed))
+
+if __name__ == "__main__":
+    main()
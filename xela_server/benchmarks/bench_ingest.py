@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Drive IngestPipeline from a local stand-in xela_server at increasing frame rates
+
+The server runs in its own process and replays a capture file of xela_server.replay or synthetic
+frames, at the target rates or with the captured timing (--speed). Publishing is simulated with a configurable cost so the drop-oldest policy can be exercised.
+Usage: python bench_ingest.py --rates 100 1000 2000 5000 --seconds 3 --publish_us 200 [--metrics]
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+from xela_server.frames import decode_taxels
+from xela_server.ingest import IngestPipeline, QUEUE_POLICIES
+from xela_server.metrics import PipelineMetrics
+from xela_server.replay import parse_speed, read_capture, serve_messages, synthetic_messages
+
+def run_server(messages, port, rate, ready, arrivals=None, speed=None):
+    async def main():
+        event = asyncio.Event()
+        server = asyncio.ensure_future(serve_messages(messages, port=port, rate=rate, ready=event, arrivals=arrivals, speed=speed))
+        await event.wait()
+        ready.set()
+        await server
+    asyncio.run(main())
+
+def decode(message):
+    data = json.loads(message)
+    if data["message"] == "Welcome":
+        return None
+    return [decode_taxels(value["data"]) for value in data.values() if isinstance(value, dict)]
+
+def bench_rate(messages, args, rate, arrivals=None, speed=None):
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(messages, args.port, rate, ready, arrivals, speed), daemon=True)
+    server.start()
+    ready.wait()
+
+    latencies = []
+    def publish(frame, arrival):
+        end = time.perf_counter() + args.publish_us * 1e-6
+        while time.perf_counter() < end:
+            pass
+        latencies.append(time.time() - arrival)
+
+    metrics = PipelineMetrics(sample_every=args.metrics_sample) if args.metrics else None
+    pipeline = IngestPipeline("ws://127.0.0.1:{}".format(args.port), decode, publish,
+                              queue_size=args.queue_size, policy=args.policy, late_after=args.late_ms / 1000.0,
+                              metrics=metrics)
+    async def main():
+        runner = asyncio.ensure_future(pipeline.run())
+        await asyncio.sleep(args.seconds)
+        pipeline.stop()
+        await runner
+    asyncio.run(main())
+    server.terminate()
+    server.join()
+
+    stats = pipeline.stats
+    latencies.sort()
+    target = "{:>6}".format(rate) if rate is not None else "{:>5}x".format(speed) if speed is not None else "   max"
+    print("{} fps target | received {:8.0f}/s | published {:8.0f}/s | dropped {:6} | late {:6} | latency p50 {:7.2f} ms p99 {:7.2f} ms".format(
+        target, stats.received / args.seconds, stats.published / args.seconds, stats.dropped, stats.late,
+        1e3 * latencies[len(latencies) // 2] if latencies else float("nan"),
+        1e3 * latencies[int(len(latencies) * 0.99)] if latencies else float("nan")))
+    if metrics is not None:
+        for stage, summary in sorted(metrics.report()["stages"].items()):
+            print("    {:>12}: p50 {:7.3f} ms p99 {:7.3f} ms max {:7.3f} ms".format(
+                stage, summary["p50_ms"], summary["p99_ms"], summary["max_ms"]))
+
+def main():
+    argp = argparse.ArgumentParser(description="Benchmark the asyncio ingestion pipeline")
+    argp.add_argument("--capture", help="Capture file of xela_server.replay (or one JSON message per line)")
+    argp.add_argument("--speed", default=None,
+                      help="Replay the capture at this multiple of its timing (or max) instead of --rates")
+    argp.add_argument("--rates", type=float, nargs="+", default=[100, 1000, 2000, 5000])
+    argp.add_argument("--seconds", type=float, default=3.0)
+    argp.add_argument("--sensors", type=int, default=1)
+    argp.add_argument("--taxels", type=int, default=368)
+    argp.add_argument("--publish_us", type=float, default=200.0, help="Simulated publish cost per frame")
+    argp.add_argument("--queue_size", type=int, default=8)
+    argp.add_argument("--policy", default="drop_oldest", choices=QUEUE_POLICIES)
+    argp.add_argument("--late_ms", type=float, default=100.0)
+    argp.add_argument("--port", type=int, default=5055)
+    argp.add_argument("--metrics", action="store_true", help="Record and print the per stage latencies")
+    argp.add_argument("--metrics_sample", type=int, default=16)
+    args = argp.parse_args()
+
+    if args.capture:
+        messages, arrivals = read_capture(args.capture)
+    else:
+        messages, arrivals = synthetic_messages(200, args.sensors, args.taxels), None
+    if args.speed is not None:
+        speed = parse_speed(args.speed)
+        if speed is not None and arrivals is None:
+            argp.error("--speed needs a capture file with arrival times")
+        bench_rate(messages, args, None, arrivals, speed)
+    else:
+        for rate in args.rates:
+            bench_rate(messages, args, rate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Micro-benchmark of the xela_service frame parser: per-taxel int(..., 16) loop vs decode_taxels
+
+Replays a capture file of xela_server.replay or synthetic frames through both
+parsers, without ROS. Also compares whole frame decoding of the JSON and binary wire formats to a memcpy. Usage: python bench_parser.py [--capture frames.jsonl.gz] [--sensors 1 --taxels 368]
+'''
+import argparse
+import json
+import time
+
+import numpy as np
+
+from xela_server.frames import decode_binary_frame, decode_json_frame, decode_taxels, encode_binary_frame
+from xela_server.replay import read_capture, synthetic_messages
+
+def legacy_parse(msg_obj):
+    '''Per-taxel parsing and bookkeeping as xela_service did it before decode_taxels'''
+    nums = msg_obj["data"].split(",")
+    sensor_data = {}
+    points = []
+    for i in range(int(len(nums)/3)):
+        x = int(nums[i*3],16)
+        y = int(nums[i*3+1],16)
+        z = int(nums[i*3+2],16)
+        sensor_data[(int(msg_obj["sensor"]), i+1)] = ("{}".format(x), "{}".format(y), "{}".format(z))
+        points.append((int(i), float(x), float(y), float(z)))
+    return points
+
+def fast_parse(msg_obj):
+    '''Bulk decoding as decode_json_sensor does it now'''
+    taxels = decode_taxels(msg_obj["data"])
+    return [(i, x, y, z) for i, (x, y, z) in enumerate(taxels.astype(np.float64).tolist())]
+
+def replay(messages, parser):
+    start = time.perf_counter()
+    for message in messages:
+        data = json.loads(message)
+        for key, value in data.items():
+            if isinstance(value, dict) and "data" in value:
+                parser(value)
+    return time.perf_counter() - start
+
+def time_decode(messages, decode):
+    start = time.perf_counter()
+    for message in messages:
+        decode(message)
+    return time.perf_counter() - start
+
+def main():
+    argp = argparse.ArgumentParser(description="Benchmark the xela_service frame parser")
+    argp.add_argument("--capture", help="Capture file of xela_server.replay (or one JSON message per line)")
+    argp.add_argument("--frames", type=int, default=2000)
+    argp.add_argument("--sensors", type=int, default=1)
+    argp.add_argument("--taxels", type=int, default=368)
+    args = argp.parse_args()
+
+    if args.capture:
+        messages, _ = read_capture(args.capture)
+    else:
+        messages = synthetic_messages(args.frames, args.sensors, args.taxels)
+
+    # Both parsers have to agree before their timings mean anything
+    for message in messages[:10]:
+        for value in json.loads(message).values():
+            if isinstance(value, dict) and "data" in value:
+                assert legacy_parse(value) == fast_parse(value)
+
+    legacy_time = replay(messages, legacy_parse)
+    fast_time = replay(messages, fast_parse)
+    print("{} frames".format(len(messages)))
+    print("legacy parser: {:8.1f} frames/s ({:7.1f} us/frame)".format(len(messages) / legacy_time, 1e6 * legacy_time / len(messages)))
+    print("fast parser:   {:8.1f} frames/s ({:7.1f} us/frame)".format(len(messages) / fast_time, 1e6 * fast_time / len(messages)))
+    print("speedup: {:.1f}x".format(legacy_time / fast_time))
+
+    binary_messages = []
+    for message in messages:
+        decoded = decode_json_frame(message)
+        if decoded is not None:
+            binary_messages.append(encode_binary_frame(decoded[1], decoded[0]))
+    json_time = time_decode(messages, decode_json_frame)
+    binary_time = time_decode(binary_messages, decode_binary_frame)
+    copy_time = time_decode(binary_messages, bytearray)
+    print("wire decoding, whole frames ({} bytes json, {} bytes binary):".format(len(messages[-1]), len(binary_messages[-1])))
+    for name, total in (("json", json_time), ("binary", binary_time), ("memcpy", copy_time)):
+        print("  {:7} {:9.1f} frames/s ({:7.2f} us/frame)".format(name + ":", len(messages) / total, 1e6 * total / len(messages)))
+
+if __name__ == "__main__":
+    main()
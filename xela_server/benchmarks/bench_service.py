@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''End to end benchmark of xela_service: replayed websocket frames in, xHandMsg out
+
+A local replay server stands in for xela_server and xela_service is started against it, so
+decode_message, decode_json_sensors and the publishers run exactly as with the hardware.
+Reports the sustained frames/s reaching a subscriber and the latency from the arrival of a frame
+at xela_service (the header stamp) to its delivery. Needs a running roscore and the built package.
+Usage: python bench_service.py [--capture frames.jsonl.gz --speed 1|max] [--rates 100 500 1000] [--seconds 5]
+'''
+import argparse
+import asyncio
+import multiprocessing
+import subprocess
+import time
+
+import rospy
+from rospy.numpy_msg import numpy_msg
+from xela_server.msg import xHandMsg
+from xela_server.replay import parse_speed, read_capture, serve_messages, synthetic_messages
+
+def run_server(messages, port, rate, arrivals, speed):
+    asyncio.run(serve_messages(messages, host="0.0.0.0", port=port, rate=rate, arrivals=arrivals, speed=speed))
+
+class HandListener(object):
+    def __init__(self, topic):
+        self.latencies = []
+        self.received = 0
+        self.first = None
+        self.last = None
+        rospy.Subscriber(topic, numpy_msg(xHandMsg), self.callback, queue_size=1000)
+
+    def callback(self, msg):
+        now = rospy.get_time()
+        self.received += 1
+        self.last = now
+        if self.first is None:
+            self.first = now
+        self.latencies.append(now - msg.header.stamp.to_sec())
+
+    def reset(self):
+        self.latencies = []
+        self.received = 0
+        self.first = self.last = None
+
+def bench(messages, args, rate, arrivals=None, speed=None):
+    server = multiprocessing.Process(target=run_server, args=(messages, args.port, rate, arrivals, speed), daemon=True)
+    server.start()
+    time.sleep(0.5)
+    service = subprocess.Popen(
+        ["rosrun", "xela_server", "xela_service", "--ip", "127.0.0.1", "--port", str(args.port),
+         "--publish", "hand", "--calib", args.calib],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listener = HandListener("/xServHandTopic")
+    try:
+        start = time.time()
+        while listener.received == 0 and time.time() - start < args.timeout:
+            time.sleep(0.05)
+        time.sleep(args.warmup)
+        listener.reset()
+        time.sleep(args.seconds)
+        received, latencies = listener.received, sorted(listener.latencies)
+        elapsed = listener.last - listener.first if received > 1 else float("nan")
+    finally:
+        service.terminate()
+        service.wait()
+        server.terminate()
+        server.join()
+
+    target = "{:>6}".format(rate) if rate is not None else "{:>5}x".format(speed) if speed is not None else "   max"
+    if received < 2:
+        print("{} fps target | no frames received".format(target))
+        return
+    print("{} fps target | delivered {:8.1f}/s | latency p50 {:7.2f} ms p99 {:7.2f} ms max {:7.2f} ms".format(
+        target, (received - 1) / elapsed,
+        1e3 * latencies[len(latencies) // 2], 1e3 * latencies[int(len(latencies) * 0.99)], 1e3 * latencies[-1]))
+
+def main():
+    argp = argparse.ArgumentParser(description="Benchmark xela_service end to end on replayed frames")
+    argp.add_argument("--capture", help="Capture file of xela_server.replay, synthetic frames if not given")
+    argp.add_argument("--speed", default=None, help="Replay the capture at this multiple of its timing (or max) instead of --rates")
+    argp.add_argument("--rates", type=float, nargs="+", default=[100, 500, 1000])
+    argp.add_argument("--seconds", type=float, default=5.0)
+    argp.add_argument("--warmup", type=float, default=1.0, help="Seconds skipped after the first frame")
+    argp.add_argument("--timeout", type=float, default=15.0, help="Seconds to wait for xela_service to start")
+    argp.add_argument("--sensors", type=int, default=23)
+    argp.add_argument("--taxels", type=int, default=16)
+    argp.add_argument("--calib", default="off", help="Calibration of xela_service (default: off)")
+    argp.add_argument("--port", type=int, default=5056)
+    args = argp.parse_args()
+
+    rospy.init_node("xela_bench_service", anonymous=True, disable_signals=True)
+    if args.capture:
+        messages, arrivals = read_capture(args.capture)
+    else:
+        messages, arrivals = synthetic_messages(200, args.sensors, args.taxels), None
+    if args.speed is not None:
+        speed = parse_speed(args.speed)
+        if speed is not None and arrivals is None:
+            argp.error("--speed needs a capture file with arrival times")
+        bench(messages, args, None, arrivals, speed)
+    else:
+        for rate in args.rates:
+            bench(messages, args, rate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Startup benchmark of xela_service: time from exec to the first published frame
+
+A local replay server stands in for xela_server (already listening, or started --server_delay
+seconds after the service as when both come up from service.launch) and xela_service is started
+against it a few times, with and without --fast_start. The service signals readiness on the latched
+xServReadyTopic once its first frame is published; the time from Popen to that message is reported
+with the startup time measured by the service itself. Needs a running roscore and the built package.
+Usage: python bench_startup.py [--runs 5] [--server_delay 0.5]
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+import subprocess
+import threading
+import time
+
+import rospy
+from std_msgs.msg import String
+from xela_server.replay import serve_messages, synthetic_messages
+
+def run_server(messages, port, delay):
+    time.sleep(delay)
+    asyncio.run(serve_messages(messages, host="0.0.0.0", port=port, rate=100))
+
+class ReadyListener(object):
+    def __init__(self):
+        self.ready = {}
+        self.event = threading.Condition()
+        rospy.Subscriber("/xServReadyTopic", String, self.callback, queue_size=10)
+
+    def callback(self, msg):
+        now = time.time()
+        report = json.loads(msg.data)
+        with self.event:
+            self.ready.setdefault(report["pid"], (now, report["startup_s"]))
+            self.event.notify_all()
+
+    def wait(self, pid, timeout):
+        with self.event:
+            self.event.wait_for(lambda: pid in self.ready, timeout)
+            return self.ready.get(pid)
+
+def start_once(listener, messages, args, fast_start):
+    server = multiprocessing.Process(target=run_server, args=(messages, args.port, args.server_delay), daemon=True)
+    server.start()
+    if args.server_delay == 0:
+        time.sleep(0.5)
+    start = time.time()
+    service = subprocess.Popen(
+        ["rosrun", "xela_server", "xela_service", "--ip", "127.0.0.1", "--port", str(args.port),
+         "--publish", "hand", "--calib", "off", "--fast_start", fast_start],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # rosrun execs python, the node keeps the pid of the Popen
+        ready = listener.wait(service.pid, args.timeout)
+    finally:
+        service.terminate()
+        service.wait()
+        server.terminate()
+        server.join()
+    if ready is None:
+        return None
+    return ready[0] - start, ready[1]
+
+def main():
+    argp = argparse.ArgumentParser(description="Benchmark the startup of xela_service")
+    argp.add_argument("--runs", type=int, default=5)
+    argp.add_argument("--server_delay", type=float, default=0.0, help="Start the replay server this long after the service")
+    argp.add_argument("--timeout", type=float, default=30.0)
+    argp.add_argument("--port", type=int, default=5057)
+    args = argp.parse_args()
+
+    rospy.init_node("xela_bench_startup", anonymous=True, disable_signals=True)
+    listener = ReadyListener()
+    messages = synthetic_messages(100, 23, 16)
+    for fast_start in ("false", "true"):
+        results = []
+        for _ in range(args.runs):
+            result = start_once(listener, messages, args, fast_start)
+            if result is None:
+                print("fast_start {:5}: no frame within {} s".format(fast_start, args.timeout))
+            else:
+                results.append(result)
+        if results:
+            external = sorted(result[0] for result in results)
+            internal = sorted(result[1] for result in results)
+            print("fast_start {:5}: exec to first frame median {:6.3f} s (min {:6.3f} max {:6.3f}), as seen by the service {:6.3f} s".format(
+                fast_start, external[len(external) // 2], external[0], external[-1], internal[len(internal) // 2]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Write and read rates of SensorState with one writer thread and several reader threads
+
+Only times the store, xela_server/tests/test_state.py checks that no read sees a torn frame.
+Usage: python bench_state.py --seconds 5
+'''
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from xela_server.state import SensorState
+
+def writer(state, num_sensors, num_taxels, stop, counts):
+    frames = [np.zeros((num_taxels, 3), dtype=np.uint16) for _ in range(num_sensors)]
+    frame_id = 0
+    while not stop.is_set():
+        frame_id += 1
+        for taxels in frames:
+            taxels[:] = frame_id % 2**16
+        state.write_frame((sensor + 1, taxels) for sensor, taxels in enumerate(frames))
+    counts["writes"] = frame_id
+
+def reader(state, num_sensors, stop, counts, lock):
+    reads = 0
+    def read_all(snapshot):
+        return snapshot.values[:num_sensors].copy(), snapshot.seqs[:num_sensors].copy()
+    while not stop.is_set():
+        _, seqs = state.read(read_all)
+        if seqs[0] > 0:
+            state.get_sensor(1 + reads % num_sensors)
+        reads += 1
+    with lock:
+        counts["reads"] = counts.get("reads", 0) + reads
+
+def main():
+    argp = argparse.ArgumentParser(description="Concurrent writer/reader rates of SensorState")
+    argp.add_argument("--seconds", type=float, default=5.0)
+    argp.add_argument("--readers", type=int, default=4)
+    argp.add_argument("--sensors", type=int, default=4)
+    argp.add_argument("--taxels", type=int, default=368)
+    args = argp.parse_args()
+
+    state = SensorState(max_sensors=args.sensors, max_taxels=args.taxels)
+    stop = threading.Event()
+    counts = {}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=writer, args=(state, args.sensors, args.taxels, stop, counts))]
+    threads.extend(threading.Thread(target=reader, args=(state, args.sensors, stop, counts, lock))
+                   for _ in range(args.readers))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print("frames written: {} ({:.0f}/s)".format(counts["writes"], counts["writes"] / args.seconds))
+    print("reads: {} ({:.0f}/s) by {} readers".format(counts["reads"], counts["reads"] / args.seconds, args.readers))
+
+if __name__ == "__main__":
+    main()
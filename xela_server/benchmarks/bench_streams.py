@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''CPU benchmark of derived streams: consumers filtering xServTopic themselves vs --streams of xela_service
+
+A local replay server stands in for xela_server and xela_service is started against it. Every stream
+of --streams gets --copies consumer processes, run twice:
+  consumers  the consumers subscribe to the per-sensor xServTopic, rebuild the hand array of every
+             frame and filter and decimate it themselves (with xela_server.streams, as the service would)
+  derived    xela_service computes the streams once with --streams and the consumers subscribe to them
+xela_service publishes xServTopic in both runs, as for a raw consumer such as a controller.
+Reports the CPU seconds per second of the service and of all consumers (from /proc), and the outputs
+they received. Needs a running roscore and the built package.
+Usage: python bench_streams.py [--streams xServPolicyTopic:30:lowpass:10,xServDashTopic:5:mean] [--copies 2] [--rate 500]
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_STREAMS = "xServPolicyTopic:30:lowpass:10,xServDashTopic:5:mean"
+
+def run_server(messages, port, rate):
+    from xela_server.replay import serve_messages
+    asyncio.run(serve_messages(messages, host="0.0.0.0", port=port, rate=rate))
+
+def cpu_seconds(pid):
+    '''User and system CPU time of a process so far'''
+    with open("/proc/{}/stat".format(pid)) as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK") # Fields 14 and 15, utime and stime
+
+def consume(mode, spec):
+    '''Consumer process: one stream, received derived or derived here from xServTopic'''
+    import rospy
+    from rospy.numpy_msg import numpy_msg
+    from xela_server.msg import xHandMsg, xServerMsg
+    from xela_server.streams import parse_streams
+
+    def stop(signum, frame):
+        raise SystemExit
+    signal.signal(signal.SIGTERM, stop)
+    rospy.init_node("xela_bench_streams", anonymous=True, disable_signals=True)
+    stream = parse_streams(spec)[0]
+    outputs = [0]
+    if mode == "derived":
+        def on_output(msg):
+            outputs[0] += 1
+        rospy.Subscriber(stream.topic, numpy_msg(xHandMsg), on_output, queue_size=10)
+    else:
+        pending = dict(stamp=None, sensors={})
+        def flush():
+            sensors = sorted(pending["sensors"].items())
+            layout = tuple((sens, len(taxels)) for sens, taxels in sensors)
+            values = np.concatenate([taxels for _, taxels in sensors])
+            if stream.update(layout, values, pending["stamp"]) is not None:
+                outputs[0] += 1
+        def on_sensor(msg):
+            # The sensors of one frame share its header stamp
+            stamp = msg.header.stamp.to_sec()
+            if stamp != pending["stamp"] and pending["sensors"]:
+                flush()
+                pending["sensors"] = {}
+            pending["stamp"] = stamp
+            pending["sensors"][msg.sensor] = np.array(
+                [(point.point.x, point.point.y, point.point.z) for point in msg.points], dtype=np.float32)
+        rospy.Subscriber("/xServTopic", xServerMsg, on_sensor, queue_size=1000)
+    try:
+        while True:
+            time.sleep(0.1)
+    finally:
+        print(outputs[0])
+        sys.stdout.flush()
+
+def bench(messages, args, mode):
+    server = multiprocessing.Process(target=run_server, args=(messages, args.port, args.rate), daemon=True)
+    server.start()
+    time.sleep(0.5)
+    command = ["rosrun", "xela_server", "xela_service", "--ip", "127.0.0.1", "--port", str(args.port),
+               "--publish", "sensor", "--calib", "off", "--fast_start", "true"]
+    if mode == "derived":
+        command += ["--streams", args.streams]
+    # rosrun execs python, the node keeps the pid of the Popen
+    service = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    consumers = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--consume", mode, spec],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        for spec in args.streams.split(",") for _ in range(args.copies)
+    ]
+    try:
+        time.sleep(args.warmup)
+        pids = [service.pid] + [consumer.pid for consumer in consumers]
+        before = [cpu_seconds(pid) for pid in pids]
+        start = time.time()
+        time.sleep(args.seconds)
+        used = [cpu_seconds(pid) - cpu for pid, cpu in zip(pids, before)]
+        elapsed = time.time() - start
+    finally:
+        outputs = []
+        for consumer in consumers:
+            consumer.terminate()
+            output, _ = consumer.communicate()
+            outputs.append(int(output.split()[-1]) if output.split() else 0)
+        service.terminate()
+        service.wait()
+        server.terminate()
+        server.join()
+    print("{:9} | service {:5.1f}% CPU | {} consumers {:6.1f}% CPU | total {:6.1f}% CPU | outputs per consumer {}".format(
+        mode, 100 * used[0] / elapsed, len(consumers), 100 * sum(used[1:]) / elapsed,
+        100 * sum(used) / elapsed, outputs))
+
+def main():
+    argp = argparse.ArgumentParser(description="Benchmark the CPU cost of derived streams across consumers")
+    argp.add_argument("--streams", default=DEFAULT_STREAMS, help="Streams as in --streams of xela_service")
+    argp.add_argument("--copies", type=int, default=2, help="Consumer processes per stream")
+    argp.add_argument("--rate", type=float, default=500, help="Frames per second of the replay server")
+    argp.add_argument("--seconds", type=float, default=10.0)
+    argp.add_argument("--warmup", type=float, default=3.0, help="Seconds before the measurement, for the node startups")
+    argp.add_argument("--sensors", type=int, default=4)
+    argp.add_argument("--taxels", type=int, default=16)
+    argp.add_argument("--port", type=int, default=5058)
+    argp.add_argument("--consume", nargs=2, metavar=("MODE", "STREAM"), help=argparse.SUPPRESS)
+    args = argp.parse_args()
+
+    if args.consume:
+        consume(*args.consume)
+        return
+    from xela_server.replay import synthetic_messages
+    messages = synthetic_messages(200, args.sensors, args.taxels)
+    for mode in ("consumers", "derived"):
+        bench(messages, args, mode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''Online per-taxel baseline estimation and bias removal'''
+import threading
+
+import numpy as np
+
+CALIBRATION_METHODS = ["ema", "median", "off"]
+
+class BaselineCalibrator(object):
+    '''Tracks the no-contact baseline of every taxel and subtracts it from the frames
+
+    Every taxel starts with a warm-up: its first `warmup` readings are averaged into the baseline.
+    The baseline then follows the slow drift of the taxel, either as an exponential moving average
+    with factor `alpha` or as the median of the last `window` readings (recomputed every
+    `median_every` frames). Readings further than `threshold` from the baseline on any axis are
+    taken as contact and don't move the baseline. All updates are vectorized over the taxels.
+
+    tare() restarts the warm-up of some or all sensors; it can be called from any thread and is
+    applied on the next frame. Until its new warm-up is done a taxel keeps its previous baseline.
+    '''
+    def __init__(self, warmup=100, method="ema", alpha=0.01, threshold=300.0, window=64, median_every=8):
+        if method not in CALIBRATION_METHODS or method == "off":
+            raise ValueError("Unknown calibration method {}, use one of {}".format(method, CALIBRATION_METHODS[:-1]))
+        self.warmup = max(1, int(warmup))
+        self.method = method
+        self.alpha = alpha
+        self.threshold = threshold
+        self.window = window
+        self.median_every = median_every
+        self.layout = None
+        self.contacts = 0 # Taxels in contact in the last frame
+        self._lock = threading.Lock()
+        self._tare_requests = []
+
+    def set_layout(self, layout):
+        '''Reset the state for a (sensor, n_taxels) layout, every taxel goes through the warm-up again'''
+        self.layout = layout
+        self.offsets = np.zeros(len(layout) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([txls for _, txls in layout])
+        num_taxels = int(self.offsets[-1])
+        self.values = np.zeros((num_taxels, 3), dtype=np.float32)
+        self.corrected = np.zeros((num_taxels, 3), dtype=np.float32)
+        self.baseline = np.zeros((num_taxels, 3), dtype=np.float32)
+        self.sums = np.zeros((num_taxels, 3), dtype=np.float64)
+        self.counts = np.zeros(num_taxels, dtype=np.int64) # Warm-up readings, warmup once calibrated
+        self.calibrated = np.zeros(num_taxels, dtype=bool) # Has a baseline, possibly from before a tare
+        self.frames = 0
+        if self.method == "median":
+            self.history = np.zeros((self.window, num_taxels, 3), dtype=np.float32)
+            self.positions = np.zeros(num_taxels, dtype=np.int64)
+
+    @property
+    def ready(self):
+        '''True once every taxel has a baseline'''
+        return self.layout is not None and bool(self.calibrated.all())
+
+    def tare(self, sensors=None):
+        '''Restart the warm-up of the given sensor ids (all sensors if None or empty), returns the warm-up length'''
+        with self._lock:
+            self._tare_requests.append(list(sensors) if sensors else None)
+        return self.warmup
+
+    def _apply_tares(self):
+        with self._lock:
+            requests, self._tare_requests = self._tare_requests, []
+        for sensors in requests:
+            if sensors is None:
+                mask = slice(None)
+            else:
+                mask = np.zeros(len(self.counts), dtype=bool)
+                for (sens, _), start, end in zip(self.layout, self.offsets[:-1], self.offsets[1:]):
+                    if sens in sensors:
+                        mask[start:end] = True
+            self.counts[mask] = 0
+            self.sums[mask] = 0
+
+    def update(self, frame):
+        '''frame: list of (sensor, model, taxels) as published by xela_service
+
+        Returns the frame with the baseline subtracted from the taxels (float32 views of one buffer,
+        reused on the next call) or None while some taxels have never been calibrated.
+        '''
+        layout = tuple((sens, taxels.shape[0]) for sens, _, taxels in frame)
+        if layout != self.layout:
+            self.set_layout(layout)
+        self._apply_tares()
+        values = self.values
+        for (_, _, taxels), start, end in zip(frame, self.offsets[:-1], self.offsets[1:]):
+            values[start:end] = taxels
+        self.frames += 1
+
+        warming = self.counts < self.warmup
+        if warming.any():
+            self.sums[warming] += values[warming]
+            self.counts[warming] += 1
+            done = warming & (self.counts == self.warmup)
+            if done.any():
+                self.baseline[done] = self.sums[done] / self.warmup
+                self.calibrated[done] = True
+                if self.method == "median":
+                    self.history[:, done] = self.baseline[done]
+            tracking = ~warming
+        else:
+            tracking = None # Every taxel tracks its baseline
+
+        np.subtract(values, self.baseline, out=self.corrected)
+        free = np.abs(self.corrected).max(axis=1) <= self.threshold
+        self.contacts = len(free) - int(np.count_nonzero(free))
+        if tracking is not None:
+            free &= tracking
+        if self.method == "ema":
+            self.baseline += self.alpha * self.corrected * free[:, None]
+        else:
+            taxels = np.flatnonzero(free)
+            self.history[self.positions[taxels] % self.window, taxels] = values[taxels]
+            self.positions[taxels] += 1
+            if self.frames % self.median_every == 0:
+                median = np.median(self.history, axis=0)
+                update = self.calibrated if tracking is None else self.calibrated & tracking
+                self.baseline[update] = median[update]
+
+        if not self.ready:
+            return None
+        return [
+            (sens, model, self.corrected[start:end])
+            for (sens, model, _), start, end in zip(frame, self.offsets[:-1], self.offsets[1:])
+        ]
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+'''Per-sensor contact and force summaries of bias corrected frames'''
+import json
+
+import numpy as np
+
+def grid_positions(num_taxels):
+    '''(col, row) of taxels laid out row first on a grid with ceil(sqrt(num_taxels)) columns'''
+    columns = int(np.ceil(np.sqrt(num_taxels)))
+    index = np.arange(num_taxels)
+    return np.stack([index % columns, index // columns], axis=1).astype(np.float32)
+
+def load_layout_segments(path):
+    '''Read a hand layout json (xela_sensors/layouts) into per-taxel (sensor ids, segment, positions)
+
+    Sensors of the layout are the segments; positions are the (col, row) of every taxel in its sensor grid.
+    '''
+    with open(path) as f:
+        spec = json.load(f)
+    num_taxels = spec["num_taxels"]
+    segments = np.full(num_taxels, -1, dtype=np.intp)
+    positions = np.zeros((num_taxels, 2), dtype=np.float32)
+    sensor_ids = []
+    for group in spec["groups"]:
+        for sensor in group["sensors"]:
+            grid = np.array(sensor["grid"], dtype=np.intp)
+            rows, columns = np.nonzero(grid >= 0)
+            point_ids = grid[rows, columns]
+            segments[point_ids] = len(sensor_ids)
+            positions[point_ids] = np.stack([columns, rows], axis=1)
+            sensor_ids.append(sensor["id"])
+    if (segments < 0).any():
+        raise ValueError("Layout {} does not cover all of its {} taxels".format(path, num_taxels))
+    return np.array(sensor_ids, dtype=np.int16), segments, positions
+
+class ContactFeatures(object):
+    '''Vectorized per-sensor aggregates of one frame of bias corrected taxels
+
+    For every sensor: contact (hysteresis on the peak pressure: on above contact_on, off below
+    contact_off), pressure (sum of the positive z of its taxels), peak (largest positive z), centroid (centre
+    of pressure in taxel pitches, (col, row) from the first taxel of the grid) and shear (mean x, y).
+    Sensors are those of a hand layout file, or the xela sensors of the frame without one.
+    Every update is one matrix product for all the sums and one reduceat for the peaks, whatever the
+    number of sensors.
+    '''
+    def __init__(self, layout_path=None, contact_on=300.0, contact_off=150.0):
+        self.contact_on = contact_on
+        self.contact_off = contact_off
+        self.layout = None
+        self._layout_segments = load_layout_segments(layout_path) if layout_path else None
+
+    def set_layout(self, layout):
+        '''Compile the segment tables for a (sensor, n_taxels) layout of the frames'''
+        self.layout = layout
+        if self._layout_segments is not None:
+            self.sensors, segments, positions = self._layout_segments
+            num_taxels = sum(txls for _, txls in layout)
+            if num_taxels != len(segments):
+                raise ValueError("Frames have {} taxels, the hand layout {}".format(num_taxels, len(segments)))
+        else:
+            self.sensors = np.array([sens for sens, _ in layout], dtype=np.int16)
+            segments = np.concatenate([np.full(txls, index, dtype=np.intp) for index, (_, txls) in enumerate(layout)])
+            positions = np.concatenate([grid_positions(txls) for _, txls in layout])
+        num_sensors = len(self.sensors)
+        # Taxels sorted by segment so the peaks are one reduceat over contiguous runs
+        self._order = np.argsort(segments, kind="stable")
+        counts = np.bincount(segments, minlength=num_sensors)
+        self._starts = np.zeros(num_sensors, dtype=np.intp)
+        np.cumsum(counts[:-1], out=self._starts[1:])
+        # Weights of the per-sensor sums: membership, then membership times the col and row of the taxel.
+        # Applied to (x, y, pressure) of the taxels, the first block gives the sums of x, y and pressure,
+        # the pressure column of the others the moments of the centre of pressure
+        taxels = np.arange(len(segments))
+        self._weights = np.zeros((3, num_sensors, len(segments)), dtype=np.float32)
+        self._weights[0, segments, taxels] = 1
+        self._weights[1:, segments, taxels] = positions.T
+        self._weights = self._weights.reshape(3 * num_sensors, len(segments))
+        self._counts = np.maximum(counts, 1).astype(np.float32)
+        self._floor = np.array([-np.inf, -np.inf, 0], dtype=np.float32) # Pressure is the positive part of z
+        self._clipped = np.zeros((len(segments), 3), dtype=np.float32)
+        self._sums = np.zeros((3 * num_sensors, 3), dtype=np.float32)
+        self.contact = np.zeros(num_sensors, dtype=bool)
+        self.pressure = np.zeros(num_sensors, dtype=np.float32)
+        self.peak = np.zeros(num_sensors, dtype=np.float32)
+        self.centroid = np.zeros((num_sensors, 2), dtype=np.float32)
+        self.shear = np.zeros((num_sensors, 2), dtype=np.float32)
+
+    def update(self, layout, values):
+        '''layout: tuple of (sensor, n_taxels) of the frame, values: (n, 3) bias corrected taxels of all sensors'''
+        if layout != self.layout:
+            self.set_layout(layout)
+        num_sensors = len(self.sensors)
+        clipped = np.maximum(values, self._floor, out=self._clipped)
+        sums = np.matmul(self._weights, clipped, out=self._sums)
+        self.pressure[:] = sums[:num_sensors, 2]
+        self.peak[:] = np.maximum.reduceat(clipped[self._order, 2], self._starts)
+        np.divide(sums[num_sensors:, 2].reshape(2, num_sensors).T, np.where(self.pressure > 0, self.pressure, 1)[:, None], out=self.centroid)
+        np.divide(sums[:num_sensors, :2], self._counts[:, None], out=self.shear)
+        self.contact[:] = np.where(self.contact, self.peak > self.contact_off, self.peak > self.contact_on)
+        return self
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+'''Decoding of the sensor frames sent by xela_server'''
+import json
+import struct
+
+import numpy as np
+
+TAXEL_DTYPE = np.uint16
+
+def decode_taxels(data):
+    '''Decode the comma separated hex "data" field of one sensor into an (n_taxels, 3) array'''
+    if not data:
+        return np.empty((0, 3), dtype=TAXEL_DTYPE)
+    num_values = data.count(",") + 1
+    if len(data) == num_values * 5 - 1 and data[4::5] == "," * (num_values - 1):
+        # Every value has 4 hex digits: parse the whole field in one go as big endian uint16
+        values = np.frombuffer(bytes.fromhex(data.replace(",", "")), dtype=">u2").astype(TAXEL_DTYPE)
+    else:
+        values = np.array([int(value, 16) for value in data.split(",")], dtype=TAXEL_DTYPE)
+    num_taxels = num_values // 3
+    return values[:num_taxels * 3].reshape(num_taxels, 3)
+
+def encode_taxels(taxels):
+    '''Encode an (n_taxels, 3) array into the comma separated hex "data" field (inverse of decode_taxels)'''
+    return ",".join("{:04x}".format(value) for value in np.asarray(taxels).reshape(-1).tolist())
+
+# Binary framing, produced by xela_server.proxy from the JSON stream:
+# one header, one table entry per sensor, then the taxels of all sensors as packed little endian
+# uint16 x, y, z triplets in the order of the table. Fields are little endian.
+BINARY_MAGIC = b"XELB"
+BINARY_VERSION = 1
+# magic, version, reserved, number of sensors, xela_server frame number, time.time() the frame was encoded at
+BINARY_HEADER = struct.Struct("<4sBBHId")
+# sensor id, number of taxels, model (up to 12 characters, null padded)
+BINARY_SENSOR = struct.Struct("<HH12s")
+BINARY_TAXEL_DTYPE = np.dtype("<u2")
+
+def encode_binary_frame(frame, frame_id=0, stamp=0.0):
+    '''Encode a frame, list of (sensor, model, taxels), into one binary message'''
+    parts = [BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(frame), frame_id, stamp)]
+    parts += [BINARY_SENSOR.pack(sensor, taxels.shape[0], model.encode()) for sensor, model, taxels in frame]
+    parts += [np.ascontiguousarray(taxels, dtype=BINARY_TAXEL_DTYPE).tobytes() for _, _, taxels in frame]
+    return b"".join(parts)
+
+def decode_binary_frame(message):
+    '''Decode one binary message into (frame id, stamp, frame), frame: list of (sensor, model, taxels)
+
+    The taxels are read-only (n_taxels, 3) views into the message, nothing is copied.
+    '''
+    magic, version, _, num_sensors, frame_id, stamp = BINARY_HEADER.unpack_from(message)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("Not a binary xela frame (magic {!r}, version {})".format(magic, version))
+    data_offset = BINARY_HEADER.size + num_sensors * BINARY_SENSOR.size
+    layout = _binary_layout(message[BINARY_HEADER.size:data_offset])
+    taxels = np.frombuffer(message, dtype=BINARY_TAXEL_DTYPE, count=3 * layout[0], offset=data_offset).reshape(-1, 3)
+    if taxels.dtype != TAXEL_DTYPE:
+        taxels = taxels.astype(TAXEL_DTYPE) # Big endian hosts
+    return frame_id, stamp, [(sensor, model, taxels[start:end]) for sensor, model, start, end in layout[1]]
+
+_BINARY_LAYOUTS = {}
+
+def _binary_layout(table):
+    '''(number of taxels, [(sensor, model, start, end)]) of a sensor table, cached as it rarely changes'''
+    layout = _BINARY_LAYOUTS.get(table)
+    if layout is None:
+        sensors = []
+        start = 0
+        for sensor, count, model in BINARY_SENSOR.iter_unpack(table):
+            if count > 0:
+                sensors.append((sensor, model.rstrip(b"\0").decode(), start, start + count))
+                start += count
+        if len(_BINARY_LAYOUTS) >= 16:
+            _BINARY_LAYOUTS.clear()
+        layout = _BINARY_LAYOUTS[table] = (start, sensors)
+    return layout
+
+def decode_json_sensor(value):
+    '''Decode one sensor entry of a JSON message into (sensor, model, taxels), None if it has no taxels
+
+    Raises KeyError, TypeError or ValueError for entries without "data", "sensor" and "model" or with bad hex.
+    '''
+    taxels = decode_taxels(value["data"])
+    if taxels.shape[0] == 0:
+        return None
+    return int(value["sensor"]), str(value["model"]), taxels
+
+def decode_json_sensors(data, on_error=None):
+    '''Yield (sensor, model, taxels) for the sensors of a parsed JSON message, in the order of their keys
+
+    Entries that fail decode_json_sensor are skipped after calling on_error(value, error).
+    '''
+    for key in sorted((key for key in data if key.isdigit()), key=int): # Only the sensors in the message
+        value = data[key]
+        try:
+            parsed = decode_json_sensor(value)
+        except (KeyError, TypeError, ValueError) as error:
+            if on_error is not None:
+                on_error(value, error)
+            continue
+        if parsed is not None:
+            yield parsed
+
+def is_welcome(data):
+    '''True for the greeting xela_server sends to a new client instead of a frame'''
+    return data.get("message") == "Welcome"
+
+def decode_json_frame(message, on_error=None):
+    '''Decode one JSON websocket message into (frame id, frame), None for messages without frame data'''
+    data = json.loads(message)
+    if is_welcome(data):
+        return None
+    frame = list(decode_json_sensors(data, on_error))
+    frame_id = data.get("message")
+    return (frame_id if isinstance(frame_id, int) else 0), frame
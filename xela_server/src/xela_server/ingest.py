@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+'''Asyncio websocket ingestion: receive -> bounded decode queue -> decode -> publish'''
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+
+from xela_server.metrics import clock
+
+QUEUE_POLICIES = ["drop_oldest", "block"]
+
+class IngestStats(object):
+    '''Counters of the ingestion pipeline'''
+    def __init__(self):
+        self.received = 0
+        self.decoded = 0
+        self.published = 0
+        self.dropped = 0 # Dropped from a full queue
+        self.late = 0 # Published more than late_after seconds after arrival
+        self.decode_errors = 0
+        self.publish_errors = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    def asdict(self):
+        return dict(self.__dict__)
+
+class FrameQueue(object):
+    '''Bounded queue that either drops the oldest item or blocks the producer when full'''
+    def __init__(self, maxsize, policy, stats):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError("Unknown queue policy {}, use one of {}".format(policy, QUEUE_POLICIES))
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.stats = stats
+
+    async def put(self, item):
+        if self.policy == "block":
+            await self.queue.put(item)
+            return
+        while self.queue.full():
+            self.queue.get_nowait()
+            self.stats.dropped += 1
+        self.queue.put_nowait(item)
+
+    async def get(self):
+        return await self.queue.get()
+
+class IngestPipeline(object):
+    '''Receives websocket messages, decodes them and publishes the result without stalling the socket
+
+    decode(message) runs on the event loop and returns the item to publish (None to skip it),
+    publish(item, arrival) runs on a worker thread with the arrival time.time() of the message.
+    The connection is reopened with exponential backoff whenever it fails or closes. With a startup_retry
+    the first connection is retried every startup_retry seconds instead, so a service started together
+    with xela_server gets its first frame as soon as the server listens.
+    With a capture (xela_server.replay.CaptureWriter) every received message is logged with its arrival time.
+    With an enabled PipelineMetrics the queue waits, decode, publish and total latencies are recorded.
+    '''
+    def __init__(self, url, decode, publish, queue_size=8, policy="drop_oldest", late_after=None,
+                 backoff_min=0.1, backoff_max=5.0, on_error=None, metrics=None, capture=None, startup_retry=None):
+        self.url = url
+        self.decode = decode
+        self.publish = publish
+        self.queue_size = queue_size
+        self.policy = policy
+        self.late_after = late_after
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.on_error = on_error
+        self.metrics = metrics
+        self.capture = capture
+        self.startup_retry = startup_retry
+        self.stats = IngestStats()
+        self.loop = None
+        self.tasks = []
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xela_publish")
+
+    def report(self, stage, error):
+        if self.on_error is not None:
+            self.on_error(stage, error)
+
+    async def receive(self, decode_queue):
+        backoff = self.backoff_min
+        while True:
+            try:
+                async with websockets.connect(self.url, max_size=None, compression=None) as wsock:
+                    self.stats.connects += 1
+                    backoff = self.backoff_min
+                    async for message in wsock:
+                        self.stats.received += 1
+                        arrival = time.time()
+                        if self.capture is not None:
+                            self.capture.write(message, arrival)
+                        await decode_queue.put((message, arrival, clock()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                # Until the first connection only the first failure of the startup retries is reported
+                if self.startup_retry is None or self.stats.connects > 0 or self.stats.disconnects == 0:
+                    self.report("receive", error)
+            self.stats.disconnects += 1
+            if self.startup_retry is not None and self.stats.connects == 0:
+                await asyncio.sleep(self.startup_retry)
+                continue
+            await asyncio.sleep(backoff)
+            backoff = min(2 * backoff, self.backoff_max)
+
+    async def decode_stage(self, decode_queue, publish_queue):
+        while True:
+            message, arrival, received = await decode_queue.get()
+            metrics = self.metrics if self.metrics is not None and self.metrics.enabled else None
+            timed = metrics is not None and metrics.sample("decode")
+            if timed:
+                start = metrics.record("decode_wait", received)
+            try:
+                item = self.decode(message)
+            except Exception as error:
+                self.stats.decode_errors += 1
+                self.report("decode", error)
+                continue
+            if timed:
+                metrics.record("decode", start)
+            if item is not None:
+                self.stats.decoded += 1
+                await publish_queue.put((item, arrival, received, clock() if metrics is not None else 0.0))
+
+    async def publish_stage(self, publish_queue):
+        while True:
+            item, arrival, received, queued = await publish_queue.get()
+            metrics = self.metrics if self.metrics is not None and self.metrics.enabled else None
+            timed = metrics is not None and metrics.sample("publish")
+            if timed:
+                start = metrics.record("publish_wait", queued)
+            if self.late_after is not None and time.time() - arrival > self.late_after:
+                self.stats.late += 1
+            try:
+                await self.loop.run_in_executor(self.executor, self.publish, item, arrival)
+                self.stats.published += 1
+                if timed:
+                    end = metrics.record("publish", start)
+                    metrics.record("total", received, end)
+            except Exception as error:
+                self.stats.publish_errors += 1
+                self.report("publish", error)
+
+    async def run(self):
+        '''Run all stages until stop() is called'''
+        self.loop = asyncio.get_running_loop()
+        decode_queue = FrameQueue(self.queue_size, self.policy, self.stats)
+        publish_queue = FrameQueue(self.queue_size, self.policy, self.stats)
+        self.tasks = [
+            asyncio.ensure_future(self.receive(decode_queue)),
+            asyncio.ensure_future(self.decode_stage(decode_queue, publish_queue)),
+            asyncio.ensure_future(self.publish_stage(publish_queue)),
+        ]
+        try:
+            await asyncio.gather(*self.tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.executor.shutdown(wait=False)
+            if self.capture is not None:
+                self.capture.close()
+
+    def stop(self):
+        '''Stop the pipeline, can be called from any thread'''
+        if self.loop is not None:
+            for task in self.tasks:
+                self.loop.call_soon_threadsafe(task.cancel)
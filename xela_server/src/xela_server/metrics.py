@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+'''Low overhead latency histograms and counters of the xela_service pipeline'''
+import json
+import math
+import threading
+import time
+
+clock = time.perf_counter # Monotonic clock of all the stage timestamps
+
+class LatencyHistogram(object):
+    '''Log-spaced histogram of durations in seconds
+
+    Recording a value is one log10 and one list increment. Percentiles are read from the bins,
+    so they are accurate to one bin: 10 ** (1 / bins_per_decade) - 1, about 12 % by default.
+    '''
+    def __init__(self, low=1e-7, high=10.0, bins_per_decade=20):
+        self.low = low
+        self.bins_per_decade = bins_per_decade
+        self._offset = -math.log10(low)
+        self.num_bins = int(math.ceil(math.log10(high / low) * bins_per_decade)) + 1
+        self.reset()
+
+    def reset(self):
+        self.bins = [0] * self.num_bins
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        if value > self.low:
+            index = int((math.log10(value) + self._offset) * self.bins_per_decade)
+            if index >= self.num_bins:
+                index = self.num_bins - 1
+        else:
+            index = 0
+        self.bins[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        '''Upper edge of the bin holding the q-th percentile (q in [0, 100]), 0 if nothing was recorded'''
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, num in enumerate(self.bins):
+            seen += num
+            if seen >= rank and num > 0:
+                return min(self.low * 10 ** ((index + 1) / self.bins_per_decade), self.max)
+        return self.max
+
+    def summary(self):
+        '''count, mean, p50, p99 and max, durations in milliseconds'''
+        return dict(
+            count=self.count,
+            mean_ms=1e3 * self.total / self.count if self.count > 0 else 0.0,
+            p50_ms=1e3 * self.percentile(50),
+            p99_ms=1e3 * self.percentile(99),
+            max_ms=1e3 * self.max
+        )
+
+class PipelineMetrics(object):
+    '''Stage and per-sensor latency histograms plus event counters
+
+    Histograms only get one frame in `sample_every`: each call site asks sample(site) once per frame
+    and only takes timestamps when it returns True, which keeps the overhead well under 1 %
+    of the frame processing time. Counters count every event.
+    Every histogram is written by a single thread (the stage that owns it) and read without locks,
+    so a report taken while frames flow may be off by the frame in progress. Adding a histogram and
+    counting take the lock, which report() holds while it copies the tables it iterates.
+    Callers check `enabled` first, so a disabled instance costs one attribute read.
+    '''
+    def __init__(self, enabled=True, sample_every=16):
+        self.enabled = enabled
+        self.sample_every = max(1, int(sample_every))
+        self._ticks = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def sample(self, site):
+        '''True for one call in sample_every of a call site'''
+        tick = self._ticks.get(site, 0) + 1
+        self._ticks[site] = tick
+        return self.enabled and tick % self.sample_every == 0
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.sensors = {}
+            self.counters = {}
+
+    def record(self, stage, start, end=None):
+        '''Record end - start (end defaults to now) for a stage, returns end to chain the next stage'''
+        end = clock() if end is None else end
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock: # Another thread may have added it since the lookup
+                histogram = self.stages.setdefault(stage, LatencyHistogram())
+        histogram.record(end - start)
+        return end
+
+    def record_sensor(self, stage, sensor, duration):
+        key = (stage, sensor)
+        histogram = self.sensors.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.sensors.setdefault(key, LatencyHistogram())
+        histogram.record(duration)
+
+    def count(self, name, amount=1):
+        if not self.enabled: # Called on every parse error and stale timeout, also without --metrics
+            return
+        # Counters are incremented from the ingest, publish and service threads
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self, extra_counters=None):
+        '''dict of the counters, throughput and latency summaries, ready for json'''
+        # The stages add histograms and counters from other threads while this runs
+        with self._lock:
+            elapsed = time.time() - self.started
+            counters = dict(self.counters)
+            stages = list(self.stages.items())
+            sensor_histograms = list(self.sensors.items())
+        if extra_counters is not None:
+            counters.update(extra_counters)
+        sensors = {}
+        for (stage, sensor), histogram in sorted(sensor_histograms):
+            sensors.setdefault(str(sensor), {})[stage] = histogram.summary()
+        return dict(
+            elapsed_s=elapsed,
+            sample_every=self.sample_every,
+            counters=counters,
+            rates_hz=dict((name, value / elapsed if elapsed > 0 else 0.0) for name, value in counters.items()),
+            stages=dict((stage, histogram.summary()) for stage, histogram in stages),
+            sensors=sensors
+        )
+
+    def dump(self, path, extra_counters=None):
+        '''Write the report to path as json, returns the report'''
+        report = self.report(extra_counters)
+        with open(path, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        return report
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+'''Translating proxy: reads the JSON frames of xela_server and serves them as binary frames
+
+Each frame is decoded and encoded once (xela_server.frames.encode_binary_frame) and sent to every
+connected client. A client that falls behind loses its oldest frames instead of slowing the others.
+Start xela_service with --port <proxy port> --wire binary to use it. Usage:
+    python -m xela_server.proxy --upstream ws://127.0.0.1:5000 --port 5001
+'''
+import argparse
+import asyncio
+import sys
+import time
+
+import websockets
+
+from xela_server.frames import decode_json_frame, encode_binary_frame
+
+class BinaryProxy(object):
+    '''Forwards the frames of a JSON upstream to any number of binary clients'''
+    def __init__(self, upstream, host="0.0.0.0", port=5001, queue_size=8, backoff_min=0.1, backoff_max=5.0):
+        self.upstream = upstream
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.clients = set()
+        self.received = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def translate(self, message):
+        '''Binary frame of one JSON message, None for messages without frame data'''
+        decoded = decode_json_frame(message, on_error=self.report_error)
+        if decoded is None or len(decoded[1]) == 0:
+            return None
+        frame_id, frame = decoded
+        return encode_binary_frame(frame, frame_id, time.time())
+
+    def report_error(self, value, error):
+        '''Counts and logs a sensor entry that could not be decoded, the rest of its frame is still sent'''
+        self.errors += 1
+        sys.stderr.write("Proxy: {}: {}: {}\n".format(type(error).__name__, error, value))
+
+    def broadcast(self, message):
+        for queue in self.clients:
+            while queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+
+    async def receive(self):
+        backoff = self.backoff_min
+        while True:
+            try:
+                async with websockets.connect(self.upstream, max_size=None, compression=None) as wsock:
+                    backoff = self.backoff_min
+                    async for message in wsock:
+                        self.received += 1
+                        try:
+                            binary = self.translate(message)
+                        except Exception as error:
+                            self.errors += 1
+                            sys.stderr.write("Proxy: {}: {}\n".format(type(error).__name__, error))
+                            continue
+                        if binary is not None:
+                            self.broadcast(binary)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                sys.stderr.write("Proxy upstream {}: {}: {}\n".format(self.upstream, type(error).__name__, error))
+            await asyncio.sleep(backoff)
+            backoff = min(2 * backoff, self.backoff_max)
+
+    async def handler(self, wsock, path=None):
+        queue = asyncio.Queue(self.queue_size)
+        self.clients.add(queue)
+        try:
+            while True:
+                await wsock.send(await queue.get())
+                self.forwarded += 1
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(queue)
+
+    async def run(self, ready=None):
+        '''Serve until cancelled'''
+        async with websockets.serve(self.handler, self.host, self.port, compression=None, max_size=None):
+            if ready is not None:
+                ready.set()
+            await self.receive()
+
+    def stats(self):
+        return dict(received=self.received, forwarded=self.forwarded, dropped=self.dropped,
+                    errors=self.errors, clients=len(self.clients))
+
+def main():
+    argp = argparse.ArgumentParser(description="Serve the frames of xela_server in the binary wire format")
+    argp.add_argument("--upstream", default="ws://127.0.0.1:5000", help="Websocket of xela_server")
+    argp.add_argument("--host", default="0.0.0.0")
+    argp.add_argument("--port", type=int, default=5001)
+    argp.add_argument("--queue_size", type=int, default=8, help="Frames buffered per client")
+    args = argp.parse_args()
+
+    proxy = BinaryProxy(args.upstream, args.host, args.port, args.queue_size)
+    sys.stderr.write("Serving binary frames of {} on ws://{}:{}\n".format(args.upstream, args.host, args.port))
+    try:
+        asyncio.run(proxy.run())
+    except KeyboardInterrupt:
+        pass
+    sys.stderr.write("Proxy stats: {}\n".format(proxy.stats()))
+
+if __name__ == "__main__":
+    main()
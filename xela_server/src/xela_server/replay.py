@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+'''Stand-in for xela_server: captures, then serves recorded or synthetic frames over a websocket
+
+Capture files have one "<arrival time.time()>\t<websocket JSON message>" line per frame, gzip
+compressed when the name ends with .gz. Binary messages (xela_server.proxy frames) are stored as
+"b64:<base64 of the message>" and replayed as binary messages. Files with one bare JSON message
+per line are read too, without arrival times. Usage:
+    python -m xela_server.replay capture --url ws://127.0.0.1:5000 --output frames.jsonl.gz --duration 60
+    python -m xela_server.replay serve --capture frames.jsonl.gz --speed 1 (or 2.5, max)
+    python -m xela_server.replay serve --sensors 23 --taxels 16 --rate 100
+'''
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import sys
+import time
+
+import numpy as np
+import websockets
+
+from xela_server.frames import encode_taxels
+
+WELCOME = json.dumps({"message": "Welcome"})
+BINARY_PREFIX = "b64:" # Marks binary messages in capture files, JSON messages start with {
+
+def _open_text(path, mode):
+    return gzip.open(path, mode + "t") if path.endswith(".gz") else open(path, mode)
+
+class CaptureWriter(object):
+    '''Appends websocket messages with their arrival time to a capture file'''
+    def __init__(self, path):
+        self.path = path
+        self.file = _open_text(path, "w")
+        self.frames = 0
+
+    def write(self, message, arrival=None):
+        if isinstance(message, bytes):
+            message = BINARY_PREFIX + base64.b64encode(message).decode("ascii")
+        self.file.write("{:.6f}\t{}\n".format(time.time() if arrival is None else arrival, message))
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def _captured_message(text):
+    '''Message as it was received: bytes for binary messages, str for JSON'''
+    if text.startswith(BINARY_PREFIX):
+        return base64.b64decode(text[len(BINARY_PREFIX):])
+    return text
+
+def read_capture(path):
+    '''(messages, arrivals) of a capture file, arrivals is None if the file has no arrival times'''
+    messages = []
+    arrivals = []
+    with _open_text(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == "{" or line.startswith(BINARY_PREFIX):
+                messages.append(_captured_message(line))
+            else:
+                arrival, message = line.split("\t", 1)
+                arrivals.append(float(arrival))
+                messages.append(_captured_message(message))
+    if len(arrivals) != len(messages):
+        arrivals = None
+    return messages, arrivals
+
+async def capture(url, path, duration=None, max_frames=None):
+    '''Log the messages of a running xela_server to a capture file, returns the number of frames'''
+    end = None if duration is None else time.time() + duration
+    with CaptureWriter(path) as writer:
+        async with websockets.connect(url, max_size=None, compression=None) as wsock:
+            while max_frames is None or writer.frames < max_frames:
+                timeout = None if end is None else end - time.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(wsock.recv(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                writer.write(message, time.time())
+        return writer.frames
+
+def synthetic_messages(num_frames, num_sensors=1, num_taxels=368, model="uSPa44", seed=0):
+    '''Websocket messages in the xela_server format with random taxel values'''
+    rng = np.random.default_rng(seed)
+    messages = []
+    for frame_id in range(num_frames):
+        message = {"message": frame_id + 1, "time": time.time()}
+        for sensor in range(num_sensors):
+            taxels = rng.integers(0, 2**16, size=(num_taxels, 3))
+            message[str(sensor + 1)] = {"data": encode_taxels(taxels), "sensor": str(sensor + 1), "model": model}
+        messages.append(json.dumps(message))
+    return messages
+
+def send_offsets(arrivals, speed=1.0):
+    '''Send time of every message relative to the first one, arrival gaps divided by speed
+
+    The offsets of one pass end one average gap after the last message, so repeated passes keep the rate.
+    '''
+    arrivals = np.asarray(arrivals, dtype=np.float64)
+    offsets = (arrivals - arrivals[0]) / speed
+    period = offsets[-1] + (offsets[-1] / (len(offsets) - 1) if len(offsets) > 1 else 0.0)
+    return offsets.tolist(), period
+
+async def send_messages(wsock, messages, rate=None, repeat=1, arrivals=None, speed=1.0):
+    '''Send messages repeat times (forever if None)
+
+    With arrivals (time.time() of every message when it was captured) the original timing is kept,
+    scaled by speed. Otherwise they are sent at rate frames/s. As fast as possible if both are None.
+    '''
+    start = time.perf_counter()
+    sent = 0
+    offsets = None
+    if rate is None and arrivals is not None and speed is not None:
+        offsets, period = send_offsets(arrivals, speed)
+    while repeat is None or sent < repeat * len(messages):
+        for index, message in enumerate(messages):
+            if offsets is not None:
+                ahead = start + (sent // len(messages)) * period + offsets[index] - time.perf_counter()
+            elif rate is not None:
+                ahead = start + sent / rate - time.perf_counter()
+            else:
+                ahead = 0
+            if ahead > 0.001:
+                await asyncio.sleep(ahead)
+            if sent % 64 == 0:
+                await asyncio.sleep(0) # Let other clients through at full speed
+            await wsock.send(message)
+            sent += 1
+    return sent
+
+async def serve_messages(messages, host="127.0.0.1", port=5000, rate=None, repeat=None, ready=None,
+                         arrivals=None, speed=1.0):
+    '''Serve the messages to every client that connects, until cancelled'''
+    async def handler(wsock, path=None):
+        try:
+            await wsock.send(WELCOME)
+            await send_messages(wsock, messages, rate, repeat, arrivals, speed)
+        except websockets.ConnectionClosed:
+            pass
+    async with websockets.serve(handler, host, port, compression=None, max_size=None):
+        if ready is not None:
+            ready.set()
+        await asyncio.Future()
+
+def parse_speed(value):
+    return None if value == "max" else float(value)
+
+def main():
+    argp = argparse.ArgumentParser(description="Capture and replay xela_server websocket traffic")
+    commands = argp.add_subparsers(dest="command")
+    capture_args = commands.add_parser("capture", help="Log the frames of a running xela_server")
+    capture_args.add_argument("--url", default="ws://127.0.0.1:5000")
+    capture_args.add_argument("--output", required=True, help="Capture file, gzip compressed if it ends with .gz")
+    capture_args.add_argument("--duration", type=float, default=None, help="Seconds to capture (default: until ctrl-c)")
+    capture_args.add_argument("--frames", type=int, default=None, help="Frames to capture")
+    serve_args = commands.add_parser("serve", help="Serve captured or synthetic frames like xela_server")
+    serve_args.add_argument("--capture", help="Capture file to replay, synthetic frames if not given")
+    serve_args.add_argument("--speed", type=parse_speed, default=1.0,
+                            help="Replay speed relative to the capture, or max (default: 1)")
+    serve_args.add_argument("--rate", type=float, default=None,
+                            help="Frames/s, overrides the capture timing (default: 100 for synthetic frames)")
+    serve_args.add_argument("--repeat", type=int, default=None, help="Passes over the frames (default: forever)")
+    serve_args.add_argument("--sensors", type=int, default=1)
+    serve_args.add_argument("--taxels", type=int, default=368)
+    serve_args.add_argument("--model", default="uSPa44")
+    serve_args.add_argument("--frames", type=int, default=200, help="Distinct synthetic frames")
+    serve_args.add_argument("--host", default="0.0.0.0")
+    serve_args.add_argument("--port", type=int, default=5000)
+    args = argp.parse_args()
+
+    if args.command == "capture":
+        try:
+            frames = asyncio.run(capture(args.url, args.output, args.duration, args.frames))
+        except KeyboardInterrupt:
+            frames = None
+        sys.stderr.write("Captured {} frames to {}\n".format("" if frames is None else frames, args.output))
+    elif args.command == "serve":
+        arrivals = None
+        if args.capture:
+            messages, arrivals = read_capture(args.capture)
+        else:
+            messages = synthetic_messages(args.frames, args.sensors, args.taxels, args.model)
+        rate = args.rate
+        if rate is None and arrivals is None and args.speed is not None:
+            rate = 100.0
+        sys.stderr.write("Serving {} frames on ws://{}:{} at {}\n".format(
+            len(messages), args.host, args.port,
+            "{} frames/s".format(rate) if rate is not None else
+            "{}x the captured speed".format(args.speed) if args.speed is not None else "maximum speed"))
+        try:
+            asyncio.run(serve_messages(messages, args.host, args.port, rate, args.repeat,
+                                       arrivals=arrivals, speed=args.speed))
+        except KeyboardInterrupt:
+            pass
+    else:
+        argp.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''Fixed size ring of tactile frames in shared memory for consumers on the same machine
+
+Layout of the shared memory block:
+    header:  int64[8]                     magic, format version, capacity, n_taxels, newest seq, writer pid (0 once closed)
+    seqs:    int64[capacity]              seq of the frame in each slot, -seq while it is written
+    stamps:  float64[capacity]            stamp of the frame in each slot
+    frames:  uint16[capacity, n_taxels, 3]
+
+Frames are numbered from 1 and frame seq goes to slot seq % capacity.
+The ring outlives its writer: a writer only takes over an existing ring when the previous one closed it
+or its process is gone, and the ring is only removed by an explicit unlink.
+'''
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from xela_server.frames import TAXEL_DTYPE
+
+DEFAULT_NAME = "xela_frames"
+MAGIC = 0x58454c41 # "XELA"
+FORMAT_VERSION = 1
+HEADER_SIZE = 8
+MAGIC_ID, VERSION_ID, CAPACITY_ID, TAXELS_ID, NEWEST_ID, OWNER_ID = range(6)
+
+def ring_size(capacity, n_taxels):
+    '''Size in bytes of a ring with the given number of slots and taxels per frame'''
+    return 8 * (HEADER_SIZE + 2 * capacity) + capacity * n_taxels * 3 * np.dtype(TAXEL_DTYPE).itemsize
+
+def ring_views(buf, capacity, n_taxels):
+    '''(header, seqs, stamps, frames) numpy views on a shared memory buffer'''
+    header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=buf)
+    seqs = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=8 * HEADER_SIZE)
+    stamps = np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=8 * (HEADER_SIZE + capacity))
+    frames = np.ndarray((capacity, n_taxels, 3), dtype=TAXEL_DTYPE, buffer=buf,
+                        offset=8 * (HEADER_SIZE + 2 * capacity))
+    return header, seqs, stamps, frames
+
+def open_untracked(name, create=False, size=0):
+    '''SharedMemory that is not removed when this process exits'''
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Before python 3.13 the block is registered with the resource tracker,
+        # which would unlink it when this process exits
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory") # pylint: disable = protected-access
+        except Exception:
+            pass
+        return shm
+
+def unlink(name=DEFAULT_NAME):
+    '''Remove the ring, readers still attached keep their mapping'''
+    shm = open_untracked(name)
+    shm.close()
+    if not hasattr(shm, "_track"):
+        # Before python 3.13 unlink() unregisters the block, register it again so the tracker has it
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.register(shm._name, "shared_memory") # pylint: disable = protected-access
+        except Exception:
+            pass
+    shm.unlink()
+
+def attach(name=DEFAULT_NAME):
+    '''Attach to an existing ring, returns the SharedMemory and its (header, seqs, stamps, frames) views'''
+    shm = open_untracked(name)
+    header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+    if header[MAGIC_ID] != MAGIC or header[VERSION_ID] != FORMAT_VERSION:
+        shm.close()
+        raise ValueError("{} is not a version {} tactile frame ring".format(name, FORMAT_VERSION))
+    return shm, ring_views(shm.buf, int(header[CAPACITY_ID]), int(header[TAXELS_ID]))
+
+def process_alive(pid):
+    '''True if a process with this pid exists'''
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Exists but belongs to another user
+    return True
+
+class SharedRingWriter(object):
+    '''Creates the ring and writes frames into it (one writer per ring)
+
+    A ring left over by a writer that closed it or is gone is reused as is when it has the same capacity
+    and taxel count, so readers still attached to it keep receiving frames, and replaced otherwise.
+    Raises FileExistsError if the ring belongs to a running process or is not a tactile frame ring.
+    '''
+    def __init__(self, n_taxels, capacity=64, name=DEFAULT_NAME):
+        self.n_taxels = n_taxels
+        self.capacity = capacity
+        self.name = name
+        try:
+            self.shm = open_untracked(name, create=True, size=ring_size(capacity, n_taxels))
+            fresh = True
+        except FileExistsError:
+            self.shm, fresh = self._take_over()
+        self.header, self.seqs, self.stamps, self.frames = ring_views(self.shm.buf, capacity, n_taxels)
+        if fresh:
+            self.seqs[:] = 0
+            self.header[:] = 0
+            self.header[CAPACITY_ID] = capacity
+            self.header[TAXELS_ID] = n_taxels
+            self.header[VERSION_ID] = FORMAT_VERSION
+        self.header[OWNER_ID] = os.getpid()
+        self.header[MAGIC_ID] = MAGIC # Written last, readers check it on attach
+
+    def _take_over(self):
+        '''(SharedMemory, fresh) for an existing ring whose writer closed it or is gone'''
+        try:
+            shm, (header, _, _, _) = attach(self.name)
+        except ValueError:
+            raise FileExistsError("Shared memory {} exists and is not a tactile frame ring, or its writer is still "
+                                  "creating it: remove /dev/shm/{} or use another name".format(self.name, self.name))
+        owner = int(header[OWNER_ID])
+        if owner not in (0, os.getpid()) and process_alive(owner):
+            shm.close()
+            raise FileExistsError("Tactile frame ring {} is written by running process {}, stop it or use another name".format(
+                self.name, owner))
+        same_dimensions = int(header[CAPACITY_ID]) == self.capacity and int(header[TAXELS_ID]) == self.n_taxels
+        header = None
+        if same_dimensions:
+            return shm, False # The sequence numbers go on
+        # Other dimensions: readers have to attach again anyway
+        shm.close()
+        unlink(self.name)
+        return open_untracked(self.name, create=True, size=ring_size(self.capacity, self.n_taxels)), True
+
+    def write(self, parts, stamp):
+        '''Write one frame given as a list of (n, 3) arrays that add up to n_taxels, returns its seq'''
+        txls = sum(taxels.shape[0] for taxels in parts)
+        if txls != self.n_taxels:
+            raise ValueError("Frame has {} taxels, the ring was created for {}".format(txls, self.n_taxels))
+        seq = int(self.header[NEWEST_ID]) + 1
+        slot = seq % self.capacity
+        self.seqs[slot] = -seq
+        start = 0
+        for taxels in parts:
+            self.frames[slot, start:start + taxels.shape[0]] = taxels
+            start += taxels.shape[0]
+        self.stamps[slot] = stamp
+        self.seqs[slot] = seq
+        self.header[NEWEST_ID] = seq
+        return seq
+
+    def close(self):
+        '''Release the ring, it stays in place for attached readers and the next writer'''
+        if self.header is None:
+            return
+        self.header[OWNER_ID] = 0
+        self.header = self.seqs = self.stamps = self.frames = None
+        self.shm.close()
+
+    def unlink(self):
+        '''Release and remove the ring'''
+        self.close()
+        unlink(self.name)
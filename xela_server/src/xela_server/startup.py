@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''Startup helpers of xela_service: ROS release lookup without subprocesses and process start time'''
+import json
+import os
+import re
+import subprocess
+import time
+
+RELEASE_CACHE = "xela_service_release.json"
+
+def process_start_time():
+    '''time.time() at which this process was exec'd (from /proc), None where that is not available'''
+    try:
+        with open("/proc/self/stat") as stat:
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19]) # Field 22, starttime
+        with open("/proc/uptime") as uptime:
+            boot = time.time() - float(uptime.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return boot + start_ticks / os.sysconf("SC_CLK_TCK")
+
+def package_version(name):
+    '''Version in the package.xml of a ROS package found from the environment, None if not found'''
+    roots = [path for path in os.environ.get("ROS_PACKAGE_PATH", "").split(os.pathsep) if path]
+    if os.environ.get("ROS_ROOT"):
+        roots.append(os.path.dirname(os.environ["ROS_ROOT"].rstrip(os.sep))) # .../share
+    for root in roots:
+        path = os.path.join(root, name, "package.xml")
+        try:
+            with open(path) as manifest:
+                match = re.search(r"<version[^>]*>\s*([^<\s]+)", manifest.read())
+        except OSError:
+            continue
+        if match:
+            return match.group(1)
+    return None
+
+def _rosversion(*args):
+    try:
+        return subprocess.run(["rosversion", "-s"] + list(args), stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=10).stdout.decode().strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+def ros_release(cache_dir=None):
+    '''(distro, rospy version) of the running ROS
+
+    Read from ROS_DISTRO and the package.xml of rospy, which takes microseconds. Only where they
+    can't be found is rosversion run, once: its answer is cached in ROS_HOME for the next starts.
+    '''
+    distro = os.environ.get("ROS_DISTRO")
+    version = package_version("rospy")
+    if distro and version:
+        return distro, version
+    cache_dir = cache_dir or os.environ.get("ROS_HOME") or os.path.join(os.path.expanduser("~"), ".ros")
+    cache_path = os.path.join(cache_dir, RELEASE_CACHE)
+    key = "{}:{}".format(os.environ.get("ROS_ROOT", ""), os.environ.get("ROS_PACKAGE_PATH", ""))
+    try:
+        with open(cache_path) as cache:
+            cached = json.load(cache)
+        if cached["key"] == key:
+            return distro or cached["distro"], version or cached["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    distro = distro or _rosversion("-d")
+    version = version or _rosversion("rospy")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w") as cache:
+            json.dump(dict(key=key, distro=distro, version=version), cache)
+    except OSError:
+        pass
+    return distro, version
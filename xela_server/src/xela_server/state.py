@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+'''Double buffered store of the latest frame of every sensor'''
+import time
+
+import numpy as np
+
+from xela_server.frames import TAXEL_DTYPE
+
+class StateSnapshot(object):
+    '''One buffer of the state store, rows are indexed by sensor - 1'''
+    def __init__(self, max_sensors, max_taxels, dtype):
+        self.values = np.zeros((max_sensors, max_taxels, 3), dtype=dtype)
+        self.num_taxels = np.zeros(max_sensors, dtype=np.int32)
+        self.stamps = np.zeros(max_sensors, dtype=np.float64)
+        self.seqs = np.zeros(max_sensors, dtype=np.int64) # Frame in which each sensor was last written
+        self.frame = 0
+        self.stamp = 0.0
+        self.version = 0 # Odd while the writer is filling this buffer
+
+class SensorState(object):
+    '''Latest (n_taxels, 3) values, stamp and sequence number of every sensor
+
+    A single writer thread fills the back buffer with a whole frame and swaps it to the front.
+    Readers never lock: they copy from the front buffer and retry if the writer reused it meanwhile
+    (seqlock on StateSnapshot.version), so every read sees one complete frame.
+    '''
+    def __init__(self, max_sensors=128, max_taxels=512, dtype=TAXEL_DTYPE):
+        self.max_sensors = max_sensors
+        self.max_taxels = max_taxels
+        self._front = StateSnapshot(max_sensors, max_taxels, dtype)
+        self._back = StateSnapshot(max_sensors, max_taxels, dtype)
+
+    def write_frame(self, frame, stamp=None):
+        '''frame: iterable of (sensor, taxels) with sensor in [1, max_sensors] and taxels an (n_taxels, 3) array'''
+        stamp = time.time() if stamp is None else stamp
+        frame = list(frame)
+        for sensor, taxels in frame:
+            if not 0 < sensor <= self.max_sensors or taxels.shape[0] > self.max_taxels:
+                raise ValueError("Sensor {} with {} taxels does not fit in the state store ({}x{})".format(
+                    sensor, taxels.shape[0], self.max_sensors, self.max_taxels))
+
+        front, back = self._front, self._back
+        back.version += 1
+        try:
+            # Bring the back buffer up to date with the sensors written since it was last in front
+            stale = np.flatnonzero(back.seqs != front.seqs)
+            if len(stale) > 0:
+                back.values[stale] = front.values[stale]
+                back.num_taxels[stale] = front.num_taxels[stale]
+                back.stamps[stale] = front.stamps[stale]
+                back.seqs[stale] = front.seqs[stale]
+            for sensor, taxels in frame:
+                txls = taxels.shape[0]
+                back.values[sensor-1, :txls] = taxels
+                back.num_taxels[sensor-1] = txls
+                back.stamps[sensor-1] = stamp
+                back.seqs[sensor-1] = front.frame + 1
+            back.frame = front.frame + 1
+            back.stamp = stamp
+        finally:
+            back.version += 1
+        self._front, self._back = back, front
+
+    def read(self, reader):
+        '''Call reader(snapshot) on the front buffer until it ran on one complete frame'''
+        while True:
+            snapshot = self._front
+            version = snapshot.version
+            if version % 2 == 0:
+                result = reader(snapshot)
+                if snapshot.version == version:
+                    return result
+            time.sleep(0) # Let the writer finish
+
+    def get_taxel(self, sensor, taxel):
+        '''[x, y, z] of a taxel (1-based as in the services), KeyError if there is no such taxel'''
+        def reader(snapshot):
+            if not 0 < sensor <= self.max_sensors or not 0 < taxel <= snapshot.num_taxels[sensor-1]:
+                return None
+            return snapshot.values[sensor-1, taxel-1].tolist()
+        xyz = self.read(reader)
+        if xyz is None:
+            raise KeyError((sensor, taxel))
+        return xyz
+
+    def get_sensor(self, sensor):
+        '''(taxels copy, stamp, seq) of a sensor, KeyError if it was never received'''
+        def reader(snapshot):
+            if not 0 < sensor <= self.max_sensors or snapshot.seqs[sensor-1] == 0:
+                return None
+            row = sensor - 1
+            return (snapshot.values[row, :snapshot.num_taxels[row]].copy(),
+                    float(snapshot.stamps[row]), int(snapshot.seqs[row]))
+        data = self.read(reader)
+        if data is None:
+            raise KeyError(sensor)
+        return data
+
+    def get_sensors(self, sensors=None):
+        '''(frame, stamp, sensors, offsets, data) of the given sensors, all received sensors if None
+
+        data is the flat x, y, z of every taxel, offsets the index of the first taxel of each sensor
+        with len(sensors)+1 entries. Sensors that were never received are skipped.
+        '''
+        def reader(snapshot):
+            if sensors is None:
+                rows = np.flatnonzero(snapshot.seqs)
+            else:
+                rows = np.array([sens - 1 for sens in sensors if 0 < sens <= self.max_sensors], dtype=np.intp)
+                rows = rows[snapshot.seqs[rows] > 0]
+            offsets = np.zeros(len(rows) + 1, dtype=np.uint32)
+            offsets[1:] = np.cumsum(snapshot.num_taxels[rows])
+            data = np.empty((int(offsets[-1]), 3), dtype=snapshot.values.dtype)
+            for row, start, end in zip(rows, offsets[:-1], offsets[1:]):
+                data[start:end] = snapshot.values[row, :end-start]
+            return snapshot.frame, snapshot.stamp, rows + 1, offsets, data.reshape(-1)
+        return self.read(reader)
+
+    @property
+    def frame(self):
+        '''Number of the newest complete frame'''
+        return self._front.frame
+
+    def sensors(self):
+        '''Ids of the sensors received so far'''
+        return self.read(lambda snapshot: (np.flatnonzero(snapshot.seqs) + 1).tolist())
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+'''Decimated and filtered streams of the whole hand array, computed once for all their subscribers'''
+import math
+
+import numpy as np
+
+STREAM_FILTERS = ["none", "mean", "lowpass"]
+
+def parse_streams(spec):
+    '''Parse the "topic:rate[:filter[:cutoff]],..." of --streams into a list of DerivedStream
+
+    e.g. "xServPolicyTopic:30:lowpass:10,xServDashTopic:5:mean"; filter defaults to none.
+    '''
+    streams = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split(":")
+        if not 2 <= len(parts) <= 4 or not parts[0]:
+            raise ValueError("Stream {} is not topic:rate[:filter[:cutoff]]".format(item))
+        try:
+            rate = float(parts[1])
+            cutoff = float(parts[3]) if len(parts) > 3 else None
+        except ValueError:
+            raise ValueError("Stream {} has a rate or cutoff that is not a number".format(item))
+        streams.append(DerivedStream(parts[0], rate, parts[2] if len(parts) > 2 else "none", cutoff))
+    topics = [stream.topic for stream in streams]
+    if len(set(topics)) != len(topics):
+        raise ValueError("Streams {} publish twice on the same topic".format(topics))
+    return streams
+
+class DerivedStream(object):
+    '''One output stream of the hand array: filtered at the input rate, published at most `rate` times a second
+
+    Filters: none (the latest frame), mean (average of the frames since the previous output, a moving
+    average over one output period) or lowpass (first order IIR low-pass at `cutoff` Hz, rate / 2 if not
+    given, whose factor follows the actual spacing of the input stamps so jitter and dropped frames don't
+    change its response). Every update is one or two vectorized operations on the (n, 3) array of all taxels.
+    Outputs are on a grid of 1 / rate from the first frame, late outputs are not caught up.
+    '''
+    def __init__(self, topic, rate, filter="none", cutoff=None):
+        if filter not in STREAM_FILTERS:
+            raise ValueError("Unknown stream filter {}, use one of {}".format(filter, STREAM_FILTERS))
+        if rate <= 0 or (cutoff is not None and cutoff <= 0):
+            raise ValueError("Stream {} needs a positive rate and cutoff".format(topic))
+        self.topic = topic
+        self.rate = rate
+        self.filter = filter
+        self.cutoff = rate / 2.0 if cutoff is None else cutoff
+        self.period = 1.0 / rate
+        self.outputs = 0
+        self.layout = None
+
+    def reset(self):
+        '''Restart the filter and the output grid on the next frame, e.g. after the stream had no subscribers'''
+        self.layout = None
+
+    def _start(self, layout, values, stamp):
+        self.layout = layout
+        # The mean sums many frames of 16 bit readings, beyond what float32 holds exactly
+        self.state = np.array(values, dtype=np.float64 if self.filter == "mean" else np.float32)
+        self.delta = np.zeros(self.state.shape, dtype=np.float32)
+        self.output = np.zeros(self.state.shape, dtype=np.float32)
+        self.count = 1
+        self.last_stamp = stamp
+        self.next_output = stamp
+
+    def update(self, layout, values, stamp):
+        '''Feed one frame, returns the (n, 3) float32 output if one is due, else None
+
+        layout: tuple of the sensors of the frame, the filter restarts when it changes, values: (n, 3)
+        taxels of all its sensors, stamp: seconds.
+        The output is a buffer reused by the next outputs.
+        '''
+        if layout != self.layout:
+            self._start(layout, values, stamp)
+        elif self.filter == "mean":
+            self.state += values
+            self.count += 1
+        elif self.filter == "lowpass":
+            elapsed = stamp - self.last_stamp
+            if elapsed > 0:
+                np.subtract(values, self.state, out=self.delta)
+                self.delta *= 1.0 - math.exp(-2 * math.pi * self.cutoff * elapsed)
+                self.state += self.delta
+        self.last_stamp = stamp
+        if stamp < self.next_output:
+            return None
+        self.next_output += self.period
+        if self.next_output <= stamp: # After a gap the grid restarts from this frame
+            self.next_output = stamp + self.period
+        if self.filter == "none":
+            self.output[:] = values
+        elif self.filter == "mean":
+            np.divide(self.state, self.count, out=self.output, casting="unsafe")
+            self.state[:] = 0
+            self.count = 0
+        else:
+            self.output[:] = self.state
+        self.outputs += 1
+        return self.output
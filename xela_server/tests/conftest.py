@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+'''Lets pytest import xela_server from the source tree without a catkin workspace'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+'''JSON and binary frame decoding shared by xela_service and xela_server.proxy'''
+import json
+
+import numpy as np
+
+from xela_server.frames import (
+    decode_binary_frame, decode_json_frame, decode_json_sensors, decode_taxels, encode_binary_frame, encode_taxels
+)
+
+def json_message(frame_id, sensors):
+    data = {"message": frame_id}
+    for key, value in sensors.items():
+        data[key] = value
+    return json.dumps(data)
+
+def sensor_entry(sensor, model, taxels):
+    return {"sensor": str(sensor), "model": model, "data": encode_taxels(taxels)}
+
+def test_decode_taxels_of_mixed_widths():
+    np.testing.assert_array_equal(decode_taxels("1a2b,3c4d,5e6f"), [[0x1a2b, 0x3c4d, 0x5e6f]])
+    # Same length and comma count as four digit values, but the commas are elsewhere
+    np.testing.assert_array_equal(decode_taxels("1a2,0b3c4,5e6f"), [[0x1a2, 0xb3c4, 0x5e6f]])
+    np.testing.assert_array_equal(decode_taxels("a,bc,def,1234"), [[0xa, 0xbc, 0xdef]])
+
+def test_json_frame_in_sensor_order():
+    first = np.arange(6, dtype=np.uint16).reshape(2, 3)
+    second = np.full((3, 3), 0xbeef, dtype=np.uint16)
+    message = json_message(7, {"10": sensor_entry(10, "uSPa46", second), "2": sensor_entry(2, "uSCuTi", first)})
+    frame_id, frame = decode_json_frame(message)
+    assert frame_id == 7
+    assert [(sensor, model) for sensor, model, _ in frame] == [(2, "uSCuTi"), (10, "uSPa46")]
+    np.testing.assert_array_equal(frame[0][2], first)
+    np.testing.assert_array_equal(frame[1][2], second)
+
+def test_welcome_has_no_frame():
+    assert decode_json_frame(json.dumps({"message": "Welcome"})) is None
+
+def test_bad_sensor_entries_are_reported_and_skipped():
+    taxels = np.ones((1, 3), dtype=np.uint16)
+    data = {
+        "1": sensor_entry(1, "uSPa44", taxels),
+        "2": {"data": encode_taxels(taxels), "model": "uSPa44"}, # No sensor
+        "3": {"sensor": "3", "model": "uSPa44", "data": "zz,00,00"},
+        "4": {"sensor": "4", "model": "uSPa44", "data": ""}, # No taxels, not an error
+    }
+    errors = []
+    frame = list(decode_json_sensors(data, on_error=lambda value, error: errors.append(value)))
+    assert [sensor for sensor, _, _ in frame] == [1]
+    assert errors == [data["2"], data["3"]]
+
+def test_binary_round_trip_of_json_frame():
+    taxels = np.arange(12, dtype=np.uint16).reshape(4, 3)
+    frame_id, frame = decode_json_frame(json_message(3, {"1": sensor_entry(1, "uSPa44", taxels)}))
+    decoded_id, _, decoded = decode_binary_frame(encode_binary_frame(frame, frame_id))
+    assert decoded_id == 3
+    assert [(sensor, model) for sensor, model, _ in decoded] == [(1, "uSPa44")]
+    np.testing.assert_array_equal(decoded[0][2], taxels)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+'''PipelineMetrics counters and histograms written from several threads'''
+import json
+import threading
+
+from xela_server.metrics import PipelineMetrics
+
+NUM_THREADS = 4
+NUM_EVENTS = 20000
+
+def run_threads(target):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(NUM_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_counters_from_several_threads():
+    metrics = PipelineMetrics()
+    def count(index):
+        for _ in range(NUM_EVENTS):
+            metrics.count("frames")
+            metrics.count("thread{}".format(index), 2)
+    run_threads(count)
+    counters = metrics.report()["counters"]
+    assert counters["frames"] == NUM_THREADS * NUM_EVENTS
+    assert all(counters["thread{}".format(index)] == 2 * NUM_EVENTS for index in range(NUM_THREADS))
+
+def test_disabled_metrics_do_not_count():
+    metrics = PipelineMetrics(enabled=False)
+    metrics.count("parse_errors")
+    assert metrics.report()["counters"] == {}
+
+def test_histograms_added_while_reporting():
+    metrics = PipelineMetrics(sample_every=1)
+    stop = threading.Event()
+    reports = []
+    def report():
+        while not stop.is_set():
+            reports.append(metrics.report()) # Raises if a table changes size while it is iterated
+    reporter = threading.Thread(target=report)
+    reporter.start()
+    def record(index):
+        for sensor in range(200):
+            metrics.record("stage{}_{}".format(index, sensor), 0.0, 1e-3)
+            metrics.record_sensor("parse", (index, sensor), 1e-3)
+    run_threads(record)
+    stop.set()
+    reporter.join()
+
+    final = metrics.report()
+    assert len(final["stages"]) == NUM_THREADS * 200
+    assert all(summary["count"] == 1 for summary in final["stages"].values())
+    assert len(final["sensors"]) == NUM_THREADS * 200
+
+def test_dump_writes_the_report(tmp_path):
+    metrics = PipelineMetrics(sample_every=1)
+    metrics.count("frames", 3)
+    metrics.record("json", 0.0, 2e-3)
+    path = str(tmp_path / "metrics.json")
+    report = metrics.dump(path, extra_counters={"dropped": 1})
+    with open(path) as f:
+        written = json.load(f)
+    assert written == json.loads(json.dumps(report))
+    assert written["counters"] == {"frames": 3, "dropped": 1}
+    assert written["stages"]["json"]["count"] == 1
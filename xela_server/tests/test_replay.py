@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+'''Capture files of xela_server.replay'''
+import numpy as np
+import pytest
+
+from xela_server.frames import decode_binary_frame, encode_binary_frame
+from xela_server.replay import CaptureWriter, read_capture, synthetic_messages
+
+@pytest.mark.parametrize("file_name", ["frames.jsonl", "frames.jsonl.gz"])
+def test_capture_round_trip_of_json_and_binary_messages(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+    json_messages = synthetic_messages(2, num_sensors=2, num_taxels=4)
+    taxels = np.arange(12, dtype=np.uint16).reshape(4, 3)
+    binary_message = encode_binary_frame([(1, "uSPa44", taxels)], frame_id=5, stamp=1.0)
+    messages = [json_messages[0], binary_message, json_messages[1], b"\n\t\x00\xff"]
+    with CaptureWriter(path) as writer:
+        for index, message in enumerate(messages):
+            writer.write(message, 100.0 + index)
+
+    read_messages, arrivals = read_capture(path)
+    assert read_messages == messages
+    assert arrivals == [100.0, 101.0, 102.0, 103.0]
+    frame_id, _, frame = decode_binary_frame(read_messages[1])
+    assert frame_id == 5
+    np.testing.assert_array_equal(frame[0][2], taxels)
+
+def test_bare_json_lines_have_no_arrivals(tmp_path):
+    path = str(tmp_path / "bare.jsonl")
+    messages = synthetic_messages(3, num_taxels=2)
+    with open(path, "w") as f:
+        f.write("\n".join(messages) + "\n")
+    assert read_capture(path) == (messages, None)
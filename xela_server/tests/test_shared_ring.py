@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+'''SharedRingWriter ownership of an existing ring
+
+Readers and competing writers run in their own process, as they do next to xela_service.
+'''
+import os
+import subprocess
+import sys
+import uuid
+
+import numpy as np
+import pytest
+
+from xela_server.shared_ring import NEWEST_ID, OWNER_ID, SharedRingWriter, attach
+
+N_TAXELS = 6
+
+@pytest.fixture
+def name():
+    return "xela_test_{}".format(uuid.uuid4().hex[:12])
+
+def frame(value):
+    return [np.full((N_TAXELS, 3), value, dtype=np.uint16)]
+
+def run_python(code):
+    '''Run code in another python process with xela_server importable, returns its stdout'''
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_reader_sees_the_frames(name):
+    writer = SharedRingWriter(N_TAXELS, capacity=4, name=name)
+    try:
+        writer.write(frame(7), 1.5)
+        output = run_python(
+            "from xela_server.shared_ring import attach\n"
+            "shm, (header, seqs, stamps, frames) = attach({!r})\n"
+            "print(int(header[4]), int(header[5]), int(seqs[1]), float(stamps[1]), int(frames[1].min()), int(frames[1].max()))\n"
+            .format(name))
+        assert output.split() == ["1", str(os.getpid()), "1", "1.5", "7", "7"]
+    finally:
+        writer.unlink()
+
+def test_ring_of_a_running_writer_is_not_replaced(name):
+    writer = SharedRingWriter(N_TAXELS, capacity=4, name=name)
+    try:
+        writer.write(frame(3), 1.0)
+        output = run_python(
+            "from xela_server.shared_ring import SharedRingWriter\n"
+            "try:\n"
+            "    SharedRingWriter({}, capacity=4, name={!r})\n"
+            "except FileExistsError as error:\n"
+            "    print(error)\n".format(N_TAXELS, name))
+        assert "running process {}".format(os.getpid()) in output
+        assert writer.header[NEWEST_ID] == 1 and (writer.frames[1] == 3).all()
+        assert writer.header[OWNER_ID] == os.getpid()
+    finally:
+        writer.unlink()
+
+def test_ring_of_a_dead_writer_is_reused(name):
+    writer = SharedRingWriter(N_TAXELS, capacity=4, name=name)
+    try:
+        writer.write(frame(3), 1.0)
+        writer.header[OWNER_ID] = dead_pid()
+        restarted = SharedRingWriter(N_TAXELS, capacity=4, name=name)
+        assert restarted.write(frame(4), 2.0) == 2 # Goes on from the previous writer
+        # The views of the first writer stand for a reader that stayed attached
+        assert writer.header[NEWEST_ID] == 2 and writer.header[OWNER_ID] == os.getpid()
+        assert (writer.frames[2] == 4).all()
+        restarted.close()
+    finally:
+        writer.unlink()
+
+def test_ring_of_a_cleanly_stopped_writer_is_reused(name):
+    # A service that stops cleanly only closes the ring, the next one goes on writing into it
+    run_python(
+        "from xela_server.shared_ring import SharedRingWriter\n"
+        "import numpy as np\n"
+        "writer = SharedRingWriter({n}, capacity=4, name={name!r})\n"
+        "writer.write([np.full(({n}, 3), 3, dtype=np.uint16)], 1.0)\n"
+        "writer.close()\n".format(n=N_TAXELS, name=name))
+    shm, (header, seqs, stamps, frames) = attach(name) # A reader that stayed attached
+    try:
+        assert header[NEWEST_ID] == 1 and header[OWNER_ID] == 0 and (frames[1] == 3).all()
+        restarted = SharedRingWriter(N_TAXELS, capacity=4, name=name)
+        assert restarted.write(frame(4), 2.0) == 2
+        assert header[NEWEST_ID] == 2 and header[OWNER_ID] == os.getpid()
+        assert seqs[2] == 2 and stamps[2] == 2.0 and (frames[2] == 4).all()
+        restarted.unlink()
+        with pytest.raises(FileNotFoundError):
+            attach(name)
+    finally:
+        header = seqs = stamps = frames = None
+        shm.close()
+
+def test_ring_of_a_dead_writer_with_other_dimensions_is_replaced(name):
+    writer = SharedRingWriter(N_TAXELS, capacity=4, name=name)
+    writer.close()
+    restarted = SharedRingWriter(N_TAXELS, capacity=8, name=name)
+    try:
+        assert restarted.header[NEWEST_ID] == 0 and restarted.frames.shape == (8, N_TAXELS, 3)
+    finally:
+        restarted.unlink()
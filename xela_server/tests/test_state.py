@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''SensorState under one writer and several concurrent readers
+
+The writer fills every taxel of every sensor with the frame number, so a read that sees two
+different values or sequence numbers got a torn frame.
+'''
+import threading
+import time
+
+import numpy as np
+
+from xela_server.state import SensorState
+
+NUM_SENSORS = 4
+NUM_TAXELS = 368
+NUM_READERS = 3
+DURATION = 1.0 # Seconds the threads run
+
+counts_lock = threading.Lock()
+
+def write_frames(state, stop, counts):
+    frames = [np.zeros((NUM_TAXELS, 3), dtype=np.uint16) for _ in range(NUM_SENSORS)]
+    frame_id = 0
+    while not stop.is_set():
+        frame_id += 1
+        for taxels in frames:
+            taxels[:] = frame_id % 2**16
+        state.write_frame((sensor + 1, taxels) for sensor, taxels in enumerate(frames))
+    counts["writes"] = frame_id
+
+def read_frames(state, stop, counts, errors):
+    def read_all(snapshot):
+        return snapshot.values[:NUM_SENSORS].copy(), snapshot.seqs[:NUM_SENSORS].copy()
+    reads = 0
+    while not stop.is_set():
+        values, seqs = state.read(read_all)
+        if len(np.unique(values)) > 1 or len(np.unique(seqs)) > 1:
+            errors.append(("read", np.unique(values), np.unique(seqs)))
+        if seqs[0] > 0:
+            taxels, _, seq = state.get_sensor(1 + reads % NUM_SENSORS)
+            if len(np.unique(taxels)) > 1 or taxels[0, 0] != seq % 2**16:
+                errors.append(("get_sensor", np.unique(taxels), seq))
+            frame, _, _, _, data = state.get_sensors()
+            if len(np.unique(data)) > 1 or data[0] != frame % 2**16:
+                errors.append(("get_sensors", np.unique(data), frame))
+        reads += 1
+    with counts_lock:
+        counts["reads"] = counts.get("reads", 0) + reads
+
+def test_no_torn_frames_under_concurrent_writer():
+    state = SensorState(max_sensors=NUM_SENSORS, max_taxels=NUM_TAXELS)
+    stop = threading.Event()
+    counts = {}
+    errors = []
+    threads = [threading.Thread(target=write_frames, args=(state, stop, counts))]
+    threads.extend(threading.Thread(target=read_frames, args=(state, stop, counts, errors))
+                   for _ in range(NUM_READERS))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads)
+
+    assert errors == [], errors[:5]
+    assert counts["writes"] > 1 and counts["reads"] > 1
+
+def test_reads_keep_sensors_of_earlier_frames():
+    state = SensorState(max_sensors=NUM_SENSORS, max_taxels=NUM_TAXELS)
+    state.write_frame([(1, np.full((2, 3), 7, dtype=np.uint16))], stamp=1.0)
+    state.write_frame([(2, np.full((3, 3), 9, dtype=np.uint16))], stamp=2.0)
+    taxels, stamp, seq = state.get_sensor(1)
+    assert taxels.tolist() == [[7, 7, 7]] * 2 and stamp == 1.0 and seq == 1
+    assert state.get_taxel(2, 3) == [9, 9, 9]
+    frame, stamp, sensors, offsets, data = state.get_sensors()
+    assert (frame, stamp) == (2, 2.0)
+    assert sensors.tolist() == [1, 2] and offsets.tolist() == [0, 2, 5] and len(data) == 15